@@ -2,6 +2,8 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, overload
 
+import polars as pl
+
 from . import model
 from .model import TbModel
 
@@ -35,6 +37,10 @@ class PathModel:
     def parquet(self) -> str:
         return build_path(f"{self.filename}.parquet", self.attr, folder=self.stage)
 
+    @property
+    def arrow(self) -> str:
+        return build_path(f"{self.filename}.arrow", self.attr, folder=self.stage)
+
     @property
     def schema(self) -> dict:
         return self.model.dict_schema()
@@ -82,6 +88,7 @@ class DataModel:
     stretch              = ModelDescriptor("stretchs",             model.Stretch,          "pub_stretch")
     road                 = ModelDescriptor("roads",                model.Road,             "pub_road")
     stretch_toll         = ModelDescriptor("stretchs_toll",        model.StretchToll,      "pub_stretch_toll")
+    stretch_detail       = ModelDescriptor("stretch_detail",       model.StretchDetail,    "stretch_detail")
     tb_stretch_id        = ModelDescriptor("tb_stretch_id",        model.TbStretchId,      "pub_tb_stretch_id")
     tb_stretch_id_patch  = ModelDescriptor("tb_stretch_id_patch",  model.TbStretchId)
     tb_sts_no_id         = ModelDescriptor("tb_sts_no_id",         model.TbSts,            "dv_cleaner")
@@ -96,7 +103,31 @@ class DataModel:
     tb_imt_stretch_id    = ModelDescriptor("tb_imt_stretch_id",    model.TbImtStretchId,   "imt_stretch_id")
     osm_tb_distance      = ModelDescriptor("osm_tb_distance",      model.OsmTbDistance,    "pub_osm")
     manager_revenue      = ModelDescriptor("manager_revenue",      model.ManagerRevenue,   "raw_manager_revenue")
+    toll_matrix          = ModelDescriptor("toll_matrix",          model.TollMatrixIndex,  "toll_matrix")
 
     def __init__(self, year: int, stage: str):
         self.attr = {"year": year}
         self.stage: str = stage
+
+
+def table_frame(path_model: PathModel, year: int) -> pl.LazyFrame:
+    """The staged file in the columns and dtypes of its table."""
+    model = path_model.model
+    file_columns = pl.scan_parquet(path_model.parquet).collect_schema().names()
+    exprs = [
+        (pl.col(column) if column in file_columns else pl.lit(year if column == "info_year" else None))
+        .cast(dtype)
+        .alias(column)
+        for column, dtype in model.dict_schema().items()
+    ]
+    # Rows without their key or repeating one would fail the bulk insert; the
+    # surrogate `id` keys are assigned by SQLite.
+    keys = [column.name for column in model.__table__.primary_key.columns if column.name != "id"]
+    ldf = pl.scan_parquet(path_model.parquet).select(exprs)
+    if keys:
+        ldf = ldf.filter(pl.all_horizontal(pl.col(keys).is_not_null())).unique(
+            subset=keys, keep="first", maintain_order=True
+        )
+    if model.h3_columns():
+        ldf = ldf.with_columns(model.h3_exprs())
+    return ldf
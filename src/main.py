@@ -1,18 +1,78 @@
 import datetime
+import json
 import logging
 import sys
+from collections.abc import Callable
 from contextlib import asynccontextmanager
+from pathlib import Path
 from typing import Annotated, Any
 
-from fastapi import Body, FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+import polars as pl
+from fastapi import Body, FastAPI, HTTPException, Request, Response
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlmodel import join, not_, or_, select
+from sqlmodel import Session, func, join, literal, not_, or_, select
 
-from .model import Stretch, StretchToll, TbImt, TbNeighbour, TbStretchId, TbSts, Tollbooth
-from .utils.connector import SessionDep, create_db_and_tables
+from .model import (
+    Stretch,
+    StretchDetail,
+    StretchToll,
+    TbImt,
+    TbModel,
+    TbNeighbour,
+    TbStretchId,
+    TbSts,
+    Tollbooth,
+)
+from .utils.batch_upsert import upsert_tollbooths
+from .utils.change_log import UPSERT, changes_since, current_version, log_changes
+from .utils.columnar import FORMATS, Projection, columnar_page, frame_columnar_page
+from .utils.connector import (
+    AsyncReadSessionDep,
+    ReadSessionDep,
+    WriteQueueDep,
+    create_db_and_tables,
+    get_async_read_engine,
+    get_engine,
+    get_read_engine,
+    get_read_session,
+    get_write_queue,
+)
+from .utils.frame_backend import (
+    after_cursor,
+    empty_stretch_tollbooths,
+    frame_store_from_env,
+    local_neighbours,
+    model_query,
+    models,
+    ndjson_frame_response,
+    road_tollbooths,
+    stretch_toll_rows,
+    stretch_tolls,
+)
+from .utils.fuzzy_names import FuzzyNameCache
+from .utils.h3_index import ClusterCache, cluster_rows, zoom_to_resolution
+from .utils.metrics import CONTENT_TYPE, Metrics, MetricsMiddleware, instrument_engine
+from .utils.pagination import Keyset, PageLimit, ndjson_response
+from .utils.query_compiler import CompiledQuery, compile_query
 from .utils.query_parser import parse_query
+from .utils.response_cache import (
+    ResponseCache,
+    ResponseCacheMiddleware,
+    RevisionWatcher,
+    bump_revision,
+)
+from .utils.routing import ROUTE_TABLES, WEIGHTS, RouteGraphCache, load_edges
+from .utils.spatial_index import NEIGHBOUR_SCOPES, NeighbourIndexCache
+from .utils.sqlite_index import LOCATED_MODELS, name_rows, name_suggestions, viewport_stm
+from .utils.tiles import (
+    MANIFEST_FILENAME,
+    TILES_DIR,
+    CachedStaticFiles,
+    has_tiles,
+    latest_tiles_year,
+)
 
 _log = logging.getLogger(__name__)
 _log.setLevel(logging.DEBUG)
@@ -20,194 +80,574 @@ handler = logging.StreamHandler(sys.stdout)
 handler.setLevel(logging.DEBUG)
 _log.addHandler(handler)
 
+_VIEWPORT_MIN_ZOOM = 7
+_SUGGESTIONS_MAX_LIMIT = 50
+_CHANGES_MAX_LIMIT = 5000
+_NEIGHBOURS_MAX_IDS = 500
+_NEIGHBOURS_MAX_K = 100
+_POINTS_SCHEMA = {"source": pl.String, "lat": pl.Float64, "lng": pl.Float64, "status": pl.String}
+_NEIGHBOUR_POINTS_SCHEMA = {
+    "source": pl.String, "tollbooth_id": pl.Int64, "tollbooth_name": pl.String,
+    "lat": pl.Float64, "lng": pl.Float64, "info_year": pl.Int64,
+}
+
+cluster_cache = ClusterCache()
+name_cache = FuzzyNameCache()
+route_cache = RouteGraphCache()
+neighbour_cache = NeighbourIndexCache()
+response_cache = ResponseCache()
+metrics = Metrics()
+instrument_engine(get_engine(), metrics, "write")
+instrument_engine(get_read_engine(), metrics, "read")
+instrument_engine(get_async_read_engine().sync_engine, metrics, "async_read")
+
+
+def _on_data_change(table: str, info_year: int | None):
+    if table in LOCATED_MODELS:
+        cluster_cache.invalidate(info_year)
+        name_cache.invalidate()
+        neighbour_cache.invalidate(info_year)
+    if table in ROUTE_TABLES:
+        route_cache.invalidate(info_year)
+
+
+response_cache.add_listener(_on_data_change)
+
+# TB_BACKEND=frames serves the list endpoints from the staged parquet files.
+frame_store = frame_store_from_env()
+if frame_store is not None:
+    frame_store.add_listener(response_cache.invalidate)
+
+# Cached POST routes and the tables their responses read.
+_CACHED_ROUTES = {
+    "/api/tollbooths/": (Tollbooth.__tablename__, TbStretchId.__tablename__, Stretch.__tablename__),
+    "/api/tollbooths_sts": (TbSts.__tablename__,),
+    "/api/tollbooths_imt": (TbImt.__tablename__,),
+    "/api/tollbooths_viewport": tuple(LOCATED_MODELS),
+    "/api/tollbooth_clusters": tuple(LOCATED_MODELS),
+    "/api/tollbooth_suggestions": tuple(LOCATED_MODELS),
+    "/api/query_tollbooths": (TbStretchId.__tablename__, Stretch.__tablename__, StretchToll.__tablename__),
+    "/api/tollbooth_neightbours": (Tollbooth.__tablename__, TbNeighbour.__tablename__),
+    "/api/neighbours": tuple(LOCATED_MODELS),
+    "/api/route_cost": ROUTE_TABLES,
+}
+# List endpoints with an async variant under /api/async/, which reads the same tables.
+_ASYNC_ROUTES = (
+    "/api/tollbooths/", "/api/tollbooths_sts", "/api/tollbooths_imt", "/api/query_tollbooths", "/api/tollbooth_neightbours"
+)
+_CACHED_ROUTES.update({path.replace("/api/", "/api/async/", 1): _CACHED_ROUTES[path] for path in _ASYNC_ROUTES})
+
+
+def _tb_row(tb: Tollbooth) -> dict:
+    return tb.online_filled_fields(exclude_fields={"legacy_id"})
+
+
+def _tb_sts_row(tb_sts: TbSts) -> dict:
+    return {
+        "tollbooth_id": tb_sts.index,
+        "tollbooth_name": tb_sts.tollbooth_name,
+        "stretch_name": tb_sts.stretch_name,
+        "lat": tb_sts.lat,
+        "lng": tb_sts.lng,
+        "info_year": tb_sts.info_year,
+        "source": TbSts.name()
+    }
+
+
+def _tb_imt_row(tb: TbImt) -> dict:
+    return {
+        "tollbooth_id": tb.tollbooth_id,
+        "tollbooth_name": tb.tollbooth_name,
+        "calirepr": tb.calirepr,
+        "area": tb.area,
+        "subarea": tb.subarea,
+        "lat": tb.lat,
+        "lng": tb.lng,
+        "source": TbImt.name()
+    }
+
+
+_ROW_SERIALIZERS = {
+    Tollbooth.name(): lambda tb: {**_tb_row(tb), "source": Tollbooth.name()},
+    TbSts.name(): _tb_sts_row,
+    TbImt.name(): _tb_imt_row,
+}
+
+
+_PROJECTIONS = {
+    Tollbooth.name(): Projection(Tollbooth, {field: field for field in Tollbooth.online_empty_fields({"legacy_id"})}),
+    TbSts.name(): Projection(
+        TbSts,
+        {
+            "tollbooth_id": "index", "tollbooth_name": "tollbooth_name", "stretch_name": "stretch_name",
+            "lat": "lat", "lng": "lng", "info_year": "info_year"
+        },
+        {"source": TbSts.name()}
+    ),
+    TbImt.name(): Projection(
+        TbImt,
+        {
+            "tollbooth_id": "tollbooth_id", "tollbooth_name": "tollbooth_name", "calirepr": "calirepr",
+            "area": "area", "subarea": "subarea", "lat": "lat", "lng": "lng"
+        },
+        {"source": TbImt.name()}
+    ),
+}
+
+
+def _stretch_toll_row(row: tuple[TbStretchId, Stretch, StretchToll | None]) -> dict:
+    tb_st, stretch, stretch_toll = row
+    fields = {
+        "stretch_id": stretch.stretch_id,
+        "stretch_name": stretch.stretch_name,
+        "tollbooth_id_in": tb_st.tollbooth_id_in,
+        "tollbooth_id_out": tb_st.tollbooth_id_out
+    }
+    if stretch_toll is not None:
+        fields.update(stretch_toll.get_not_null_fields())
+    return fields
+
+
+def _check_format(format: str, projection: Projection | None, stream: bool):
+    if format not in FORMATS or (format != "json" and projection is None):
+        raise HTTPException(status_code=400, detail=f"unsupported format: {format}")
+    if stream and format != "json":
+        raise HTTPException(status_code=400, detail="stream is only available with the json format")
+
+
+def _list_rows(
+    session: ReadSessionDep, response: Response, stm, keyset: Keyset, serialize: Callable[[Any], dict],
+    offset: int, limit: int, cursor: str | None, stream: bool,
+    projection: Projection | None = None, format: str = "json", params: dict | None = None
+):
+    """One keyset page of `stm`, or every row after `cursor` as NDJSON when `stream` is set.
+
+    `format` columnar/arrow returns the page as column arrays of `projection`.
+    """
+    _check_format(format, projection, stream)
+    try:
+        if stream:
+            return ndjson_response(keyset.apply(stm, cursor).offset(offset), serialize, params)
+        if format != "json":
+            if params:
+                stm = stm.params(params)
+            return columnar_page(session.connection(), stm, projection, keyset, cursor, limit, offset, format)
+        page = keyset.page(stm, cursor, limit).offset(offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+    rows = keyset.paginate(list(session.exec(page, params=params)), limit, response)
+    return [serialize(row) for row in rows]
+
+
+async def _alist_rows(
+    session: AsyncReadSessionDep, response: Response, stm, keyset: Keyset, serialize: Callable[[Any], dict],
+    offset: int, limit: int, cursor: str | None, stream: bool,
+    projection: Projection | None = None, format: str = "json", params: dict | None = None
+):
+    """`_list_rows` on the async session; streams keep their sync reader."""
+    _check_format(format, projection, stream)
+    try:
+        if stream:
+            return ndjson_response(keyset.apply(stm, cursor).offset(offset), serialize, params)
+        if format != "json":
+            if params:
+                stm = stm.params(params)
+            return await session.run_sync(lambda sync_session: columnar_page(
+                sync_session.connection(), stm, projection, keyset, cursor, limit, offset, format
+            ))
+        page = keyset.page(stm, cursor, limit).offset(offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+    rows = keyset.paginate(list(await session.exec(page, params=params)), limit, response)
+    return [serialize(row) for row in rows]
+
+
+def _frame_list_rows(
+    response: Response, df: pl.DataFrame, keyset: Keyset, rows: Callable[[pl.DataFrame], list],
+    serialize: Callable[[Any], dict], offset: int, limit: int, cursor: str | None, stream: bool,
+    projection: Projection | None = None, format: str = "json"
+):
+    """`_list_rows` over a frame of the frame backend, sorted on the keyset columns."""
+    _check_format(format, projection, stream)
+    try:
+        df = after_cursor(df, [column.key for column in keyset.columns], cursor).slice(offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+    if stream:
+        return ndjson_frame_response(df, rows, serialize)
+    page = df.head(limit + 1)
+    if format != "json":
+        return frame_columnar_page(page, projection, keyset, limit, format)
+    return [serialize(row) for row in keyset.paginate(rows(page), limit, response)]
+
+
+def _parse_bbox(bbox: Any) -> tuple[float, float, float, float]:
+    try:
+        south, west, north, east = (float(v) for v in bbox)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="bbox must be [south, west, north, east]") from None
+    if south > north or west > east:
+        raise HTTPException(status_code=400, detail="bbox must be ordered as [south, west, north, east]")
+    return south, west, north, east
+
+
+def _parse_sources(body: dict) -> list[str]:
+    sources = body.get("sources") or list(LOCATED_MODELS)
+    unknown = set(sources).difference(LOCATED_MODELS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown sources: {', '.join(sorted(unknown))}")
+    return sources
+
+
+def _compile_query(model: type[TbModel], parsed: dict) -> CompiledQuery:
+    try:
+        return compile_query(model, parsed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+
+
+def _located_points(session: ReadSessionDep, info_year: int | None) -> pl.DataFrame:
+    frames = []
+    for source, model in LOCATED_MODELS.items():
+        status = getattr(model, "status", literal(None))
+        stm = select(literal(source).label("source"), model.lat, model.lng, status.label("status"))
+        if info_year is not None:
+            stm = stm.where(model.info_year == info_year)
+        frames.append(pl.read_database(stm, connection=session.connection(), schema_overrides=_POINTS_SCHEMA))
+    return pl.concat(frames)
+
+
+def _neighbour_points(session: ReadSessionDep, info_year: int | None) -> pl.DataFrame:
+    frames = []
+    for source, model in LOCATED_MODELS.items():
+        stm = select(
+            literal(source).label("source"), model.tollbooth_id, model.tollbooth_name, model.lat, model.lng,
+            model.info_year
+        )
+        if info_year is not None:
+            stm = stm.where(model.info_year == info_year)
+        frames.append(pl.read_database(stm, connection=session.connection(), schema_overrides=_NEIGHBOUR_POINTS_SCHEMA))
+    return pl.concat(frames)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
+    for session in get_read_session():
+        name_cache.get(lambda session=session: name_rows(session.connection()))
+    revision_watcher = RevisionWatcher(get_engine(), response_cache)
+    revision_watcher.start()
+    get_write_queue().start()
+    if frame_store is not None:
+        frame_store.start()
     yield
+    if frame_store is not None:
+        frame_store.stop()
+    get_write_queue().stop()
+    revision_watcher.stop()
 
 
 app = FastAPI(lifespan=lifespan)
-app.mount("/static", StaticFiles(directory="static", follow_symlink=True), name="static")
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache, routes=_CACHED_ROUTES)
+# Outermost, so responses served from the cache are timed too.
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+# Next to this module, so the app also starts outside src/ (the benchmark driver, tests). static/ is not
+# in the repository; without it the app still starts and /static answers with an error.
+_APP_DIR = Path(__file__).resolve().parent
+app.mount("/static", StaticFiles(directory=_APP_DIR / "static", follow_symlink=True, check_dir=False), name="static")
+# Exported by the static_export step; read-only map viewers load the catalog from here with range requests.
+app.mount("/tiles", CachedStaticFiles(directory=TILES_DIR, check_dir=False), name="tiles")
 
-templates = Jinja2Templates(directory="templates")
+templates = Jinja2Templates(directory=_APP_DIR / "templates")
 
 
 @app.get("/", response_class=HTMLResponse)
-def map_root(request: Request):
+def map_root(request: Request, viewer: bool=False, year: int | None=None):
+    """The map; `viewer` makes it read-only and load the static tiles of `year` (the latest exported by default)."""
     query_endpoints = {
         "tb": "fetch_tollbooths",
         "tbsts": "fetch_tollbooths_sts",
         "tbimt": "fetch_tollbooths_imt"
     }
+    viewport_sources = {
+        "tb": Tollbooth.name(),
+        "tbsts": TbSts.name(),
+        "tbimt": TbImt.name()
+    }
+    tiles_manifest = None
+    if viewer:
+        if year is not None and not has_tiles(year):
+            raise HTTPException(status_code=404, detail=f"no tiles exported for {year}")
+        tiles_year = year if year is not None else latest_tiles_year()
+        if tiles_year is not None:
+            tiles_manifest = request.url_for("tiles", path=f"{tiles_year}/{MANIFEST_FILENAME}").path
     return templates.TemplateResponse(
-        request=request, name="map.html", context={"query_endpoints": query_endpoints}
+        request=request, name="map.html", context={
+            "query_endpoints": query_endpoints,
+            "viewport_sources": viewport_sources,
+            "viewport_min_zoom": _VIEWPORT_MIN_ZOOM,
+            "tiles_manifest": tiles_manifest
+        }
     )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def fetch_metrics():
+    """Request latencies, response sizes and query counts in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/api/tollbooths/")
-def fetch_tollbooths(body: Annotated[Any, Body()], session: SessionDep, offset: int=0, limit: int=1000):
+def fetch_tollbooths(
+    body: Annotated[Any, Body()], session: ReadSessionDep, response: Response,
+    offset: int=0, limit: PageLimit=1000, cursor: str | None=None, stream: bool=False, format: str="json"
+):
     if body.get("suggestions", False) is True:
-        stm = select(Tollbooth).where(Tollbooth.tollbooth_name.ilike(f"%{body['query']}%"))
-        tollbooths = session.exec(stm)
-        data = []
-        for row in tollbooths:
-            data.append(row)
-        _log.debug(data)
+        return name_suggestions(
+            session.connection(), body["query"], [Tollbooth.name()], min(limit, _SUGGESTIONS_MAX_LIMIT)
+        )
+
+    if frame_store is not None:
+        return _frame_list_rows(
+            response, _tollbooths_frame(body), Keyset(Tollbooth), lambda df: models(Tollbooth, df), _tb_row,
+            offset, limit, cursor, stream, _PROJECTIONS[Tollbooth.name()], format
+        )
+    stm, params = _tollbooths_stm(body)
+    return _list_rows(
+        session, response, stm, Keyset(Tollbooth), _tb_row, offset, limit, cursor, stream,
+        _PROJECTIONS[Tollbooth.name()], format, params
+    )
+
+
+def _parse_query(body: dict) -> dict:
+    try:
+        return parse_query(body["query"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+
+
+def _tollbooths_frame(body: dict) -> pl.DataFrame:
+    parsed = _parse_query(body)
+    if parsed["param"] == "empty_stretch":
+        return empty_stretch_tollbooths(frame_store)
+    if parsed["param"] == "road":
+        return road_tollbooths(frame_store, parsed.get("values", []))
+    return _model_frame(Tollbooth, parsed)
+
+
+def _model_frame(model: type[TbModel], parsed: dict | None) -> pl.DataFrame:
+    try:
+        return model_query(frame_store, model, parsed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+
+
+def _tollbooths_stm(body: dict) -> tuple[Any, dict]:
+    parsed = _parse_query(body)
+
+    params = {}
+    if parsed["param"] == "empty_stretch":
+        # Find tollbooths not in either TbStretchId.tollbooth_id_in or tollbooth_id_out
+        subquery_in = select(TbStretchId.tollbooth_id_in)
+        subquery_out = select(TbStretchId.tollbooth_id_out)
+        stm = select(Tollbooth).where(
+            not_(Tollbooth.tollbooth_id.in_(subquery_in)),
+            not_(Tollbooth.tollbooth_id.in_(subquery_out)),
+            Tollbooth.status == "open"
+        )
+    elif parsed["param"] == "road":
+        filters = [
+            Stretch.road_id.in_(parsed.get("values", []))
+        ]
+        # distinct: a tollbooth closing several stretches of the road is listed once.
+        stm = select(Tollbooth).select_from(
+            join(TbStretchId, Tollbooth, TbStretchId.tollbooth_id_out == Tollbooth.tollbooth_id)
+        ).join(Stretch).where(*filters).distinct()
     else:
-        try:
-            parsed = parse_query(body["query"])
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-
-        if parsed["param"] == "empty_stretch":
-            # Find tollbooths not in either TbStretchId.tollbooth_id_in or tollbooth_id_out
-            subquery_in = select(TbStretchId.tollbooth_id_in)
-            subquery_out = select(TbStretchId.tollbooth_id_out)
-            stm = select(Tollbooth).where(
-                not_(Tollbooth.tollbooth_id.in_(subquery_in)),
-                not_(Tollbooth.tollbooth_id.in_(subquery_out)),
-                Tollbooth.status == "open"
-            )
-            tollbooths = session.exec(stm)
-            data = []
-            for tb in tollbooths:
-                tb_data = tb.online_filled_fields(exclude_fields={"legacy_id"})
-                data.append(tb_data)
-        elif parsed["param"] == "road":
-            params = [
-                Stretch.road_id.in_(parsed.get("values", []))
-            ]
-            stm = select(Tollbooth).select_from(
-                join(TbStretchId, Tollbooth, TbStretchId.tollbooth_id_out == Tollbooth.tollbooth_id)
-            ).join(Stretch).where(*params)
-            tb_stretch = session.exec(stm.offset(offset).limit(limit))
-            data = []
-            for tb_st in tb_stretch:
-                tb_data = tb_st.online_filled_fields(exclude_fields={"legacy_id"})
-                data.append(tb_data)
-        else:
-            param = parsed["param"]
-            values = parsed.get("values", [])
-            if param in ["id", "name"]:
-                param = f"tollbooth_{param}"
-            if len(values) > 1:
-                params = []
-                for value in values:
-                    params.append(getattr(Tollbooth, param) == value)
-                stm = select(Tollbooth).where(or_(*params))
-                tollbooths = session.exec(stm.offset(offset).limit(limit))
-            else:
-                if values[0] == "all":
-                    stm = select(Tollbooth)
-                    tollbooths = session.exec(stm)
-                else:
-                    stm = select(Tollbooth).where(getattr(Tollbooth, param) == values[0])
-                    tollbooths = session.exec(stm.offset(offset).limit(limit))
-            data = []
-            for tb in tollbooths:
-                tb_data = tb.online_filled_fields(exclude_fields={"legacy_id"})
-                data.append(tb_data)
-    return data
+        compiled = _compile_query(Tollbooth, parsed)
+        stm, params = compiled.stm, compiled.params
+    return stm, params
+
+
+def _model_query(model: type[TbModel], body: dict) -> CompiledQuery:
+    """Rows of `model` matching the optional query of `body`."""
+    if not body["query"]:
+        return CompiledQuery(select(model), {})
+    return _compile_query(model, _parse_query(body))
 
 
 @app.post("/api/tollbooths_sts")
-def fetch_tollbooths_sts(body: Annotated[Any, Body()], session: SessionDep, offset: int=0, limit=1000):
-    if body["query"]:
-        try:
-            parsed = parse_query(body["query"])
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-        stm = select(TbSts)
-        param = parsed.get("param")
-        if param in ["id"]:
-            param = f"tollbooth_{param}"
-        values = parsed.get("values", [])
-        if len(values) > 1:
-            params = []
-            for value in values:
-                params.append(getattr(TbSts, param) == value)
-            stm = stm.where(or_(*params))
-        else:
-            stm = stm.where(getattr(TbSts, param) == values[0])
-    else:
-        stm = select(TbSts)
-    tollbooths_sts = session.exec(stm.offset(offset).limit(limit))
+def fetch_tollbooths_sts(
+    body: Annotated[Any, Body()], session: ReadSessionDep, response: Response,
+    offset: int=0, limit: PageLimit=1000, cursor: str | None=None, stream: bool=False, format: str="json"
+):
+    if frame_store is not None:
+        df = _model_frame(TbSts, _parse_query(body) if body["query"] else None)
+        return _frame_list_rows(
+            response, df, Keyset(TbSts), lambda df: models(TbSts, df), _tb_sts_row, offset, limit, cursor, stream,
+            _PROJECTIONS[TbSts.name()], format
+        )
+    compiled = _model_query(TbSts, body)
+    return _list_rows(
+        session, response, compiled.stm, Keyset(TbSts), _tb_sts_row, offset, limit, cursor, stream,
+        _PROJECTIONS[TbSts.name()], format, compiled.params
+    )
+
+
+@app.post("/api/tollbooths_viewport")
+def fetch_tollbooths_viewport(body: Annotated[Any, Body()], session: ReadSessionDep, limit: int=5000):
+    try:
+        zoom = int(body["zoom"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="'zoom' is required") from None
+    if zoom < _VIEWPORT_MIN_ZOOM:
+        raise HTTPException(status_code=400, detail=f"zoom must be at least {_VIEWPORT_MIN_ZOOM} for point queries")
+    south, west, north, east = _parse_bbox(body.get("bbox"))
+    sources = _parse_sources(body)
+
     data = []
-    for tb_sts in tollbooths_sts:
-        data.append({
-            "tollbooth_id": tb_sts.index,
-            "tollbooth_name": tb_sts.tollbooth_name,
-            "stretch_name": tb_sts.stretch_name,
-            "lat": tb_sts.lat,
-            "lng": tb_sts.lng,
-            "info_year": tb_sts.info_year,
-            "source": TbSts.name()
-        })
+    for source in sources:
+        model = LOCATED_MODELS[source]
+        stm = viewport_stm(model, south, west, north, east)
+        if body.get("info_year") is not None:
+            stm = stm.where(model.info_year == body["info_year"])
+        for row in session.exec(stm.limit(limit)):
+            data.append(_ROW_SERIALIZERS[source](row))
+    return data
+
+
+@app.post("/api/tollbooth_clusters")
+def fetch_tollbooth_clusters(body: Annotated[Any, Body()], session: ReadSessionDep):
+    try:
+        zoom = int(body["zoom"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="'zoom' is required") from None
+    resolution = zoom_to_resolution(zoom)
+    sources = _parse_sources(body)
+
+    df_clusters = cluster_cache.get(
+        body.get("info_year"), resolution, lambda info_year: _located_points(session, info_year)
+    )
+    df_clusters = df_clusters.filter(pl.col("source").is_in(sources))
+    if body.get("bbox") is not None:
+        south, west, north, east = _parse_bbox(body["bbox"])
+        df_clusters = df_clusters.filter(
+            pl.col("lat").is_between(south, north), pl.col("lng").is_between(west, east)
+        )
+    return {"resolution": resolution, "clusters": cluster_rows(df_clusters)}
+
+
+@app.post("/api/tollbooth_suggestions")
+def fetch_tollbooth_suggestions(body: Annotated[Any, Body()], session: ReadSessionDep, limit: int=10):
+    query = body.get("query")
+    if not isinstance(query, str):
+        raise HTTPException(status_code=400, detail="'query' is required")
+    sources = _parse_sources(body)
+    limit = max(1, min(limit, _SUGGESTIONS_MAX_LIMIT))
+    info_year = body.get("info_year")
+    data = []
+    if body.get("fuzzy", False) is not True:
+        data = name_suggestions(session.connection(), query, sources, limit, info_year=info_year)
+    if not data:
+        name_index = name_cache.get(lambda: name_rows(session.connection()))
+        data = name_index.search(query, sources, limit, info_year=info_year)
     return data
 
 
 @app.post("/api/tollbooth_upsert/")
-def upsert_tollbooth(tollbooth: Tollbooth, session: SessionDep):
+def upsert_tollbooth(tollbooth: Tollbooth, write_queue: WriteQueueDep):
     _log.debug(tollbooth)
-    if tollbooth.tollbooth_id is not None:
-        db_tb = session.get(Tollbooth, tollbooth.tollbooth_id)
-        if not db_tb:
-            raise HTTPException(status_code=404, detail="Tollbooth not found")
-        tb_data = tollbooth.model_dump(exclude_unset=True)
-        db_tb.sqlmodel_update(tb_data)
-        session.add(db_tb)
-        session.commit()
-        session.refresh(db_tb)
-    else:
-        info_year = datetime.date.today().year
-        tollbooth.info_year = info_year
+
+    def _upsert(session: Session) -> dict:
+        if tollbooth.tollbooth_id is not None:
+            db_tb = session.get(Tollbooth, tollbooth.tollbooth_id)
+            if not db_tb:
+                raise HTTPException(status_code=404, detail="Tollbooth not found")
+            info_years = {db_tb.info_year}
+            tb_data = tollbooth.model_dump(exclude_unset=True)
+            db_tb.sqlmodel_update(tb_data)
+            db_tb.fill_h3_cells()
+            info_years.add(db_tb.info_year)
+            session.add(db_tb)
+            for info_year in info_years:
+                bump_revision(session.connection(), Tollbooth.__tablename__, info_year)
+            log_changes(session.connection(), Tollbooth, UPSERT, [db_tb.model_dump()])
+            session.commit()
+            session.refresh(db_tb)
+            for info_year in info_years:
+                response_cache.invalidate(Tollbooth.__tablename__, info_year)
+        else:
+            info_year = datetime.date.today().year
+            tollbooth.info_year = info_year
+            tollbooth.fill_h3_cells()
+            try:
+                session.add(tollbooth)
+                session.flush()
+                bump_revision(session.connection(), Tollbooth.__tablename__, info_year)
+                log_changes(session.connection(), Tollbooth, UPSERT, [tollbooth.model_dump()])
+                session.commit()
+                session.refresh(tollbooth)
+                response_cache.invalidate(Tollbooth.__tablename__, info_year)
+            except Exception as e:
+                _log.debug(e)
+                raise HTTPException(status_code=500) from e
+        return {"tollbooth_id": tollbooth.tollbooth_id, "info_year": tollbooth.info_year}
+
+    return write_queue.run(_upsert)
+
+
+@app.post("/api/tollbooths_upsert_batch")
+def upsert_tollbooths_batch(tollbooths: list[Tollbooth], write_queue: WriteQueueDep):
+    def _upsert(session: Session) -> tuple[list[dict], set[int]]:
+        try:
+            results, info_years = upsert_tollbooths(session, tollbooths)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e)) from None
         try:
-            session.add(tollbooth)
+            for info_year in info_years:
+                bump_revision(session.connection(), Tollbooth.__tablename__, info_year)
+            log_changes(session.connection(), Tollbooth, UPSERT, results)
             session.commit()
-            session.refresh(tollbooth)
         except Exception as e:
             _log.debug(e)
+            session.rollback()
             raise HTTPException(status_code=500)
+        return results, info_years
+
+    results, info_years = write_queue.run(_upsert)
+    for info_year in info_years:
+        response_cache.invalidate(Tollbooth.__tablename__, info_year)
+    return results
+
 
-    return {"tollbooth_id": tollbooth.tollbooth_id, "info_year": tollbooth.info_year}
+@app.get("/api/changes")
+def fetch_changes(session: ReadSessionDep, since: int=0, limit: int=1000):
+    """Rows added, modified or deleted after the data version `since`, for clients keeping a local copy.
+
+    A reset means the rows of that table and info_year (0: every year) were
+    replaced wholesale and have to be fetched again.
+    """
+    if since < 0 or since > current_version(session):
+        raise HTTPException(status_code=400, detail=f"unknown version {since}, fetch the data again")
+    return changes_since(session, since, max(1, min(limit, _CHANGES_MAX_LIMIT)))
 
 
 @app.post("/api/tollbooths_imt")
-def fetch_tollbooths_imt(body: Annotated[Any, Body()], session: SessionDep, offset: int=0, limit=2000):
-    if body["query"]:
-        try:
-            parsed = parse_query(body["query"])
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-        param = parsed.get("param")
-        values = parsed.get("values", [])
-        stm = select(TbImt)
-        if param in ["id"]:
-            param = f"tollbooth_{param}"
-        if len(values) > 1:
-            params = []
-            for value in values:
-                params.append(getattr(TbImt, param) == value)
-            stm = stm.where(or_(*params))
-        else:
-            stm = stm.where(getattr(TbImt, param) == values[0])
-    else:
-        stm = select(TbImt)
-    tbs = session.exec(stm.offset(offset).limit(limit))
-    data = []
-    for tb in tbs:
-        data.append({
-            "tollbooth_id": tb.tollbooth_id,
-            "tollbooth_name": tb.tollbooth_name,
-            "calirepr": tb.calirepr,
-            "area": tb.area,
-            "subarea": tb.subarea,
-            "lat": tb.lat,
-            "lng": tb.lng,
-            "source": TbImt.name()
-        })
-    return data
+def fetch_tollbooths_imt(
+    body: Annotated[Any, Body()], session: ReadSessionDep, response: Response,
+    offset: int=0, limit: PageLimit=2000, cursor: str | None=None, stream: bool=False, format: str="json"
+):
+    if frame_store is not None:
+        df = _model_frame(TbImt, _parse_query(body) if body["query"] else None)
+        return _frame_list_rows(
+            response, df, Keyset(TbImt), lambda df: models(TbImt, df), _tb_imt_row, offset, limit, cursor, stream,
+            _PROJECTIONS[TbImt.name()], format
+        )
+    compiled = _model_query(TbImt, body)
+    return _list_rows(
+        session, response, compiled.stm, Keyset(TbImt), _tb_imt_row, offset, limit, cursor, stream,
+        _PROJECTIONS[TbImt.name()], format, compiled.params
+    )
 
 
 @app.post("/api/empty_data")
@@ -219,39 +659,210 @@ def get_tb_tpl(body: Annotated[Any, Body()]):
 
 
 @app.post("/api/query_tollbooths")
-def query_tollbooths(body: Annotated[Any, Body()], session: SessionDep, offset: int=0, limit=20):
+def query_tollbooths(
+    body: Annotated[Any, Body()], session: ReadSessionDep, response: Response,
+    offset: int=0, limit: PageLimit=20, cursor: str | None=None, stream: bool=False
+):
     print(body)
+    if frame_store is not None:
+        return _frame_list_rows(
+            response, stretch_tolls(frame_store, body.get("tollbooth_id")), Keyset(TbStretchId, row_entity=lambda row: row[0]),
+            stretch_toll_rows, _stretch_toll_row, offset, limit, cursor, stream
+        )
+    stm, keyset = _stretch_tolls_stm(body)
+    return _list_rows(session, response, stm, keyset, _stretch_toll_row, offset, limit, cursor, stream)
+
+
+def _stretch_tolls_stm(body: dict) -> tuple[Any, Keyset]:
     params = [
         TbStretchId.tollbooth_id_in == body.get("tollbooth_id"),
         TbStretchId.tollbooth_id_out == body.get("tollbooth_id")
     ]
     stm = select(TbStretchId, Stretch, StretchToll).join(TbStretchId).join(StretchToll, isouter=True).where(or_(*params))
-    tb_stretch = session.exec(stm.offset(offset).limit(limit))
+    return stm, Keyset(TbStretchId, row_entity=lambda row: row[0])
+
+
+@app.get("/api/stretch/{stretch_id}")
+def fetch_stretch(stretch_id: int, session: ReadSessionDep, info_year: int | None=None):
+    """The StretchDetail row of `stretch_id` in `info_year`, the latest year by default."""
+    stm = select(StretchDetail).where(StretchDetail.stretch_id == stretch_id)
+    if info_year is not None:
+        stm = stm.where(StretchDetail.info_year == info_year)
+    detail = session.exec(stm.order_by(StretchDetail.info_year.desc()).limit(1)).first()
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Stretch not found")
+    row = {field: getattr(detail, field) for field in StretchDetail.model_fields}
+    return {**row, "tollbooths": json.loads(detail.tollbooths or "[]")}
+
+
+@app.post("/api/route_cost")
+def route_cost(body: Annotated[Any, Body()], session: ReadSessionDep):
+    try:
+        origin = int(body["origin"])
+        destination = int(body["destination"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="'origin' and 'destination' tollbooth ids are required") from None
+    weight = body.get("weight", "toll")
+    if weight not in WEIGHTS:
+        raise HTTPException(status_code=400, detail=f"weight must be one of {', '.join(WEIGHTS)}")
+    vehicles = body.get("vehicle") or StretchToll.vehicle_cols()
+    if isinstance(vehicles, str):
+        vehicles = [vehicles]
+    unknown = set(vehicles).difference(StretchToll.vehicle_cols())
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown vehicles: {', '.join(sorted(unknown))}")
+    info_year = body.get("info_year")
+    if info_year is None:
+        info_year = session.exec(select(func.max(TbStretchId.info_year))).one()
+
+    graph = route_cache.get(info_year, lambda info_year: load_edges(session.connection(), info_year))
+    missing = [str(tollbooth_id) for tollbooth_id in (origin, destination) if not graph.has_node(tollbooth_id)]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"tollbooths without stretches in {info_year}: {', '.join(missing)}")
+    return {
+        "origin": origin,
+        "destination": destination,
+        "info_year": info_year,
+        "weight": weight,
+        "routes": {vehicle: graph.route(origin, destination, vehicle, weight) for vehicle in vehicles},
+    }
+
+
+@app.post("/api/tollbooth_neightbours")
+def tollbooth_neighbours(body: Annotated[Any, Body()], session: ReadSessionDep, offset: int=0, limit=20):
+    if frame_store is not None:
+        return models(Tollbooth, local_neighbours(frame_store, body.get("tollbooth_id")).slice(offset, int(limit)))
+    tollbooths = session.exec(_neighbours_stm(body).offset(offset).limit(limit))
     data = []
-    for tb_st, stretch, stretch_toll in tb_stretch:
-        tolls = stretch_toll.get_not_null_fields()
-        fields = {
-            "stretch_id": stretch.stretch_id,
-            "stretch_name": stretch.stretch_name,
-            "tollbooth_id_in": tb_st.tollbooth_id_in,
-            "tollbooth_id_out": tb_st.tollbooth_id_out
-        }
-        fields.update(tolls)
-        data.append(fields)
+    for tb in tollbooths:
+        data.append(tb)
     return data
 
 
-@app.post("/api/tollbooth_neightbours")
-def tollbooth_neighbours(body: Annotated[Any, Body()], session: SessionDep, offset: int=0, limit=20):
-    stm = select(Tollbooth).select_from(
+@app.post("/api/neighbours")
+def fetch_neighbours(body: Annotated[Any, Body()], session: ReadSessionDep):
+    """Nearest tollbooths of each scope around a list of tollbooth_ids or around a lat/lng.
+
+    `k` bounds the count and `radius_km` the distance of the neighbours of each
+    scope; at least one is required. A tollbooth is not its own neighbour.
+    """
+    k, radius_km = body.get("k"), body.get("radius_km")
+    if k is None and radius_km is None:
+        raise HTTPException(status_code=400, detail="'k' or 'radius_km' is required")
+    try:
+        k = None if k is None else int(k)
+        radius_km = None if radius_km is None else float(radius_km)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="'k' must be an integer and 'radius_km' a number") from None
+    if k is not None and not 0 < k <= _NEIGHBOURS_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {_NEIGHBOURS_MAX_K}")
+    if radius_km is not None and radius_km < 0:
+        raise HTTPException(status_code=400, detail="radius_km must not be negative")
+    scopes = body.get("scope") or ["local"]
+    if isinstance(scopes, str):
+        scopes = [scopes]
+    unknown = set(scopes).difference(NEIGHBOUR_SCOPES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown scopes: {', '.join(sorted(unknown))}")
+
+    info_year = body.get("info_year")
+    if info_year is not None:
+        try:
+            info_year = int(info_year)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="'info_year' must be an integer") from None
+    index = neighbour_cache.get(info_year, lambda info_year: _neighbour_points(session, info_year))
+    if body.get("tollbooth_ids") is not None:
+        tollbooth_ids = body["tollbooth_ids"]
+        if not isinstance(tollbooth_ids, list) or len(tollbooth_ids) > _NEIGHBOURS_MAX_IDS:
+            raise HTTPException(status_code=400, detail=f"tollbooth_ids must be a list of at most {_NEIGHBOURS_MAX_IDS} ids")
+        origins = []
+        for tollbooth_id in tollbooth_ids:
+            location = index.location(Tollbooth.name(), tollbooth_id)
+            if location is None:
+                raise HTTPException(status_code=404, detail=f"tollbooth {tollbooth_id} not found or not located")
+            origins.append((tollbooth_id, *location))
+    else:
+        try:
+            origins = [(None, float(body["lat"]), float(body["lng"]))]
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="'tollbooth_ids' or 'lat' and 'lng' are required") from None
+
+    data = []
+    for tollbooth_id, lat, lng in origins:
+        neighbours = {}
+        for scope in scopes:
+            source = NEIGHBOUR_SCOPES[scope]
+            skip = tollbooth_id if source == Tollbooth.name() else None
+            neighbours[scope] = index.nearest(lat, lng, source, k, radius_km, skip)
+        data.append({"tollbooth_id": tollbooth_id, "lat": lat, "lng": lng, "neighbours": neighbours})
+    return data
+
+
+def _neighbours_stm(body: dict):
+    return select(Tollbooth).select_from(
             join(Tollbooth, TbNeighbour, TbNeighbour.neighbour_id == Tollbooth.tollbooth_id)
         ).where(
         TbNeighbour.tollbooth_id == body.get("tollbooth_id"),
         TbNeighbour.scope == 'local-local'
     )
-    tollbooths = session.exec(stm.offset(offset).limit(limit))
-    data = []
-    for tb in tollbooths:
-        data.append(tb)
-    return data
+
+
+# Async variants of the list endpoints, on the aiosqlite read engine: the
+# handlers run on the event loop instead of the threadpool.
+
+@app.post("/api/async/tollbooths/")
+async def fetch_tollbooths_async(
+    body: Annotated[Any, Body()], session: AsyncReadSessionDep, response: Response,
+    offset: int=0, limit: PageLimit=1000, cursor: str | None=None, stream: bool=False, format: str="json"
+):
+    if body.get("suggestions", False) is True:
+        return await session.run_sync(lambda sync_session: name_suggestions(
+            sync_session.connection(), body["query"], [Tollbooth.name()], min(limit, _SUGGESTIONS_MAX_LIMIT)
+        ))
+    stm, params = _tollbooths_stm(body)
+    return await _alist_rows(
+        session, response, stm, Keyset(Tollbooth), _tb_row, offset, limit, cursor, stream,
+        _PROJECTIONS[Tollbooth.name()], format, params
+    )
+
+
+@app.post("/api/async/tollbooths_sts")
+async def fetch_tollbooths_sts_async(
+    body: Annotated[Any, Body()], session: AsyncReadSessionDep, response: Response,
+    offset: int=0, limit: PageLimit=1000, cursor: str | None=None, stream: bool=False, format: str="json"
+):
+    compiled = _model_query(TbSts, body)
+    return await _alist_rows(
+        session, response, compiled.stm, Keyset(TbSts), _tb_sts_row, offset, limit, cursor, stream,
+        _PROJECTIONS[TbSts.name()], format, compiled.params
+    )
+
+
+@app.post("/api/async/tollbooths_imt")
+async def fetch_tollbooths_imt_async(
+    body: Annotated[Any, Body()], session: AsyncReadSessionDep, response: Response,
+    offset: int=0, limit: PageLimit=2000, cursor: str | None=None, stream: bool=False, format: str="json"
+):
+    compiled = _model_query(TbImt, body)
+    return await _alist_rows(
+        session, response, compiled.stm, Keyset(TbImt), _tb_imt_row, offset, limit, cursor, stream,
+        _PROJECTIONS[TbImt.name()], format, compiled.params
+    )
+
+
+@app.post("/api/async/query_tollbooths")
+async def query_tollbooths_async(
+    body: Annotated[Any, Body()], session: AsyncReadSessionDep, response: Response,
+    offset: int=0, limit: PageLimit=20, cursor: str | None=None, stream: bool=False
+):
+    stm, keyset = _stretch_tolls_stm(body)
+    return await _alist_rows(session, response, stm, keyset, _stretch_toll_row, offset, limit, cursor, stream)
+
+
+@app.post("/api/async/tollbooth_neightbours")
+async def tollbooth_neighbours_async(
+    body: Annotated[Any, Body()], session: AsyncReadSessionDep, offset: int=0, limit=20
+):
+    return list(await session.exec(_neighbours_stm(body).offset(offset).limit(limit)))
 
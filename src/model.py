@@ -2,9 +2,13 @@ from typing import Any, get_args
 
 import polars as pl
 import polars_ds as plds
+import polars_h3 as plh3
 from pydantic import GetCoreSchemaHandler
 from pydantic_core import CoreSchema, core_schema
-from sqlmodel import Field, SQLModel
+from sqlmodel import Field, Index, SQLModel
+
+# H3 resolutions stored as indexed columns (h3_cell_<res>) on the located models.
+H3_RESOLUTIONS = (4, 6, 8)
 
 
 def _str_normalize(func):
@@ -21,6 +25,12 @@ def _str_normalize(func):
     return wrapper
 
 
+def str_normalize_value(value: str) -> str:
+    """Normalize a single string the way the pipeline normalizes name columns."""
+    exprs = _str_normalize(lambda: ["value"])()
+    return pl.DataFrame({"value": [value]}).select(exprs).item()
+
+
 class UInt16(int):
     @classmethod
     def __get_pydantic_core_schema__(
@@ -177,14 +187,37 @@ class TbModel(SQLModel, Schema, table=False):
 
     @classmethod
     def dict_schema(cls, ignore: list | None = None) -> dict:
+        # h3 columns are derived from lat/lng when loading the db, data files don't carry them.
         if ignore is None:
             ignore = []
+        ignore = [*ignore, *cls.h3_columns().values()]
         return {
             field_name: cls._get_polars_dtype(field_type)
             for field_name, field_type in cls.model_fields.items()
             if field_name not in ignore
         }
 
+    @classmethod
+    def h3_columns(cls) -> dict[int, str]:
+        columns = {res: f"h3_cell_{res}" for res in H3_RESOLUTIONS}
+        return {res: column for res, column in columns.items() if column in cls.model_fields}
+
+    @classmethod
+    def h3_exprs(cls) -> list[pl.Expr]:
+        return [
+            plh3.latlng_to_cell("lat", "lng", res).cast(pl.Int64).alias(column)
+            for res, column in cls.h3_columns().items()
+        ]
+
+    def fill_h3_cells(self):
+        if self.lat is None or self.lng is None:
+            cells = dict.fromkeys(self.h3_columns().values())
+        else:
+            df = pl.DataFrame({"lat": [float(self.lat)], "lng": [float(self.lng)]})
+            cells = df.select(self.h3_exprs()).row(0, named=True)
+        for column, cell in cells.items():
+            setattr(self, column, cell)
+
 
 class Tollbooth(TbModel, table=True):
     tollbooth_id: UInt16 | None = Field(default=None, primary_key=True)
@@ -202,12 +235,16 @@ class Tollbooth(TbModel, table=True):
     info_year: UInt16 = Field(index=True)
     anti_evation_sys: Bool | None
     in_out: String | None
+    h3_cell_4: Int64 | None = Field(default=None, index=True)
+    h3_cell_6: Int64 | None = Field(default=None, index=True)
+    h3_cell_8: Int64 | None = Field(default=None, index=True)
 
     @classmethod
     def online_empty_fields(cls, exclude_fields: set | None = None) -> dict:
         fields = {}
         if exclude_fields is None:
             exclude_fields = {"tollbooth_id", "legacy_id", "lat", "lng", "info_year"}
+        exclude_fields = exclude_fields.union(cls.h3_columns().values())
         for field, _ in cls.model_fields.items():
             if field not in exclude_fields:
                 fields[field] = None
@@ -227,6 +264,11 @@ class Tollbooth(TbModel, table=True):
 
 
 class TbSts(TbModel, table=True):
+    # Keyset pages of one year.
+    __table_args__ = (
+        Index("ix_tbsts_info_year_tollbooth_id", "info_year", "tollbooth_id"),
+    )
+
     tollbooth_id: UInt32 | None = Field(default=None, primary_key=True)
     index: String
     tollbooth_name: String
@@ -265,6 +307,9 @@ class TbSts(TbModel, table=True):
     dec: Float64 | None
     info_year: UInt16 = Field(primary_key=True)
     status: String | None
+    h3_cell_4: Int64 | None = Field(default=None, index=True)
+    h3_cell_6: Int64 | None = Field(default=None, index=True)
+    h3_cell_8: Int64 | None = Field(default=None, index=True)
 
     @staticmethod
     @_str_normalize
@@ -298,6 +343,11 @@ class Road(TbModel, table=True):
 
 
 class Stretch(TbModel, table=True):
+    # Tollbooths by road.
+    __table_args__ = (
+        Index("ix_stretch_road_id", "road_id"),
+    )
+
     stretch_id: UInt32 | None = Field(default=None, primary_key=True)
     stretch_name: String = Field(index=True)
     stretch_length_km: Float64 | None
@@ -315,6 +365,12 @@ class Stretch(TbModel, table=True):
 
 
 class TbStretchId(TbModel, table=True):
+    # Stretches entering or leaving a tollbooth; the primary key leads with stretch_id.
+    __table_args__ = (
+        Index("ix_tbstretchid_in_info_year", "tollbooth_id_in", "info_year"),
+        Index("ix_tbstretchid_out_info_year", "tollbooth_id_out", "info_year"),
+    )
+
     stretch_id: UInt32 = Field(foreign_key="stretch.stretch_id", primary_key=True)
     tollbooth_id_in: UInt32 | None = Field(default=None, foreign_key="tollbooth.tollbooth_id", primary_key=True)
     tollbooth_id_out: UInt32 | None = Field(default=None, foreign_key="tollbooth.tollbooth_id", primary_key=True)
@@ -357,8 +413,68 @@ class StretchToll(TbModel, table=True):
     car_morning_night_hour: Float64 | None
     info_year: UInt16 = Field(index=True)
 
+    @classmethod
+    def vehicle_cols(cls) -> list[str]:
+        """The toll columns, one per vehicle class."""
+        schema = cls.dict_schema()
+        return [field for field, dtype in schema.items() if dtype == pl.Float64]
+
+
+class StretchDetail(TbModel, table=True):
+    """A stretch of a year with its road, tolls, tollbooths, traffic and revenue, built by the pipeline.
+
+    `tollbooths` is the JSON list of the in/out tollbooth pairs of the stretch;
+    tdpa and vta average the STS stations linked to it.
+    """
+    stretch_id: UInt32 = Field(primary_key=True)
+    stretch_name: String
+    stretch_length_km: Float64 | None
+    manage: String | None
+    way: String | None
+    road_id: UInt16 | None
+    road_name: String | None
+    operation_date: Date | None
+    start_contract_date: Date | None
+    end_contract_date: Date | None
+    tollbooths: String | None
+    motorbike: Float64 | None
+    car: Float64 | None
+    car_axle: Float64 | None
+    bus_2_axle: Float64 | None
+    bus_3_axle: Float64 | None
+    bus_4_axle: Float64 | None
+    truck_2_axle: Float64 | None
+    truck_3_axle: Float64 | None
+    truck_4_axle: Float64 | None
+    truck_5_axle: Float64 | None
+    truck_6_axle: Float64 | None
+    truck_7_axle: Float64 | None
+    truck_8_axle: Float64 | None
+    truck_9_axle: Float64 | None
+    load_axle: Float64 | None
+    truck_10_axle: Float64 | None
+    toll_ref: String | None
+    motorbike_axle: Float64 | None
+    car_rush_hour: Float64 | None
+    car_evening_hour: Float64 | None
+    pedestrian: Float64 | None
+    bicycle: Float64 | None
+    car_rush_hour_2: Float64 | None
+    car_evening_hour_2: Float64 | None
+    car_morning_night_hour: Float64 | None
+    sts_stations: UInt16 | None
+    tdpa: UInt32 | None
+    vta: UInt64 | None
+    annual_revenue: Int64 | None
+    info_year: UInt16 = Field(primary_key=True)
+
 
 class TbImt(TbModel, table=True):
+    # Keyset pages of one year.
+    __table_args__ = (
+        Index("ix_tbimt_info_year_tollbooth_id", "info_year", "tollbooth_id"),
+    )
+
     tollbooth_id: UInt16 = Field(primary_key=True)
     manage: String | None
     tollbooth_name: String
@@ -371,6 +487,9 @@ class TbImt(TbModel, table=True):
     lat: Float64 | None
     lng: Float64 | None
     info_year: UInt16 = Field(primary_key=True)
+    h3_cell_4: Int64 | None = Field(default=None, index=True)
+    h3_cell_6: Int64 | None = Field(default=None, index=True)
+    h3_cell_8: Int64 | None = Field(default=None, index=True)
 
     @staticmethod
     @_str_normalize
@@ -404,6 +523,11 @@ class TbTollImt(TbModel, table=True):
 
 
 class TbNeighbour(TbModel, table=True):
+    # Covers the neighbours of a tollbooth in a scope.
+    __table_args__ = (
+        Index("ix_tbneighbour_tollbooth_id_scope", "tollbooth_id", "scope", "neighbour_id"),
+    )
+
     id: UInt32 | None = Field(default=None, primary_key=True)
     tollbooth_id: UInt32
     neighbour_id: UInt32
@@ -424,6 +548,15 @@ class Inflation(TbModel, table=False):
     value: Float32
 
 
+class TollMatrixIndex(TbModel, table=False):
+    tollbooth_id: UInt32 = Field(primary_key=True)
+    network: UInt32
+    matrix_index: UInt32
+    offset: UInt64
+    size: UInt32
+    info_year: UInt16
+
+
 class TbImtStretchId(TbModel, table=True):
     id: UInt32 | None = Field(default=None, primary_key=True)
     stretch_id: UInt32 = Field(foreign_key="stretch.stretch_id", index=True)
@@ -478,3 +611,30 @@ class ManagerRevenue(TbModel, table=True):
     @classmethod
     def dict_schema(cls, ignore: list | None = None) -> dict:
         return super().dict_schema(ignore=["id"])
+
+
+class DataRevision(TbModel, table=True):
+    """Write counter per table and info_year (0 for writes that span every year).
+
+    Writers bump it in the same transaction as their changes so every API
+    process can tell which of its cached responses went stale.
+    """
+    table_name: String = Field(primary_key=True)
+    info_year: UInt16 = Field(primary_key=True)
+    revision: UInt64
+
+
+class ChangeLog(TbModel, table=True):
+    """Rows written to a table, in write order; `version` never goes back (AUTOINCREMENT).
+
+    `row_key` is the JSON object of the primary key of the row. A "reset" has
+    no row_key and stands for every row of table_name and info_year (0 for
+    every year), as after a bulk load.
+    """
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    version: UInt64 | None = Field(default=None, primary_key=True)
+    table_name: String
+    info_year: UInt16
+    row_key: String | None
+    op: String
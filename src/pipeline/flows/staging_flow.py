@@ -6,17 +6,24 @@ from prefect import flow
 from src.data_files import DataModel, DataStage
 from src.pipeline.tasks.cluster_tasks import (
     task_map_tb_id,
+    task_stretch_detail,
     task_tb_imt_stretch_id_rel,
     task_tb_stretch_id_sts,
+    task_toll_matrix,
     task_tollbooth_neighbours,
 )
 from src.pipeline.tasks.stage_tasks import (
     task_dv_cleaner,
     task_pub_to_stg,
     task_raw_to_stg,
+    task_snapshot,
+    task_static_export,
     task_tb_sts,
 )
 
+SNAPSHOT_STEP = "snapshot"
+STATIC_EXPORT_STEP = "static_export"
+
 
 def staging_tasks(year: int) -> dict[str, Callable[[], Any]]:
     pub = DataModel(year, DataStage.pub)
@@ -33,11 +40,15 @@ def staging_tasks(year: int) -> dict[str, Callable[[], Any]]:
         DataModel.inflation.name:         lambda: task_raw_to_stg(pub.inflation,       stg.inflation,       False),
         DataModel.manager_revenue.name:   lambda: task_raw_to_stg(pub.manager_revenue, stg.manager_revenue, True),
         DataModel.tb_neighbour.name:      lambda: task_tollbooth_neighbours(year),
+        DataModel.toll_matrix.name:       lambda: task_toll_matrix(year),
         DataModel.map_tb_id.name:         lambda: task_map_tb_id(year),
         DataModel.tb_sts.name:            lambda: task_tb_sts(year),
         DataModel.tb_imt_stretch_id.name: lambda: task_tb_imt_stretch_id_rel(year),
         DataModel.tb_sts_stretch_id.name: lambda: task_tb_stretch_id_sts(year, year),
         DataModel.osm_tb_distance.name:   lambda: task_pub_to_stg(pub.osm_tb_distance, stg.osm_tb_distance, False),
+        DataModel.stretch_detail.name:    lambda: task_stretch_detail(year),
+        SNAPSHOT_STEP:                    lambda: task_snapshot(year),
+        STATIC_EXPORT_STEP:               lambda: task_static_export(year),
     }
 
 STAGING_TASK_NAMES: list[str] = list(staging_tasks(0))
@@ -51,9 +62,11 @@ _STEP_TO_GROUP: dict[str, int] = {
             DataModel.tollbooth.name, DataModel.stretch.name, DataModel.road.name, DataModel.stretch_toll.name, DataModel.tb_stretch_id.name,
             DataModel.tb_imt.name, DataModel.tb_toll_imt.name, DataModel.manager_revenue.name
         ],
-        [DataModel.tb_neighbour.name],
+        [DataModel.tb_neighbour.name, DataModel.toll_matrix.name],
         [DataModel.map_tb_id.name, DataModel.tb_sts.name],
         [DataModel.tb_imt_stretch_id.name, DataModel.tb_sts_stretch_id.name],
+        [DataModel.stretch_detail.name],
+        [SNAPSHOT_STEP, STATIC_EXPORT_STEP],
     ])
     for step in group
 }
@@ -92,10 +105,13 @@ def staging_flow(year: int, from_step: str | None = None):
             task_raw_to_stg.submit(pub.manager_revenue, stg.manager_revenue, True),
         ]
 
-    # Group 2: neighbours
+    # Group 2 (parallel): neighbours + toll matrix
     g2 = []
     if start <= 3:
-        g2 = [task_tollbooth_neighbours.submit(year, wait_for=g0+g00+g1)] # type: ignore
+        g2 = [
+            task_tollbooth_neighbours.submit(year, wait_for=g0+g00+g1), # type: ignore
+            task_toll_matrix.submit(year, wait_for=g1), # type: ignore
+        ]
 
     # Group 3 (parallel): map_tb_id + tb_sts
     g3 = []
@@ -112,3 +128,20 @@ def staging_flow(year: int, from_step: str | None = None):
             task_tb_imt_stretch_id_rel.submit(year, wait_for=g3), # type: ignore
             task_tb_stretch_id_sts.submit(year, year, wait_for=g3), # type: ignore
         ]
+
+    # Group 5: per-stretch view joining the tables above
+    g5 = []
+    if start <= 6:
+        g5 = [task_stretch_detail.submit(year, wait_for=g1+g3+g4)] # type: ignore
+
+    # Group 6 (parallel): read-only snapshot of every staged table + static map tiles
+    g6 = []
+    if start <= 7:
+        g6 = [
+            task_snapshot.submit(year, wait_for=g0+g00+g1+g2+g3+g4+g5), # type: ignore
+            task_static_export.submit(year, wait_for=g1+g3), # type: ignore
+        ]
+
+    # A task no later group waits for would fail without failing the flow.
+    for future in g0+g00+g1+g2+g3+g4+g5+g6:
+        future.result()
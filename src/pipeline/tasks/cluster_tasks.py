@@ -1,6 +1,8 @@
 from prefect import task
 
 import src.scripts.join_tollbooths as join_tollbooths
+import src.scripts.stretch_detail as stretch_detail
+import src.scripts.toll_matrix as toll_matrix
 import src.scripts.tollbooth_cluster as tollbooth_cluster
 
 
@@ -27,3 +29,13 @@ def task_tb_stretch_id_sts(base_year: int, move_year: int):
 @task(name="tb_distance")
 def task_tb_distance(year: int):
     return tollbooth_cluster.tb_distance(year)
+
+
+@task(name="toll-matrix")
+def task_toll_matrix(year: int):
+    return toll_matrix.toll_matrix(year)
+
+
+@task(name="stretch-detail")
+def task_stretch_detail(year: int):
+    return stretch_detail.stretch_detail(year)
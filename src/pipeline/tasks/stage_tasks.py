@@ -1,7 +1,9 @@
 from prefect import task
 
 import src.scripts.dv_cleaner as dv_cleaner
+import src.scripts.snapshot as snapshot
 import src.scripts.stage as stage
+import src.scripts.static_export as static_export
 from src.data_files import PathModel
 
 
@@ -32,3 +34,13 @@ def task_dv_cleaner(year: int):
 @task(name="tb-sts")
 def task_tb_sts(year: int):
     return stage.sts_ids(year, start_year=2018)
+
+
+@task(name="snapshot")
+def task_snapshot(year: int):
+    return snapshot.publish_snapshot(year)
+
+
+@task(name="static-export")
+def task_static_export(year: int):
+    return static_export.static_export(year)
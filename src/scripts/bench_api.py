@@ -0,0 +1,307 @@
+"""Load test of the API endpoints on a synthetic db (scripts/synthetic_db.py).
+
+Every route of src/main.py has a scenario that builds its requests from rows
+sampled out of the db. The endpoints are run one after the other, each with
+`--concurrency` requests in flight, in process through httpx's ASGI transport
+or against a running server with `--url`. The report gives requests/s and the
+p50/p95/p99 latency of each endpoint; `--output` saves it as JSON and
+`--baseline` fails the run when a p95 grew by more than `--tolerance` over a
+saved report.
+
+Requests skip the response cache (Cache-Control: no-cache) unless `--cache` is
+given, so the endpoints themselves are measured.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+
+import httpx
+
+_log = logging.getLogger(__name__)
+_log.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.DEBUG)
+_log.addHandler(handler)
+
+# Routes of the framework, not of the API.
+_SKIP_ROUTES = {"/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc", "/static"}
+_SAMPLE_ROWS = 500
+
+
+@dataclass
+class Sample:
+    """Rows of the benchmarked db the requests are built from."""
+    year: int
+    tollbooths: list[tuple[int, str, float, float]]
+    stretch_pairs: list[tuple[int, int, int]]
+    version: int
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    params: dict | None = None
+    body: object = None
+
+
+# (method, route) -> builder of one request of the route.
+Scenario = Callable[[random.Random, Sample], Request]
+
+
+def _tollbooth(rng: random.Random, sample: Sample) -> tuple[int, str, float, float]:
+    return rng.choice(sample.tollbooths)
+
+
+def _tollbooths_body(rng: random.Random, sample: Sample) -> dict:
+    _, name, _, _ = _tollbooth(rng, sample)
+    return rng.choice([
+        {"query": f"tollbooth_name:{name}"},
+        {"query": "status:open"},
+        {"query": "empty_stretch"},
+    ])
+
+
+def _viewport_body(rng: random.Random, sample: Sample) -> dict:
+    _, _, lat, lng = _tollbooth(rng, sample)
+    return {"zoom": 9, "bbox": [lat - 0.5, lng - 0.5, lat + 0.5, lng + 0.5], "info_year": sample.year}
+
+
+def _route_body(rng: random.Random, sample: Sample) -> dict:
+    _, origin, _ = rng.choice(sample.stretch_pairs)
+    _, _, destination = rng.choice(sample.stretch_pairs)
+    return {"origin": origin, "destination": destination, "vehicle": "car", "info_year": sample.year}
+
+
+def _neighbours_body(rng: random.Random, sample: Sample) -> dict:
+    ids = [row[0] for row in rng.sample(sample.tollbooths, min(20, len(sample.tollbooths)))]
+    return {"tollbooth_ids": ids, "k": 5, "scope": ["local", "sts", "imt"], "info_year": sample.year}
+
+
+_LIST_SCENARIOS: dict[str, Callable[[random.Random, Sample], dict]] = {
+    "/api/tollbooths/": _tollbooths_body,
+    "/api/tollbooths_sts": lambda rng, sample: {"query": ""},
+    "/api/tollbooths_imt": lambda rng, sample: {"query": ""},
+    "/api/query_tollbooths": lambda rng, sample: {"tollbooth_id": _tollbooth(rng, sample)[0]},
+    "/api/tollbooth_neightbours": lambda rng, sample: {"tollbooth_id": _tollbooth(rng, sample)[0]},
+}
+
+SCENARIOS: dict[tuple[str, str], Scenario] = {
+    ("GET", "/"): lambda rng, sample: Request("GET", "/"),
+    ("GET", "/metrics"): lambda rng, sample: Request("GET", "/metrics"),
+    ("POST", "/api/tollbooths_viewport"): lambda rng, sample: Request(
+        "POST", "/api/tollbooths_viewport", body=_viewport_body(rng, sample)
+    ),
+    ("POST", "/api/tollbooth_clusters"): lambda rng, sample: Request(
+        "POST", "/api/tollbooth_clusters", body={"zoom": rng.randint(4, 11), "info_year": sample.year}
+    ),
+    ("POST", "/api/tollbooth_suggestions"): lambda rng, sample: Request(
+        "POST", "/api/tollbooth_suggestions", body={"query": _tollbooth(rng, sample)[1][:4]}
+    ),
+    ("POST", "/api/tollbooth_upsert/"): lambda rng, sample: Request(
+        "POST", "/api/tollbooth_upsert/", body=dict(zip(("tollbooth_id", "tollbooth_name"), _tollbooth(rng, sample)[:2], strict=True))
+    ),
+    ("POST", "/api/tollbooths_upsert_batch"): lambda rng, sample: Request(
+        "POST", "/api/tollbooths_upsert_batch",
+        body=[dict(zip(("tollbooth_id", "tollbooth_name"), row[:2], strict=True)) for row in rng.sample(sample.tollbooths, 10)],
+    ),
+    ("GET", "/api/changes"): lambda rng, sample: Request(
+        "GET", "/api/changes", params={"since": rng.randint(0, sample.version), "limit": 100}
+    ),
+    ("POST", "/api/empty_data"): lambda rng, sample: Request("POST", "/api/empty_data", body={"source": "tollbooth"}),
+    ("GET", "/api/stretch/{stretch_id}"): lambda rng, sample: Request(
+        "GET", f"/api/stretch/{rng.choice(sample.stretch_pairs)[0]}"
+    ),
+    ("POST", "/api/route_cost"): lambda rng, sample: Request("POST", "/api/route_cost", body=_route_body(rng, sample)),
+    ("POST", "/api/neighbours"): lambda rng, sample: Request(
+        "POST", "/api/neighbours", body=_neighbours_body(rng, sample)
+    ),
+}
+# The list endpoints and their async variants take the same bodies.
+for _path, _body in _LIST_SCENARIOS.items():
+    for _route in (_path, _path.replace("/api/", "/api/async/", 1)):
+        SCENARIOS[("POST", _route)] = lambda rng, sample, route=_route, body=_body: Request(
+            "POST", route, body=body(rng, sample)
+        )
+
+
+def uncovered_routes(app) -> list[tuple[str, str]]:
+    """(method, path) of the routes of `app` without a scenario."""
+    routes = []
+    for route in app.routes:
+        if route.path in _SKIP_ROUTES:
+            continue
+        for method in sorted(getattr(route, "methods", None) or ()):
+            if method != "HEAD" and (method, route.path) not in SCENARIOS:
+                routes.append((method, route.path))
+    return routes
+
+
+def load_sample(db_path: str, rng: random.Random) -> Sample:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        year = conn.execute("SELECT max(info_year) FROM tollbooth").fetchone()[0]
+        tollbooths = conn.execute(
+            "SELECT tollbooth_id, tollbooth_name, lat, lng FROM tollbooth "
+            "WHERE lat IS NOT NULL AND lng IS NOT NULL AND tollbooth_name IS NOT NULL ORDER BY random() LIMIT ?",
+            (_SAMPLE_ROWS,),
+        ).fetchall()
+        stretch_pairs = conn.execute(
+            "SELECT stretch_id, tollbooth_id_in, tollbooth_id_out FROM tbstretchid WHERE info_year = ? "
+            "ORDER BY random() LIMIT ?",
+            (year, _SAMPLE_ROWS),
+        ).fetchall()
+        version = conn.execute("SELECT coalesce(max(version), 0) FROM changelog").fetchone()[0]
+    finally:
+        conn.close()
+    if not tollbooths or not stretch_pairs:
+        raise ValueError(f"{db_path} has no located tollbooths or stretches to build requests from")
+    rng.shuffle(tollbooths)
+    return Sample(year, tollbooths, stretch_pairs, version)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+@dataclass
+class EndpointReport:
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+def endpoint_report(latencies: list[float], errors: int, elapsed: float) -> EndpointReport:
+    return EndpointReport(
+        requests=len(latencies),
+        errors=errors,
+        rps=round(len(latencies) / elapsed, 1),
+        p50_ms=round(percentile(latencies, 50) * 1000, 2),
+        p95_ms=round(percentile(latencies, 95) * 1000, 2),
+        p99_ms=round(percentile(latencies, 99) * 1000, 2),
+    )
+
+
+async def _bench_endpoint(
+    client: httpx.AsyncClient, requests: list[Request], concurrency: int, headers: dict
+) -> EndpointReport:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def send(request: Request):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(
+                request.method, request.path, params=request.params, json=request.body, headers=headers
+            )
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+                _log.debug(f"{request.method} {request.path} {response.status_code}: {response.text[:200]}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(request) for request in requests))
+    return endpoint_report(latencies, errors, time.perf_counter() - start)
+
+
+async def _bench(
+    client: httpx.AsyncClient, sample: Sample, routes: list[tuple[str, str]], n: int, concurrency: int,
+    warmup: int, cache: bool, seed: int
+) -> dict[str, EndpointReport]:
+    headers = {} if cache else {"Cache-Control": "no-cache"}
+    reports = {}
+    for route in routes:
+        rng = random.Random(seed)
+        scenario = SCENARIOS[route]
+        # Warm-up requests build the per-year caches (clusters, route graph, neighbour index).
+        await _bench_endpoint(client, [scenario(rng, sample) for _ in range(warmup)], 1, headers)
+        report = await _bench_endpoint(client, [scenario(rng, sample) for _ in range(n)], concurrency, headers)
+        reports[" ".join(route)] = report
+        _log.info(
+            f"{' '.join(route):<45} {report.rps:>9.1f} req/s  p50 {report.p50_ms:>8.2f}  p95 {report.p95_ms:>8.2f}  "
+            f"p99 {report.p99_ms:>8.2f} ms  errors {report.errors}"
+        )
+    return reports
+
+
+async def run(
+    db_path: str, url: str | None = None, n: int = 200, concurrency: int = 8, warmup: int = 2,
+    cache: bool = False, seed: int = 0, only: list[str] | None = None
+) -> dict[str, EndpointReport]:
+    """Benchmark every route with a scenario, or the routes whose path contains one of `only`."""
+    sample = load_sample(db_path, random.Random(seed))
+    routes = [route for route in SCENARIOS if not only or any(part in route[1] for part in only)]
+    if url is not None:
+        async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+            return await _bench(client, sample, routes, n, concurrency, warmup, cache, seed)
+
+    # The app reads the db of TB_EDITOR_DB, which has to be set before it is imported.
+    os.environ["TB_EDITOR_DB"] = os.path.abspath(db_path)
+    os.environ.pop("TB_SNAPSHOT_DB", None)
+    from src.main import app
+
+    missing = uncovered_routes(app)
+    if missing:
+        _log.warning(f"routes without a benchmark scenario: {missing}")
+    transport = httpx.ASGITransport(app=app)
+    async with (
+        app.router.lifespan_context(app),
+        httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client,
+    ):
+        return await _bench(client, sample, routes, n, concurrency, warmup, cache, seed)
+
+
+def regressions(reports: dict[str, EndpointReport], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    """Endpoints whose p95 grew by more than `tolerance` (0.2: 20%) over `baseline`."""
+    slower = []
+    for endpoint, report in reports.items():
+        before = baseline.get(endpoint)
+        if before is not None and report.p95_ms > before["p95_ms"] * (1 + tolerance):
+            slower.append(f"{endpoint}: p95 {before['p95_ms']} -> {report.p95_ms} ms")
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", help="db built by scripts/synthetic_db.py", required=True, type=str)
+    parser.add_argument("--url", help="benchmark a running server instead of the app in process", required=False, type=str)
+    parser.add_argument("--requests", help="requests per endpoint", required=False, type=int, default=200)
+    parser.add_argument("--concurrency", required=False, type=int, default=8)
+    parser.add_argument("--warmup", required=False, type=int, default=2)
+    parser.add_argument("--cache", help="let the response cache answer", required=False, action="store_true")
+    parser.add_argument("--seed", required=False, type=int, default=0)
+    parser.add_argument("--only", help="benchmark the routes containing these strings", required=False, nargs="+")
+    parser.add_argument("--output", help="write the report as JSON", required=False, type=str)
+    parser.add_argument("--baseline", help="JSON report to compare the p95 latencies with", required=False, type=str)
+    parser.add_argument("--tolerance", required=False, type=float, default=0.2)
+    args = parser.parse_args()
+
+    reports = asyncio.run(run(
+        args.db, args.url, args.requests, args.concurrency, args.warmup, args.cache, args.seed, args.only
+    ))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({endpoint: asdict(report) for endpoint, report in reports.items()}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(reports, json.load(f), args.tolerance)
+        for line in slower:
+            _log.error(f"regression {line}")
+        sys.exit(1 if slower else 0)
@@ -0,0 +1,160 @@
+"""Mixed read/write load against a running map API, reporting p50/p99 latency per request kind.
+
+Reads are viewport and name suggestion queries around random tollbooths; writes
+upsert a tollbooth with the name it already has, so the data does not change
+but every write goes through the writer and invalidates the cached responses.
+--benchmark instead sends the same list requests to the sync endpoints and to
+their /api/async/ variants and reports both.
+
+    uv run uvicorn src.main:app --workers 2
+    uv run python -m src.scripts.load_test --requests 2000 --concurrency 16 --write-ratio 0.1
+    uv run python -m src.scripts.load_test --benchmark --requests 2000 --concurrency 64
+"""
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+_log = logging.getLogger(__name__)
+_log.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.DEBUG)
+_log.addHandler(handler)
+
+# Mexico, [south, west, north, east]
+_COUNTRY_BBOX = [14.0, -118.0, 33.0, -86.0]
+_VIEWPORT_SPAN = 0.5
+
+_NO_CACHE = {"Cache-Control": "no-cache"}
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def _tollbooths(url: str, info_year: int | None) -> list[dict]:
+    body = {"zoom": 7, "bbox": _COUNTRY_BBOX, "sources": ["tollbooth"], "info_year": info_year}
+    response = requests.post(f"{url}/api/tollbooths_viewport", json=body, params={"limit": 100000})
+    response.raise_for_status()
+    return [row for row in response.json() if row.get("tollbooth_name")]
+
+
+def _read(url: str, tb: dict, info_year: int | None) -> requests.Response:
+    if random.random() < 0.5:
+        lat, lng = tb["lat"], tb["lng"]
+        span = random.uniform(0.1, 1.0) * _VIEWPORT_SPAN
+        body = {"zoom": 10, "bbox": [lat - span, lng - span, lat + span, lng + span], "info_year": info_year}
+        return _session().post(f"{url}/api/tollbooths_viewport", json=body)
+    query = tb["tollbooth_name"][: random.randint(3, 6)]
+    return _session().post(f"{url}/api/tollbooth_suggestions", json={"query": query, "info_year": info_year})
+
+
+def _write(url: str, tb: dict) -> requests.Response:
+    body = {"tollbooth_id": tb["tollbooth_id"], "tollbooth_name": tb["tollbooth_name"]}
+    return _session().post(f"{url}/api/tollbooth_upsert/", json=body)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _run(send: Callable[[], tuple[str, requests.Response]], n_requests: int, concurrency: int) -> dict:
+    """Call `send` n_requests times from `concurrency` threads; {kind: latency stats} plus the overall throughput."""
+    def _request(_) -> tuple[str, float, bool]:
+        start = time.perf_counter()
+        kind, response = send()
+        return kind, time.perf_counter() - start, response.status_code < 400
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(_request, range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    report = {}
+    for kind in dict.fromkeys(k for k, _, _ in results):
+        latencies = [latency * 1000 for k, latency, _ in results if k == kind]
+        report[kind] = {
+            "requests": len(latencies),
+            "errors": sum(1 for k, _, ok in results if k == kind and not ok),
+            "p50_ms": round(_percentile(latencies, 0.50), 1),
+            "p99_ms": round(_percentile(latencies, 0.99), 1),
+            "max_ms": round(max(latencies), 1),
+        }
+    report["requests_per_s"] = round(n_requests / elapsed, 1)
+    return report
+
+
+def load_test(url: str, n_requests: int, concurrency: int, write_ratio: float, info_year: int | None = None) -> dict:
+    """Run the mixed load and return {kind: {requests, errors, p50_ms, p99_ms, max_ms}} plus the overall throughput."""
+    tollbooths = _tollbooths(url, info_year)
+    if not tollbooths:
+        raise RuntimeError(f"no tollbooths served by {url}")
+
+    def _send() -> tuple[str, requests.Response]:
+        tb = random.choice(tollbooths)
+        if random.random() < write_ratio:
+            return "write", _write(url, tb)
+        return "read", _read(url, tb, info_year)
+
+    return _run(_send, n_requests, concurrency)
+
+
+def _list_request(tb: dict, info_year: int | None) -> tuple[str, dict]:
+    year_query = f"info_year:{info_year}" if info_year is not None else ""
+    path, body = random.choice((
+        ("/tollbooths/?limit=100", {"query": year_query or "status:open"}),
+        ("/tollbooths_sts?limit=100", {"query": year_query}),
+        ("/tollbooths_imt?limit=100", {"query": year_query}),
+        ("/query_tollbooths", {"tollbooth_id": tb["tollbooth_id"]}),
+        ("/tollbooth_neightbours", {"tollbooth_id": tb["tollbooth_id"]}),
+    ))
+    return path, body
+
+
+def benchmark(url: str, n_requests: int, concurrency: int, info_year: int | None = None) -> dict:
+    """Requests/s and latency of the sync list endpoints against their /api/async/ variants, on the same requests.
+
+    The response cache is skipped with Cache-Control: no-cache, so every request runs its handler.
+    """
+    tollbooths = _tollbooths(url, info_year)
+    if not tollbooths:
+        raise RuntimeError(f"no tollbooths served by {url}")
+    report = {}
+    for variant, prefix in (("sync", "/api"), ("async", "/api/async")):
+        random.seed(0)
+
+        def _send(prefix=prefix, variant=variant) -> tuple[str, requests.Response]:
+            path, body = _list_request(random.choice(tollbooths), info_year)
+            return variant, _session().post(f"{url}{prefix}{path}", json=body, headers=_NO_CACHE)
+
+        run = _run(_send, n_requests, concurrency)
+        report[variant] = {**run[variant], "requests_per_s": run["requests_per_s"]}
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000", type=str)
+    parser.add_argument("--requests", default=2000, type=int)
+    parser.add_argument("--concurrency", default=16, type=int)
+    parser.add_argument("--write-ratio", default=0.1, type=float)
+    parser.add_argument("--year", required=False, type=int)
+    parser.add_argument("--benchmark", help="compare the sync and async list endpoints", action="store_true")
+    args = parser.parse_args()
+    if args.benchmark:
+        report = benchmark(args.url, args.requests, args.concurrency, args.year)
+    else:
+        report = load_test(args.url, args.requests, args.concurrency, args.write_ratio, args.year)
+    for kind, stats in report.items():
+        _log.info(f"{kind}: {stats}")
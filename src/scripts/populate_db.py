@@ -1,12 +1,20 @@
 import argparse
 import logging
+import os
 import sqlite3
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import adbc_driver_sqlite.dbapi
 import polars as pl
+import pyarrow.parquet as pq
 
-from src.data_files import DataModel, DataStage
-from src.utils.connector import create_db_and_tables, sqlite_url
+from src.data_files import DataModel, DataStage, PathModel, table_frame
+from src.model import ChangeLog, DataRevision
+from src.utils.change_log import CHANGE_LOG_SQL, DELETE, UPSERT, change_rows, reset_row
+from src.utils.connector import create_db_and_tables, get_engine, sqlite_url
+from src.utils.response_cache import ALL_YEARS, REVISION_BUMP_SQL
 
 _log = logging.getLogger(__name__)
 _log.setLevel(logging.DEBUG)
@@ -15,95 +23,336 @@ handler.setLevel(logging.DEBUG)
 _log.addHandler(handler)
 
 
-def insert_data_from_parquet(ldf, model_name: str):
-    for i_batch, df in enumerate(ldf.collect_batches(chunk_size=1000), 1):
-        _log.debug(f"saving batch: {i_batch}")
-        df.write_database(
-            table_name=model_name,
-            connection=sqlite_url,
-            if_table_exists="append",
-            engine="adbc"
-        )
-
-    _log.info(f"saved data in {sqlite_url}")
-
-
-def insert_tb_from_data(data_model: DataModel):
-    parquet_file = data_model.tollbooths.parquet
-    model_name = data_model.tollbooths.model.name()
-    ldf_tb = pl.scan_parquet(parquet_file).select(pl.exclude("parent_manage"))
-    insert_data_from_parquet(ldf_tb, model_name)
+def record_revisions(cursor, model_name: str, years: set[int] | None = None, reset: bool = True):
+    """Bump the revision of `model_name` in `years` (None: every year) in the transaction of `cursor`.
 
+    With `reset` the change log also records the rows of those years as
+    replaced, so syncing clients fetch them again. `cursor` is a sqlite3 or
+    ADBC cursor, whichever wrote the rows.
+    """
+    for year in years or {ALL_YEARS}:
+        cursor.execute(REVISION_BUMP_SQL, (model_name, year))
+        if reset:
+            cursor.execute(CHANGE_LOG_SQL, reset_row(model_name, year))
 
-def insert_tb_sts_from_data(data_model: DataModel):
-    parquet_file = data_model.tb_sts.parquet
-    model_name = data_model.tb_sts.model.name()
-    ldf_tb_sts = pl.scan_parquet(parquet_file)
-    insert_data_from_parquet(ldf_tb_sts, model_name)
 
+def bump_revisions(model_name: str, years: set[int] | None = None, reset: bool = True):
+    """Tell the running API processes that `model_name` changed in `years` (None: every year)."""
+    conn = sqlite3.connect(sqlite_url.replace("sqlite:///", ""))
+    try:
+        with conn:
+            record_revisions(conn, model_name, years, reset)
+    finally:
+        conn.close()
+
+
+# Rows read per ADBC query by the exports.
+EXPORT_BATCH_ROWS = 8192
+
+# DataModel files backed by a table, in load order.
+LOAD_FILES = (
+    "tollbooth", "stretch", "road", "stretch_toll", "tb_stretch_id", "tb_sts", "tb_imt", "tb_toll_imt",
+    "tb_neighbour", "map_tb_id", "tb_imt_stretch_id", "tb_sts_stretch_id", "osm_tb_distance", "manager_revenue",
+    "stretch_detail",
+)
+
+
+def sql_dates(df: pl.DataFrame) -> pl.DataFrame:
+    """`df` with its dates as ISO text, as the model stores them.
+
+    The ADBC driver writes dates through 32-bit epoch seconds, which wrap
+    after 2038, so the frames are converted before an ingest too.
+    """
+    return df.with_columns(pl.col(pl.Date).dt.to_string("%Y-%m-%d"))
+
+
+_STAGED_KEYS = "_staged_keys"
+
+
+def _delete_staged_keys(cursor, table: str, df: pl.DataFrame, keys: list[str]) -> set[int]:
+    """Delete the rows of `table` holding a key of `df`; returns their years."""
+    cursor.adbc_ingest(_STAGED_KEYS, df.select(keys).to_arrow(), mode="create", temporary=True)
+    columns = ", ".join(keys)
+    where = f"({columns}) IN (SELECT {columns} FROM temp.{_STAGED_KEYS})"
+    cursor.execute(f"SELECT DISTINCT info_year FROM {table} WHERE {where}")
+    years = {row[0] for row in cursor.fetchall()}
+    cursor.execute(f"DELETE FROM {table} WHERE {where}")
+    cursor.execute(f"DROP TABLE temp.{_STAGED_KEYS}")
+    return years
+
+
+def replace_year(db_path: str, path_model: PathModel, df: pl.DataFrame, year: int):
+    """Swap the rows of `year` in the table of `path_model` for `df`, in one transaction.
+
+    The table indexes are dropped before the insert and rebuilt after it. The
+    triggers of the R-tree and name indexes stay, so they follow the new rows.
+    Tables without info_year are replaced whole; in those keyed without it, a
+    staged key replaces its row whatever its year. The revision bump and the
+    change log reset go in the same transaction and through the same driver:
+    the bundled SQLite of ADBC and the one of the sqlite3 module must not both
+    write a WAL database in one process.
+    """
+    table = path_model.model.name()
+    with adbc_driver_sqlite.dbapi.connect(db_path) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table,),
+            )
+            indexes = cursor.fetchall()
+            for name, _ in indexes:
+                cursor.execute(f"DROP INDEX {name}")
+            years = None
+            if "info_year" in path_model.model.model_fields:
+                years = {year}
+                keys = _sync_keys(path_model)
+                if keys and "info_year" not in keys:
+                    # Keys staged for `year` may be held by the rows of another year, as in current_frame.
+                    years |= _delete_staged_keys(cursor, table, df, keys)
+                cursor.execute(f"DELETE FROM {table} WHERE info_year = ?", (year,))
+            else:
+                cursor.execute(f"DELETE FROM {table}")
+            cursor.adbc_ingest(table, sql_dates(df).to_arrow(), mode="append")
+            for _, sql in indexes:
+                cursor.execute(sql)
+            record_revisions(cursor, table, years)
+        conn.commit()
 
-def insert_tb_imt_from_data(data_model: DataModel):
-    parquet_file = data_model.tb_imt.parquet
-    model_name = data_model.tb_imt.model.name()
-    ldf_tb_imt = pl.scan_parquet(parquet_file)
-    insert_data_from_parquet(ldf_tb_imt, model_name)
 
+def load_year(year: int, names: tuple[str, ...] = LOAD_FILES, stage: str = DataStage.stg) -> dict[str, int]:
+    """Replace the rows of `year` in the tables of `names` with the staged files; returns the rows per table.
 
-def insert_tb_from_db(data_model: DataModel, file_format: str):
-    if data_model.attr.get("year") is None:
-        print("--year argument is required for this option.")
-    else:
-        query = f"""
-            SELECT * FROM tollbooth WHERE info_year={data_model.attr.get("year")}
-        """
-        conn = sqlite3.connect(sqlite_url.replace("sqlite:///", ""))
-        df = pl.read_database(query, connection=conn, infer_schema_length=200)
-        df = df.select(pl.exclude("info_year"))
-        if file_format == "csv":
-           file_dest_path = data_model.tollbooths.csv
-           df.write_csv(file_dest_path, quote_style="non_numeric")
+    The files are read in parallel; SQLite takes one writer, so the tables are
+    written one after the other, each in a single transaction. The schema is
+    created through the sqlite3 module, whose pooled connections are closed
+    before ADBC opens the file (see replace_year).
+    """
+    create_db_and_tables()
+    get_engine().dispose()
+    db_path = sqlite_url.replace("sqlite:///", "")
+    data_model = DataModel(year, stage)
+    path_models = []
+    for name in names:
+        path_model = getattr(data_model, name)
+        if os.path.exists(path_model.parquet):
+            path_models.append(path_model)
         else:
-           file_dest_path = data_model.tollbooths.parquet
-           df.write_parquet(file_dest_path)
-        _log.info(f"Saved data in {file_dest_path}")
-
-
-def insert_tb_stretch_from_data(year: int, data_model: DataModel):
-    ldf_tb_stretch = pl.scan_parquet(data_model.tb_stretch_id.parquet)
-    model_name = data_model.tb_stretch_id.model.name()
-    ldf_tb_stretch = ldf_tb_stretch.filter(pl.col("tollbooth_id_in").is_not_null()).with_columns(pl.lit(year).alias("info_year"))
-    ldf_tb_stretch = ldf_tb_stretch.filter(pl.col("tollbooth_id_out").is_not_null())
-    insert_data_from_parquet(ldf_tb_stretch.unique(), model_name)
-
-
-def insert_stretch_from_data(data_model: DataModel):
-    ldf_stretch = pl.scan_parquet(data_model.stretchs.parquet)
-    model_name = data_model.stretchs.model.name()
-    insert_data_from_parquet(ldf_stretch, model_name)
-
-
-def insert_road_from_data(data_model: DataModel):
-    ldf_road = pl.scan_parquet(data_model.roads.parquet)
-    model_name = data_model.roads.model.name()
-    insert_data_from_parquet(ldf_road, model_name)
+            _log.warning(f"{path_model.parquet} not found, skipping {path_model.model.name()}")
+
+    loaded = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor() as pool:
+        frames = [pool.submit(lambda pm: table_frame(pm, year).collect(), pm) for pm in path_models]
+        for path_model, frame in zip(path_models, frames, strict=True):
+            df = frame.result()
+            table = path_model.model.name()
+            replace_year(db_path, path_model, df, year)
+            loaded[table] = df.height
+            _log.debug(f"loaded {df.height} rows in {table}")
+    _log.info(f"loaded {len(loaded)} tables of {year} in {sqlite_url} in {time.perf_counter() - start:.1f}s")
+    return loaded
+
+
+def cast_to_schema(df: pl.DataFrame, schema: dict) -> pl.DataFrame:
+    """`df` in the columns and dtypes of `schema`; dates come from SQLite as ISO text."""
+    return df.select(
+        pl.col(column).cast(pl.String).str.to_date("%Y-%m-%d", strict=False)
+        if dtype == pl.Date
+        else pl.col(column).cast(dtype, strict=False)
+        for column, dtype in schema.items()
+    )
+
+
+def _sync_keys(path_model: PathModel) -> list[str]:
+    return [column.name for column in path_model.model.__table__.primary_key.columns if column.name != "id"]
+
+
+def current_frame(conn: sqlite3.Connection, path_model: PathModel, year: int) -> pl.DataFrame:
+    """The rows of the table of `path_model` that the staged file of `year` can match, in the dtypes of the model.
+
+    Tables keyed without info_year are read whole, so a key staged for
+    another year updates its row instead of clashing with it.
+    """
+    model = path_model.model
+    schema = model.dict_schema()
+    keys = _sync_keys(path_model)
+    columns = list(schema) if keys or "id" in schema else ["id", *schema]
+    sql = f"SELECT {', '.join(columns)} FROM {model.name()}"
+    params = ()
+    if "info_year" in model.model_fields and (not keys or "info_year" in keys):
+        sql += " WHERE info_year = ?"
+        params = (year,)
+    rows = conn.execute(sql, params).fetchall()
+    df = pl.DataFrame(rows, schema=columns, orient="row", infer_schema_length=None)
+    return cast_to_schema(df, {column: schema.get(column, pl.Int64) for column in columns})
+
+
+def diff_rows(
+    df_current: pl.DataFrame, df_staged: pl.DataFrame, keys: list[str], columns: list[str]
+) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """(inserts, updates, deletes) that turn `df_current` into `df_staged`.
+
+    Rows are compared by the hash of `columns`. With `keys` a staged row whose
+    key exists with another hash is an update; without them (tables keyed by a
+    surrogate id) rows are matched by hash alone, and a changed row is a delete
+    plus an insert.
+    """
+    current = df_current.with_columns(df_current.select(columns).hash_rows().alias("_hash"))
+    staged = df_staged.with_columns(df_staged.select(columns).hash_rows().alias("_hash"))
+    if not keys:
+        keys = ["_hash"]
+        updates = staged.clear()
+    else:
+        matched = staged.join(current.select(*keys, pl.col("_hash").alias("_hash_db")), on=keys, how="inner")
+        updates = matched.filter(pl.col("_hash") != pl.col("_hash_db")).drop("_hash_db")
+    inserts = staged.join(current.select(keys), on=keys, how="anti")
+    deletes = current.join(staged.select(keys), on=keys, how="anti")
+    return inserts.drop("_hash"), updates.drop("_hash"), deletes.drop("_hash")
+
+
+def _sql_rows(df: pl.DataFrame) -> list[tuple]:
+    return sql_dates(df).rows()
+
+
+def apply_diff(
+    conn: sqlite3.Connection, path_model: PathModel, inserts: pl.DataFrame, updates: pl.DataFrame, deletes: pl.DataFrame
+):
+    """Write the diff of `diff_rows` in the table of `path_model`; the caller owns the transaction."""
+    table = path_model.model.name()
+    keys = _sync_keys(path_model) or ["id"]
+    where = " AND ".join(f"{key} = ?" for key in keys)
+    if not deletes.is_empty():
+        conn.executemany(f"DELETE FROM {table} WHERE {where}", _sql_rows(deletes.select(keys)))
+    if not updates.is_empty():
+        values = [column for column in updates.columns if column not in keys]
+        conn.executemany(
+            f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in values)} WHERE {where}",
+            _sql_rows(updates.select(*values, *keys)),
+        )
+    if not inserts.is_empty():
+        # Surrogate ids are assigned by SQLite.
+        inserts = inserts.drop("id", strict=False)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(inserts.columns)}) VALUES ({', '.join('?' * inserts.width)})",
+            _sql_rows(inserts),
+        )
 
 
-def insert_stretch_toll_from_data(data_model: DataModel):
-    ldf_stretch_toll = pl.scan_parquet(data_model.stretchs_toll.parquet)
-    model_name = data_model.stretchs_toll.model.name()
-    insert_data_from_parquet(ldf_stretch_toll, model_name)
+def sync_year(year: int, names: tuple[str, ...] = LOAD_FILES, stage: str = DataStage.stg) -> dict[str, dict[str, int]]:
+    """Apply to the tables of `names` only the rows of `year` that changed in the staged files.
 
+    Returns the inserted, updated and deleted rows per table. Every change
+    goes in one transaction, and only the tables that changed bump their
+    revision, so the cached responses of the rest stay valid.
+    """
+    create_db_and_tables()
+    data_model = DataModel(year, stage)
+    path_models = []
+    for name in names:
+        path_model = getattr(data_model, name)
+        if os.path.exists(path_model.parquet):
+            path_models.append(path_model)
+        else:
+            _log.warning(f"{path_model.parquet} not found, skipping {path_model.model.name()}")
 
-def insert_new_map_tb_imt_from_data(data_model: DataModel):
-    ldf_map_tb_imt = pl.scan_parquet(data_model.map_tb_imt.parquet)
-    model_name = data_model.map_tb_imt.model.name()
-    insert_data_from_parquet(ldf_map_tb_imt, model_name)
+    counts = {}
+    start = time.perf_counter()
+    conn = sqlite3.connect(sqlite_url.replace("sqlite:///", ""))
+    try:
+        with ThreadPoolExecutor() as pool, conn:
+            frames = [pool.submit(lambda pm: table_frame(pm, year).collect(), pm) for pm in path_models]
+            for path_model, frame in zip(path_models, frames, strict=True):
+                model = path_model.model
+                df_staged = frame.result()
+                df_current = current_frame(conn, path_model, year)
+                keys = _sync_keys(path_model)
+                columns = [column for column in model.dict_schema() if column != "id"]
+                inserts, updates, deletes = diff_rows(df_current, df_staged, keys, columns)
+                if "info_year" in model.model_fields:
+                    deletes = deletes.filter(pl.col("info_year") == year)
+                apply_diff(conn, path_model, inserts, updates, deletes)
+                if keys:
+                    conn.executemany(CHANGE_LOG_SQL, [
+                        *change_rows(model, UPSERT, pl.concat([inserts, updates]).iter_rows(named=True)),
+                        *change_rows(model, DELETE, deletes.iter_rows(named=True)),
+                    ])
+                counts[model.name()] = {"inserted": inserts.height, "updated": updates.height, "deleted": deletes.height}
+                if any(counts[model.name()].values()):
+                    # The rows of tables keyed by a surrogate id are not logged one by one.
+                    has_year = "info_year" in model.model_fields
+                    record_revisions(conn, model.name(), {year} if has_year else None, reset=not keys)
+                _log.debug(f"{model.name()}: {counts[model.name()]}")
+    finally:
+        conn.close()
+    _log.info(f"synced {len(counts)} tables of {year} in {sqlite_url} in {time.perf_counter() - start:.1f}s")
+    return counts
+
+
+def table_batches(db_path: str, path_model: PathModel, year: int | None, batch_rows: int = EXPORT_BATCH_ROWS):
+    """Yield the rows of the table of `path_model` in `year` as frames of at most `batch_rows`, in the model dtypes.
+
+    The ADBC driver fixes the type of a column from the first rows of a query,
+    so a column null at the start of a long scan breaks it; every batch is its
+    own rowid range query instead and is cast to dict_schema.
+    """
+    model = path_model.model
+    schema = model.dict_schema()
+    columns = ", ".join(f'"{column}"' for column in schema)
+    where = "rowid > ?"
+    params: tuple = ()
+    if year is not None and "info_year" in model.model_fields:
+        where += " AND info_year = ?"
+        params = (year,)
+    sql = f'SELECT rowid AS _rowid, {columns} FROM "{model.name()}" WHERE {where} ORDER BY rowid LIMIT {batch_rows}'
+    last = -1
+    with adbc_driver_sqlite.dbapi.connect(db_path) as conn, conn.cursor() as cursor:
+        cursor.adbc_statement.set_options(**{"adbc.sqlite.query.batch_rows": str(batch_rows)})
+        while True:
+            cursor.execute(sql, (last, *params))
+            df = pl.from_arrow(cursor.fetch_arrow_table())
+            if df.is_empty():
+                return
+            last = df["_rowid"][-1]
+            yield cast_to_schema(df, schema)
+
+
+def export_table(name: str, year: int, file_format: str, stage: str = DataStage.pub) -> str:
+    """Write the rows of `year` of the table behind the DataModel file `name` to its csv or parquet file.
+
+    Batches are written as they are read, so memory does not grow with the
+    table; the file is moved into place once complete.
+    """
+    path_model = getattr(DataModel(year, stage), name)
+    db_path = sqlite_url.replace("sqlite:///", "")
+    dest = path_model.csv if file_format == "csv" else path_model.parquet
+    tmp = f"{dest}.tmp"
+    # The files of a year do not repeat its info_year.
+    schema = {column: dtype for column, dtype in path_model.model.dict_schema().items() if column != "info_year"}
+    rows = 0
+    if file_format == "csv":
+        with open(tmp, "w") as f:
+            pl.DataFrame(schema=schema).write_csv(f, quote_style="non_numeric")
+            for df in table_batches(db_path, path_model, year):
+                df.select(list(schema)).write_csv(f, include_header=False, quote_style="non_numeric")
+                rows += df.height
+    else:
+        with pq.ParquetWriter(tmp, pl.DataFrame(schema=schema).to_arrow().schema) as writer:
+            for df in table_batches(db_path, path_model, year):
+                writer.write_table(df.select(list(schema)).to_arrow())
+                rows += df.height
+    os.replace(tmp, dest)
+    _log.info(f"Saved {rows} rows of {path_model.model.name()} in {dest}")
+    return dest
 
 
 def drop_table(option):
     table_parameter = "{table_parameter}"
     drop_table_query = f"DROP TABLE {table_parameter};"
-    get_tables_query = "SELECT name FROM sqlite_schema WHERE type='table';"
+    # Shadow tables of the R-tree indexes go away with their virtual table.
+    get_tables_query = (
+        "SELECT name FROM pragma_table_list "
+        "WHERE schema='main' AND type IN ('table', 'virtual') AND name NOT LIKE 'sqlite_%';"
+    )
 
     def _get_table(conn):
         cur = conn.cursor()
@@ -114,10 +363,16 @@ def drop_table(option):
 
     def _drop_table(conn, tables):
         cur = conn.cursor()
+        cur.execute("BEGIN")
         for table, in tables:
             _log.info(f"Drop table {table}")
             sql = drop_table_query.replace(table_parameter, table)
             cur.execute(sql)
+        # Unless the revisions go with the tables, in the transaction of the drop.
+        dropped = {table for table, in tables}
+        if not dropped & {DataRevision.__tablename__, ChangeLog.__tablename__}:
+            for table in dropped:
+                record_revisions(cur, table)
         cur.close()
         conn.commit()
 
@@ -131,12 +386,6 @@ def drop_table(option):
     _log.info(f"Cleaned data in {sqlite_url}")
 
 
-def insert_tb_neighbours(data_model: DataModel):
-    ldf = pl.scan_parquet(data_model.tb_neighbour.parquet)
-    model_name = data_model.tb_neighbour.model.name()
-    insert_data_from_parquet(ldf, model_name)
-
-
 def recreate(option):
     drop_table(option)
     create_db_and_tables()
@@ -152,6 +401,7 @@ def delete_table(year: int, option: str):
             _log.info(f"Delete table {table}")
             sql = drop_table_query.replace(table_parameter, table)
             cur.execute(sql)
+            record_revisions(cur, table, {year})
         cur.close()
         conn.commit()
 
@@ -160,8 +410,24 @@ def delete_table(year: int, option: str):
     _delete_tables(conn, tables)
 
 
+# Single table flags of the CLI -> DataModel file.
+_TABLE_FLAGS = {
+    "new_tb": "tollbooth",
+    "new_tb_imt": "tb_imt",
+    "new_tb_sts": "tb_sts",
+    "new_tb_stretch": "tb_stretch_id",
+    "new_stretch": "stretch",
+    "new_road": "road",
+    "new_stretch_toll": "stretch_toll",
+    "new_map_tb_imt": "map_tb_id",
+    "insert_tb_neighbours": "tb_neighbour",
+}
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
+    parser.add_argument("--load-year", help="replace every table of the year", required=False, action="store_true")
+    parser.add_argument("--sync-year", help="apply only the changed rows of the year", required=False, action="store_true")
     parser.add_argument("--new-tb", help="insert-tb", required=False, action='store_true')
     parser.add_argument("--new-tb-imt", help="insert tb imt", required=False, action="store_true")
     parser.add_argument("--new-tb-sts", help="insert-tb-sts-catalog", required=False, action='store_true')
@@ -172,38 +438,30 @@ if __name__ == "__main__":
     parser.add_argument("--new-map-tb-imt", required=False, action="store_true")
     parser.add_argument("--insert-tb-neighbours", required=False, action="store_true")
     parser.add_argument("--export-tb", type=str, choices=("csv", "parquet"))
+    parser.add_argument("--export", type=str, choices=LOAD_FILES, help="write a table of the year to data/pub")
+    parser.add_argument("--format", type=str, choices=("csv", "parquet"), default="parquet")
     parser.add_argument("--year", help="model year", required=False, type=int)
     parser.add_argument("--drop-table", required=False, type=str, help="drop all tables or by table name")
     parser.add_argument("--recreate", required=False, type=str, help="drop and create a table.")
     parser.add_argument("--delete-table", required=False, type=str, help="delete and refill a table.")
     args = parser.parse_args()
-    data_model = DataModel(args.year, DataStage.stg)
-    if args.new_tb:
-        insert_tb_from_data(data_model)
-    elif args.new_tb_sts:
-        data_model = DataModel(args.year, DataStage.prd)
-        insert_tb_sts_from_data(data_model)
-    elif args.new_tb_imt:
-        insert_tb_imt_from_data(data_model)
+    names = tuple(name for flag, name in _TABLE_FLAGS.items() if getattr(args, flag))
+    if (args.load_year or args.sync_year or names) and args.year is None:
+        parser.error("--year is required to load tables")
+    if (args.export_tb or args.export) and args.year is None:
+        parser.error("--year is required to export tables")
+    if args.sync_year:
+        sync_year(args.year, names or LOAD_FILES)
+    elif args.load_year:
+        load_year(args.year)
+    elif names:
+        load_year(args.year, names)
     elif args.export_tb:
-        data_model = DataModel(args.year, DataStage.pub)
-        insert_tb_from_db(data_model, args.export_tb)
-    elif args.new_tb_stretch:
-        data_model = DataModel(args.year, DataStage.stg)
-        insert_tb_stretch_from_data(args.year, data_model)
-    elif args.new_stretch:
-        insert_stretch_from_data(data_model)
-    elif args.new_road:
-        insert_road_from_data(data_model)
-    elif args.new_stretch_toll:
-        insert_stretch_toll_from_data(data_model)
-    elif args.new_map_tb_imt:
-        insert_new_map_tb_imt_from_data(data_model)
-    elif args.insert_tb_neighbours:
-        data_model = DataModel(args.year, DataStage.stg)
-        insert_tb_neighbours(data_model)
+        export_table("tollbooth", args.year, args.export_tb)
+    elif args.export:
+        export_table(args.export, args.year, args.format)
     elif args.drop_table:
-        drop_table(args.clean_db)
+        drop_table(args.drop_table)
     elif args.recreate:
         recreate(args.recreate)
     elif args.delete_table:
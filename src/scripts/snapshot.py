@@ -0,0 +1,116 @@
+"""Build the read-only SQLite snapshot of a year from its staged parquet files.
+
+Tables are created without their indexes and every table is bulk loaded through
+ADBC in one transaction; the model, R-tree and name indexes are built once the
+rows are in. The file is analyzed and vacuumed under a temporary name and then
+moved over the published snapshot with os.replace, so a reader opens either the
+previous snapshot or the new one, never a partial build.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.schema import CreateTable
+from sqlmodel import SQLModel
+
+from src.data_files import DataModel, DataStage, table_frame
+from src.model import ChangeLog
+from src.scripts.populate_db import LOAD_FILES, bump_revisions, sql_dates
+from src.utils.change_log import reset_row
+from src.utils.connector import snapshot_filepath
+from src.utils.sqlite_index import create_name_index, create_spatial_indexes, create_table_indexes
+
+_log = logging.getLogger(__name__)
+_log.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.DEBUG)
+_log.addHandler(handler)
+
+def _last_version(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute(f"SELECT max(version) FROM {ChangeLog.__tablename__}").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        # A snapshot built before the change log.
+        return 0
+    finally:
+        conn.close()
+
+
+def build_snapshot(year: int, dest: str, stage: str = DataStage.stg) -> list[str]:
+    """Build the snapshot of `year` from the files of `stage` and move it to `dest`; returns the tables loaded."""
+    tmp = f"{dest}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    start = time.perf_counter()
+
+    engine = create_engine(f"sqlite:///{tmp}")
+    with engine.begin() as conn:
+        for sql_table in SQLModel.metadata.sorted_tables:
+            conn.execute(CreateTable(sql_table))
+
+    data_model = DataModel(year, stage)
+    tables = []
+    for name in LOAD_FILES:
+        path_model = getattr(data_model, name)
+        if not os.path.exists(path_model.parquet):
+            _log.warning(f"{path_model.parquet} not found, {path_model.model.name()} is empty in the snapshot")
+            continue
+        df = table_frame(path_model, year).collect()
+        sql_dates(df).write_database(
+            table_name=path_model.model.name(),
+            connection=f"sqlite:///{tmp}",
+            if_table_exists="append",
+            engine="adbc",
+        )
+        tables.append(path_model.model.name())
+        _log.debug(f"loaded {df.height} rows in {path_model.model.name()}")
+
+    with engine.begin() as conn:
+        create_table_indexes(conn)
+        create_spatial_indexes(conn)
+        create_name_index(conn)
+    engine.dispose()
+
+    conn = sqlite3.connect(tmp)
+    try:
+        # Versions go on from the snapshot being replaced, whose clients fetch every table again.
+        version = _last_version(dest)
+        with conn:
+            conn.executemany(
+                f"INSERT INTO {ChangeLog.__tablename__} (version, table_name, info_year, row_key, op) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(version + i, *reset_row(table)) for i, table in enumerate(tables, start=1)],
+            )
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+        check = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if check != "ok":
+        raise RuntimeError(f"snapshot {tmp} failed the integrity check: {check}")
+
+    os.replace(tmp, dest)
+    _log.info(f"published snapshot {dest} in {time.perf_counter() - start:.1f}s")
+    return tables
+
+
+def publish_snapshot(year: int, dest: str | None = None):
+    tables = build_snapshot(year, dest or snapshot_filepath(year))
+    # Readers of the snapshot drop their cached responses through the revision watcher.
+    for table in tables:
+        bump_revisions(table, reset=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", required=True, type=int)
+    parser.add_argument("--dest", required=False, type=str)
+    args = parser.parse_args()
+    publish_snapshot(args.year, args.dest)
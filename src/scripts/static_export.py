@@ -0,0 +1,192 @@
+"""Export the located models of a year as static files for the map: GeoParquet, tile shards and a manifest.
+
+Rows are sorted by their H3 cell, so the rows of a shard are contiguous. Each
+table gets a GeoParquet file with one row group per shard, whose lat/lng
+statistics let range readers skip the shards out of view, and a pack of JSON
+shards (one array per H3 cell at SHARD_RESOLUTION, rows in the shape of
+POST /api/tollbooths_viewport) named by its content hash. manifest.json lists the
+byte range, row count and bounding box of every shard and is written once the
+packs it points to are in place; the packs of the previous manifest are kept.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import polars as pl
+import polars_h3 as plh3
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.data_files import DataModel, DataStage, table_frame
+from src.model import TbImt, TbSts, Tollbooth
+from src.utils.columnar import Projection
+from src.utils.tiles import MANIFEST_FILENAME, tiles_dir
+
+_log = logging.getLogger(__name__)
+_log.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.DEBUG)
+_log.addHandler(handler)
+
+SHARD_RESOLUTION = 3
+# Fine enough that sorting by it orders the points along the H3 hierarchy.
+SORT_RESOLUTION = 9
+
+# data model attribute -> shard rows, as the viewport endpoint serializes them.
+TILE_PROJECTIONS = {
+    "tollbooth": Projection(
+        Tollbooth, {field: field for field in Tollbooth.online_empty_fields({"legacy_id"})},
+        {"source": Tollbooth.name()}
+    ),
+    "tb_sts": Projection(
+        TbSts,
+        {
+            "tollbooth_id": "index", "tollbooth_name": "tollbooth_name", "stretch_name": "stretch_name",
+            "lat": "lat", "lng": "lng", "info_year": "info_year"
+        },
+        {"source": TbSts.name()}
+    ),
+    "tb_imt": Projection(
+        TbImt,
+        {
+            "tollbooth_id": "tollbooth_id", "tollbooth_name": "tollbooth_name", "calirepr": "calirepr",
+            "area": "area", "subarea": "subarea", "lat": "lat", "lng": "lng"
+        },
+        {"source": TbImt.name()}
+    ),
+}
+
+
+def wkb_points(lat: pl.Series, lng: pl.Series) -> pa.Array:
+    """Little-endian WKB points (x=lng, y=lat)."""
+    points = np.zeros(len(lat), dtype=np.dtype([("order", "u1"), ("type", "<u4"), ("x", "<f8"), ("y", "<f8")]))
+    points["order"] = 1
+    points["type"] = 1
+    points["x"] = lng.to_numpy()
+    points["y"] = lat.to_numpy()
+    width = points.dtype.itemsize
+    return pa.FixedSizeBinaryArray.from_buffers(
+        pa.binary(width), len(points), [None, pa.py_buffer(points.tobytes())]
+    ).cast(pa.binary())
+
+
+def _bbox(df: pl.DataFrame) -> list[float]:
+    """[south, west, north, east], the order of the API bbox."""
+    return [df["lat"].min(), df["lng"].min(), df["lat"].max(), df["lng"].max()]
+
+
+def _sorted_points(df: pl.DataFrame) -> pl.DataFrame:
+    return (
+        df
+        .filter(pl.col("lat").is_not_null() & pl.col("lng").is_not_null())
+        .with_columns(plh3.latlng_to_cell("lat", "lng", SORT_RESOLUTION).alias("_sort_cell"))
+        .with_columns(plh3.cell_to_parent("_sort_cell", SHARD_RESOLUTION).alias("_shard_cell"))
+        .sort("_sort_cell")
+    )
+
+
+def write_geoparquet(df: pl.DataFrame, path: str):
+    """GeoParquet 1.1 with a WKB point column and a row group per shard."""
+    shards = df.partition_by("_shard_cell", maintain_order=True)
+    df = df.drop("_sort_cell", "_shard_cell")
+    south, west, north, east = _bbox(df)
+    geo = {
+        "version": "1.1.0",
+        "primary_column": "geometry",
+        "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Point"], "bbox": [west, south, east, north]}},
+    }
+    schema = df.to_arrow().schema.append(pa.field("geometry", pa.binary()))
+    schema = schema.with_metadata({b"geo": json.dumps(geo).encode()})
+    tmp = f"{path}.tmp"
+    with pq.ParquetWriter(tmp, schema) as writer:
+        for shard in shards:
+            shard = shard.drop("_sort_cell", "_shard_cell")
+            table = shard.to_arrow().append_column("geometry", wkb_points(shard["lat"], shard["lng"]))
+            writer.write_table(table.cast(schema))
+    os.replace(tmp, path)
+
+
+def shard_pack(df: pl.DataFrame, projection: Projection) -> tuple[bytes, list[dict]]:
+    """The JSON shards of `df` one after the other, and their entries in the manifest."""
+    chunks, shards, offset = [], [], 0
+    for df_shard in df.partition_by("_shard_cell", maintain_order=True):
+        rows = df_shard.select(
+            *(pl.col(field).alias(label) for label, field in projection.fields.items()),
+            *(pl.lit(value).alias(label) for label, value in projection.constants.items()),
+        )
+        chunk = rows.write_json().encode()
+        south, west, north, east = _bbox(df_shard)
+        shards.append({
+            "cell": df_shard.select(plh3.int_to_str("_shard_cell")).item(0, 0),
+            "offset": offset,
+            "length": len(chunk),
+            "count": df_shard.height,
+            "bbox": [south, west, north, east],
+            "lat": df_shard["lat"].mean(),
+            "lng": df_shard["lng"].mean(),
+        })
+        chunks.append(chunk)
+        offset += len(chunk)
+    return b"".join(chunks), shards
+
+
+def _pack_names(manifest_path: str) -> set[str]:
+    if not os.path.exists(manifest_path):
+        return set()
+    with open(manifest_path) as f:
+        return {table["pack"] for table in json.load(f)["tables"].values()}
+
+
+def static_export(year: int, stage: str = DataStage.stg, dest: str | None = None) -> dict:
+    """Write the tiles of `year` in `dest` (data/tiles/YEAR by default); returns the manifest."""
+    dest = dest or tiles_dir(year)
+    os.makedirs(dest, exist_ok=True)
+    start = time.perf_counter()
+    data_model = DataModel(year, stage)
+    manifest = {"year": year, "shard_resolution": SHARD_RESOLUTION, "tables": {}}
+    for name, projection in TILE_PROJECTIONS.items():
+        path_model = getattr(data_model, name)
+        if not os.path.exists(path_model.parquet):
+            _log.warning(f"{path_model.parquet} not found, {path_model.model.name()} has no tiles")
+            continue
+        df = _sorted_points(table_frame(path_model, year).collect())
+        if df.is_empty():
+            continue
+        table = path_model.model.name()
+        write_geoparquet(df, os.path.join(dest, f"{table}.parquet"))
+        pack, shards = shard_pack(df, projection)
+        pack_name = f"{table}-{hashlib.sha1(pack).hexdigest()[:12]}.json"
+        pack_path = os.path.join(dest, pack_name)
+        if not os.path.exists(pack_path):
+            with open(f"{pack_path}.tmp", "wb") as f:
+                f.write(pack)
+            os.replace(f"{pack_path}.tmp", pack_path)
+        manifest["tables"][table] = {
+            "parquet": f"{table}.parquet", "pack": pack_name, "count": df.height, "bbox": _bbox(df), "shards": shards
+        }
+        _log.debug(f"{table}: {df.height} rows in {len(shards)} shards")
+
+    manifest_path = os.path.join(dest, MANIFEST_FILENAME)
+    # Packs of the previous manifest stay for the readers still holding it.
+    keep = _pack_names(manifest_path) | {table["pack"] for table in manifest["tables"].values()}
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    for filename in os.listdir(dest):
+        if filename.endswith(".json") and filename != MANIFEST_FILENAME and filename not in keep:
+            os.remove(os.path.join(dest, filename))
+    _log.info(f"exported the tiles of {year} to {dest} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", required=True, type=int)
+    parser.add_argument("--dest", required=False, type=str)
+    args = parser.parse_args()
+    static_export(args.year, dest=args.dest)
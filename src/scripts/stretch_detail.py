@@ -0,0 +1,116 @@
+"""Materialize the StretchDetail rows of a year from the staged files.
+
+The stretch view needs the stretch, its road, its tolls, the names of the
+tollbooths it joins, the traffic of the STS stations linked to it and the
+revenue reported for it; joining them here lets /api/stretch/{stretch_id} read
+one row by primary key. Traffic and revenue are left empty for the years
+without those files.
+"""
+import argparse
+import os
+import time
+
+import polars as pl
+
+from src.data_files import DataModel, DataStage, table_frame
+from src.model import StretchDetail
+
+_ROAD_COLUMNS = ("road_id", "road_name", "operation_date", "start_contract_date", "end_contract_date")
+_TOLLBOOTH_PAIR = ("tollbooth_id_in", "tollbooth_name_in", "tollbooth_id_out", "tollbooth_name_out")
+
+
+def _tollbooth_pairs(data_model: DataModel, year: int) -> pl.LazyFrame:
+    """stretch_id and the JSON list of its in/out tollbooth pairs."""
+    ldf_names = table_frame(data_model.tollbooth, year).select(
+        pl.col("tollbooth_id").cast(pl.UInt32), "tollbooth_name"
+    )
+    ldf = table_frame(data_model.tb_stretch_id, year).select("stretch_id", "tollbooth_id_in", "tollbooth_id_out")
+    for way in ("in", "out"):
+        ldf = ldf.join(
+            ldf_names.rename({"tollbooth_id": f"tollbooth_id_{way}", "tollbooth_name": f"tollbooth_name_{way}"}),
+            on=f"tollbooth_id_{way}",
+            how="left",
+        )
+    return (
+        ldf
+        .sort("stretch_id", "tollbooth_id_in", "tollbooth_id_out")
+        .group_by("stretch_id", maintain_order=True)
+        .agg(pl.struct(*_TOLLBOOTH_PAIR).struct.json_encode().str.join(",").alias("tollbooths"))
+        .with_columns(pl.format("[{}]", "tollbooths").alias("tollbooths"))
+    )
+
+
+def _sts_traffic(data_model: DataModel, year: int) -> pl.LazyFrame | None:
+    """stretch_id with the station count and the mean tdpa and vta of the STS stations linked to it."""
+    if not (os.path.exists(data_model.tb_sts_stretch_id.parquet) and os.path.exists(data_model.tb_sts.parquet)):
+        return None
+    ldf_sts = table_frame(data_model.tb_sts, year).select(
+        pl.col("tollbooth_id").alias("tollbooth_sts_id"), "tdpa", "vta"
+    )
+    return (
+        table_frame(data_model.tb_sts_stretch_id, year)
+        .select("stretch_id", "tollbooth_sts_id")
+        .drop_nulls()
+        .unique()
+        .join(ldf_sts, on="tollbooth_sts_id")
+        .group_by("stretch_id")
+        .agg(
+            pl.len().alias("sts_stations"),
+            pl.col("tdpa").mean().round().alias("tdpa"),
+            pl.col("vta").mean().round().alias("vta"),
+        )
+    )
+
+
+def _revenue(data_model: DataModel, year: int) -> pl.LazyFrame | None:
+    """stretch_name and the revenue its managers reported for the year."""
+    path_model = data_model.manager_revenue
+    if not os.path.exists(path_model.parquet):
+        return None
+    return (
+        table_frame(path_model, year)
+        .group_by("stretch_name")
+        .agg(pl.sum_horizontal(path_model.model.numeric_cols()).sum().alias("annual_revenue"))
+    )
+
+
+def stretch_detail_frame(year: int, stage: str = DataStage.stg) -> pl.DataFrame:
+    # The inputs as the db loads them: one row per key.
+    data_model = DataModel(year, stage)
+    ldf = (
+        table_frame(data_model.stretch, year)
+        .select("stretch_id", "stretch_name", "stretch_length_km", "manage", "way", "road_id")
+        .join(table_frame(data_model.road, year).select(_ROAD_COLUMNS), on="road_id", how="left")
+        .join(table_frame(data_model.stretch_toll, year).drop("info_year"), on="stretch_id", how="left")
+        .join(_tollbooth_pairs(data_model, year), on="stretch_id", how="left")
+    )
+    ldf_traffic = _sts_traffic(data_model, year)
+    if ldf_traffic is not None:
+        ldf = ldf.join(ldf_traffic, on="stretch_id", how="left")
+    ldf_revenue = _revenue(data_model, year)
+    if ldf_revenue is not None:
+        ldf = ldf.join(ldf_revenue, on="stretch_name", how="left")
+
+    columns = ldf.collect_schema().names()
+    return ldf.select(
+        (pl.col(column) if column in columns else pl.lit(year if column == "info_year" else None))
+        .cast(dtype)
+        .alias(column)
+        for column, dtype in StretchDetail.dict_schema().items()
+    ).sort("stretch_id").collect()
+
+
+def stretch_detail(year: int, stage: str = DataStage.stg):
+    path_model = DataModel(year, stage).stretch_detail
+    start = time.perf_counter()
+    df = stretch_detail_frame(year, stage)
+    df.write_parquet(path_model.parquet)
+    print(f"{df.height} stretches, {time.perf_counter() - start:.1f}s")
+    print(f"Saved file in: {path_model.parquet}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", required=True, type=int)
+    args = parser.parse_args()
+    stretch_detail(args.year)
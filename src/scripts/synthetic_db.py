@@ -0,0 +1,252 @@
+"""Build a synthetic editor db at a multiple of the real row counts, for the API benchmarks.
+
+The staged files of one year are generated from the model schemas: every
+column gets values of its dtype, and the keys and the links between tables are
+built so the endpoints have rows to find. Roads are lines of tollbooths, each
+pair of consecutive tollbooths is a stretch with its tolls, a few more stretches
+join the roads, STS and IMT stations sit next to the tollbooths and each
+tollbooth gets its nearest local neighbours. The db is then built from those
+files like a snapshot (scripts/snapshot.py).
+
+Tollbooth, TbImt and Road are keyed by UInt16, so their rows stop at 65535 on
+the larger scales.
+"""
+import argparse
+import datetime
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+import polars as pl
+
+from src.data_files import DataModel, PathModel
+from src.model import TbModel, TbNeighbour
+from src.scripts.snapshot import build_snapshot
+from src.scripts.stretch_detail import stretch_detail_frame
+from src.utils.spatial_index import KdTree, chord_to_km, unit_vector
+
+_log = logging.getLogger(__name__)
+_log.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.DEBUG)
+_log.addHandler(handler)
+
+# Rows of the real data at scale 1.
+BASE_ROWS = {"tollbooth": 1367, "road": 244, "stretch": 1463, "tb_sts": 860, "tb_imt": 800}
+_BBOX = (14.5, 32.5, -117.0, -86.7)
+# Degrees between consecutive tollbooths of a road (about 13 km).
+_ROAD_STEP = 0.12
+_STATION_JITTER = 0.02
+_NEIGHBOURS = 5
+_SYLLABLES = (
+    "a", "ca", "co", "cu", "che", "chi", "gua", "ja", "la", "li", "lo", "ma", "me", "mi", "na", "pa", "pue", "que",
+    "ra", "ro", "sa", "so", "ta", "te", "ti", "to", "tla", "tu", "xa", "xo", "ya", "za",
+)
+_KEY_LIMITS = {pl.UInt16: 65535, pl.UInt32: 4294967295}
+
+
+def _name(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def _rows(model: type[TbModel], name: str, scale: float) -> int:
+    rows = max(1, round(BASE_ROWS[name] * scale))
+    key = next(column.name for column in model.__table__.primary_key.columns if column.name != "info_year")
+    limit = _KEY_LIMITS.get(model.dict_schema()[key])
+    if limit is not None and rows > limit:
+        _log.warning(f"{name} has {rows} rows at scale {scale}, capped at {limit} by its {key} dtype")
+        rows = limit
+    return rows
+
+
+def _values(column: str, dtype: pl.DataType, n: int, rng: random.Random) -> list:
+    if dtype in (pl.Float32, pl.Float64):
+        return [round(rng.uniform(10, 900), 2) for _ in range(n)]
+    if dtype.is_integer():
+        return [rng.randrange(1000) for _ in range(n)]
+    if dtype == pl.Boolean:
+        return [rng.random() < 0.5 for _ in range(n)]
+    if dtype == pl.Date:
+        start = datetime.date(1990, 1, 1)
+        return [start + datetime.timedelta(days=rng.randrange(25000)) for _ in range(n)]
+    vocab = [f"{column}_{i}" for i in range(25)]
+    return [rng.choice(vocab) for _ in range(n)]
+
+
+def model_frame(model: type[TbModel], n: int, year: int, rng: random.Random, columns: dict[str, list]) -> pl.DataFrame:
+    """`n` rows in the schema of `model`: `columns` as given, the others random values of their dtype.
+
+    The h3 cells are left to table_frame.
+    """
+    h3_columns = set(model.h3_columns().values())
+    data = {}
+    schema = {}
+    for column, dtype in model.dict_schema().items():
+        if column in h3_columns:
+            continue
+        if column in columns:
+            data[column] = columns[column]
+        elif column == "info_year":
+            data[column] = [year] * n
+        elif column == "id":
+            data[column] = [None] * n
+        else:
+            data[column] = _values(column, dtype, n, rng)
+        schema[column] = dtype
+    return pl.DataFrame(data, schema=schema)
+
+
+def _write(path_model: PathModel, df: pl.DataFrame) -> int:
+    os.makedirs(os.path.dirname(path_model.parquet), exist_ok=True)
+    df.write_parquet(path_model.parquet)
+    return df.height
+
+
+def _near(rng: random.Random, lat: float, lng: float) -> tuple[float, float]:
+    return lat + rng.uniform(-_STATION_JITTER, _STATION_JITTER), lng + rng.uniform(-_STATION_JITTER, _STATION_JITTER)
+
+
+def _neighbours(df_tollbooth: pl.DataFrame, year: int) -> pl.DataFrame:
+    """The _NEIGHBOURS nearest tollbooths of each tollbooth, as the local-local rows of the neighbours step."""
+    ids = df_tollbooth["tollbooth_id"].to_list()
+    points = [unit_vector(lat, lng) for lat, lng in df_tollbooth.select("lat", "lng").iter_rows()]
+    tree = KdTree(points)
+    rows = [
+        (ids[i], ids[j], chord_to_km(chord))
+        for i, point in enumerate(points)
+        for chord, j in tree.query(point, k=_NEIGHBOURS, skip=i)
+    ]
+    return model_frame(TbNeighbour, len(rows), year, random.Random(), {
+        "tollbooth_id": [row[0] for row in rows],
+        "neighbour_id": [row[1] for row in rows],
+        "scope": ["local-local"] * len(rows),
+        "distance": [row[2] for row in rows],
+    })
+
+
+def synthetic_stage(year: int, scale: float, stage: str, seed: int = 0) -> dict[str, int]:
+    """Write the staged files of `year` at `scale` times the real rows into `stage`; returns the rows per file."""
+    rng = random.Random(seed)
+    data_model = DataModel(year, stage)
+    n_road = _rows(data_model.road.model, "road", scale)
+    n_tollbooth = _rows(data_model.tollbooth.model, "tollbooth", scale)
+    n_stretch = _rows(data_model.stretch.model, "stretch", scale)
+    n_sts = _rows(data_model.tb_sts.model, "tb_sts", scale)
+    n_imt = _rows(data_model.tb_imt.model, "tb_imt", scale)
+    south, north, west, east = _BBOX
+
+    # Each road is a line of tollbooths from a random start and heading.
+    road_of = [i % n_road for i in range(n_tollbooth)]
+    starts = [(rng.uniform(south, north), rng.uniform(west, east), rng.uniform(0, 2 * math.pi)) for _ in range(n_road)]
+    positions: list[tuple[float, float]] = []
+    last_on_road: dict[int, int] = {}
+    pairs: list[tuple[int, int, int]] = []  # (road, tollbooth in, tollbooth out), as row numbers
+    for i, road in enumerate(road_of):
+        lat, lng, heading = starts[road]
+        step = i // n_road
+        positions.append((
+            min(max(lat + step * _ROAD_STEP * math.sin(heading), south), north),
+            min(max(lng + step * _ROAD_STEP * math.cos(heading), west), east),
+        ))
+        if road in last_on_road:
+            pairs.append((road, last_on_road[road], i))
+        last_on_road[road] = i
+    pairs = pairs[:n_stretch]
+    # Junctions between roads make up the rest of the stretches.
+    while len(pairs) < n_stretch and n_tollbooth > 1:
+        tb_in, tb_out = rng.sample(range(n_tollbooth), 2)
+        pairs.append((road_of[tb_in], tb_in, tb_out))
+
+    tollbooth_names = [_name(rng) for _ in range(n_tollbooth)]
+    df_tollbooth = model_frame(data_model.tollbooth.model, n_tollbooth, year, rng, {
+        "tollbooth_id": list(range(1, n_tollbooth + 1)),
+        "tollbooth_name": tollbooth_names,
+        "lat": [lat for lat, _ in positions],
+        "lng": [lng for _, lng in positions],
+        "status": rng.choices(["open", "closed"], weights=[9, 1], k=n_tollbooth),
+    })
+    df_road = model_frame(data_model.road.model, n_road, year, rng, {
+        "road_id": list(range(1, n_road + 1)),
+        "road_name": [_name(rng) for _ in range(n_road)],
+    })
+    stretch_ids = list(range(1, len(pairs) + 1))
+    df_stretch = model_frame(data_model.stretch.model, len(pairs), year, rng, {
+        "stretch_id": stretch_ids,
+        "stretch_name": [f"{tollbooth_names[tb_in]}_{tollbooth_names[tb_out]}" for _, tb_in, tb_out in pairs],
+        "road_id": [road + 1 for road, _, _ in pairs],
+    })
+    df_stretch_toll = model_frame(data_model.stretch_toll.model, len(pairs), year, rng, {"stretch_id": stretch_ids})
+    # Both directions of every stretch.
+    directions = [(sid, a + 1, b + 1) for sid, (_, a, b) in zip(stretch_ids, pairs, strict=True)]
+    directions += [(sid, b, a) for sid, a, b in directions]
+    df_tb_stretch_id = model_frame(data_model.tb_stretch_id.model, len(directions), year, rng, {
+        "stretch_id": [sid for sid, _, _ in directions],
+        "tollbooth_id_in": [a for _, a, _ in directions],
+        "tollbooth_id_out": [b for _, _, b in directions],
+    })
+
+    stretch_of = {}
+    for sid, tb_in, _ in directions:
+        stretch_of.setdefault(tb_in, sid)
+    sts_at = [rng.randrange(n_tollbooth) for _ in range(n_sts)]
+    sts_positions = [_near(rng, *positions[i]) for i in sts_at]
+    df_sts = model_frame(data_model.tb_sts.model, n_sts, year, rng, {
+        "tollbooth_id": list(range(1, n_sts + 1)),
+        "index": [f"sts_{i}" for i in range(1, n_sts + 1)],
+        "tollbooth_name": [tollbooth_names[i] for i in sts_at],
+        "lat": [lat for lat, _ in sts_positions],
+        "lng": [lng for _, lng in sts_positions],
+        "tdpa": [rng.randrange(500, 60000) for _ in range(n_sts)],
+    })
+    sts_links = [(stretch_of[i + 1], i + 1, sts_id) for sts_id, i in enumerate(sts_at, start=1) if i + 1 in stretch_of]
+    df_sts_stretch_id = model_frame(data_model.tb_sts_stretch_id.model, len(sts_links), year, rng, {
+        "stretch_id": [sid for sid, _, _ in sts_links],
+        "tollbooth_id": [tid for _, tid, _ in sts_links],
+        "tollbooth_sts_id": [sts_id for _, _, sts_id in sts_links],
+    })
+    imt_at = [rng.randrange(n_tollbooth) for _ in range(n_imt)]
+    imt_positions = [_near(rng, *positions[i]) for i in imt_at]
+    df_imt = model_frame(data_model.tb_imt.model, n_imt, year, rng, {
+        "tollbooth_id": list(range(1, n_imt + 1)),
+        "tollbooth_name": [tollbooth_names[i] for i in imt_at],
+        "lat": [lat for lat, _ in imt_positions],
+        "lng": [lng for _, lng in imt_positions],
+    })
+
+    rows = {
+        "tollbooth": _write(data_model.tollbooth, df_tollbooth),
+        "road": _write(data_model.road, df_road),
+        "stretch": _write(data_model.stretch, df_stretch),
+        "stretch_toll": _write(data_model.stretch_toll, df_stretch_toll),
+        "tb_stretch_id": _write(data_model.tb_stretch_id, df_tb_stretch_id),
+        "tb_sts": _write(data_model.tb_sts, df_sts),
+        "tb_sts_stretch_id": _write(data_model.tb_sts_stretch_id, df_sts_stretch_id),
+        "tb_imt": _write(data_model.tb_imt, df_imt),
+        "tb_neighbour": _write(data_model.tb_neighbour, _neighbours(df_tollbooth, year)),
+    }
+    rows["stretch_detail"] = _write(data_model.stretch_detail, stretch_detail_frame(year, stage))
+    return rows
+
+
+def synthetic_db(dest: str, year: int, scale: float = 1.0, seed: int = 0) -> dict[str, int]:
+    """Build the synthetic db of `year` at `scale` in `dest`; returns the rows per staged file."""
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as stage:
+        rows = synthetic_stage(year, scale, stage, seed)
+        build_snapshot(year, dest, stage)
+    _log.info(f"built {dest} at scale {scale} in {time.perf_counter() - start:.1f}s: {rows}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dest", required=True, type=str)
+    parser.add_argument("--year", required=False, type=int, default=datetime.date.today().year)
+    parser.add_argument("--scale", help="multiple of the real row counts (1, 10, 100)", required=False, type=float, default=1.0)
+    parser.add_argument("--seed", required=False, type=int, default=0)
+    args = parser.parse_args()
+    synthetic_db(args.dest, args.year, args.scale, args.seed)
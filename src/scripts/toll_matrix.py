@@ -0,0 +1,45 @@
+import argparse
+import time
+
+import polars as pl
+
+from src.data_files import DataModel, DataStage
+from src.model import StretchToll
+from src.utils.routing import TollGraph
+from src.utils.toll_matrix import toll_matrices, write_toll_matrices
+
+
+def _stretch_edges(year: int) -> pl.DataFrame:
+    """The edges of the year in the layout of routing.load_edges, from the staging files."""
+    data_model = DataModel(year, DataStage.stg)
+    ldf_tb_stretch = pl.scan_parquet(data_model.tb_stretch_id.parquet).select(
+        "tollbooth_id_in", "tollbooth_id_out", "stretch_id"
+    )
+    ldf_stretch = pl.scan_parquet(data_model.stretch.parquet).select(
+        "stretch_id", "stretch_name", "stretch_length_km"
+    )
+    ldf_toll = pl.scan_parquet(data_model.stretch_toll.parquet).select("stretch_id", *StretchToll.vehicle_cols())
+    return (
+        ldf_tb_stretch
+        .join(ldf_stretch, on="stretch_id")
+        .join(ldf_toll, on="stretch_id", how="left")
+        .collect()
+    )
+
+
+def toll_matrix(year: int):
+    data_model = DataModel(year, DataStage.stg)
+    start = time.perf_counter()
+    graph = TollGraph(_stretch_edges(year))
+    df_index, df_matrix = toll_matrices(graph, year)
+    write_toll_matrices(df_index, df_matrix, data_model.toll_matrix.parquet, data_model.toll_matrix.arrow)
+    networks = df_index.select(pl.col("network").n_unique()).item()
+    print(f"{df_index.height} tollbooths in {networks} road networks, {df_matrix.height} pairs, {time.perf_counter() - start:.1f}s")
+    print(f"Saved files in: {data_model.toll_matrix.parquet}, {data_model.toll_matrix.arrow}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", required=True, type=int)
+    args = parser.parse_args()
+    toll_matrix(args.year)
@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from src.model import Tollbooth
+from src.utils.batch_upsert import upsert_tollbooths
+
+
+def _tollbooth(**fields) -> Tollbooth:
+    return Tollbooth(**{"status": "open", "state": "jalisco", "type": "toll", **fields})
+
+
+def test_batch_updates_and_inserts_in_order():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            _tollbooth(tollbooth_id=1, tollbooth_name="a", lat=20.5, lng=-103.3, info_year=2025),
+            _tollbooth(tollbooth_id=2, tollbooth_name="b", lat=20.6, lng=-103.4, info_year=2025),
+        ])
+        session.commit()
+
+        results, info_years = upsert_tollbooths(session, [
+            _tollbooth(tollbooth_name="c", lat=21.0, lng=-101.0),
+            Tollbooth(tollbooth_id=2, manage="capufe"),
+            Tollbooth(tollbooth_id=1, lat=25.6),
+        ])
+        session.commit()
+
+        year = datetime.date.today().year
+        assert results == [
+            {"tollbooth_id": 3, "info_year": year},
+            {"tollbooth_id": 2, "info_year": 2025},
+            {"tollbooth_id": 1, "info_year": 2025},
+        ]
+        assert info_years == {2025, year}
+        session.expire_all()
+        moved = session.get(Tollbooth, 1)
+        assert (moved.lat, moved.lng, moved.tollbooth_name) == (25.6, -103.3, "a")
+        expected = Tollbooth(lat=25.6, lng=-103.3)
+        expected.fill_h3_cells()
+        assert moved.h3_cell_6 == expected.h3_cell_6
+        assert session.get(Tollbooth, 2).manage == "capufe"
+        assert session.get(Tollbooth, 3).h3_cell_4 is not None
+
+        with pytest.raises(LookupError):
+            upsert_tollbooths(session, [Tollbooth(tollbooth_id=9, manage="x")])
@@ -0,0 +1,36 @@
+import sqlite3
+
+from src.scripts.bench_api import EndpointReport, percentile, regressions, uncovered_routes
+from src.scripts.synthetic_db import synthetic_db
+
+
+def test_synthetic_db_links_the_tables(tmp_path):
+    db_path = str(tmp_path / "synthetic.db")
+    rows = synthetic_db(db_path, 2026, scale=0.05)
+    assert (rows["tollbooth"], rows["road"], rows["stretch"]) == (68, 12, 73)
+
+    conn = sqlite3.connect(db_path)
+    # Every stretch goes both ways between two tollbooths and has its toll and detail row.
+    assert conn.execute(
+        "SELECT count(*) FROM tbstretchid JOIN tollbooth t_in ON t_in.tollbooth_id = tollbooth_id_in "
+        "JOIN tollbooth t_out ON t_out.tollbooth_id = tollbooth_id_out"
+    ).fetchone() == (2 * 73,)
+    assert conn.execute("SELECT count(*) FROM stretchtoll JOIN stretchdetail USING (stretch_id)").fetchone() == (73,)
+    assert conn.execute(
+        "SELECT count(DISTINCT tollbooth_id), min(distance) > 0 FROM tbneighbour WHERE scope = 'local-local'"
+    ).fetchone() == (68, 1)
+    assert conn.execute("SELECT count(*) FROM tollbooth WHERE h3_cell_8 IS NULL").fetchone() == (0,)
+    conn.close()
+
+
+def test_every_route_has_a_scenario():
+    from src.main import app
+
+    assert uncovered_routes(app) == []
+
+
+def test_percentile_and_regressions():
+    assert [percentile([4, 1, 3, 2], p) for p in (50, 95, 99)] == [2, 4, 4]
+    report = EndpointReport(requests=10, errors=0, rps=100.0, p50_ms=5.0, p95_ms=13.0, p99_ms=20.0)
+    assert regressions({"GET /": report}, {"GET /": {"p95_ms": 10.0}}, 0.2) == ["GET /: p95 10.0 -> 13.0 ms"]
+    assert regressions({"GET /": report}, {"GET /": {"p95_ms": 11.0}}, 0.2) == []
@@ -0,0 +1,40 @@
+from sqlmodel import Session, SQLModel, create_engine
+
+from src.model import Road
+from src.utils.change_log import (
+    CHANGE_LOG_SQL,
+    DELETE,
+    UPSERT,
+    changes_since,
+    log_changes,
+    reset_row,
+)
+
+
+def test_changes_since_keeps_the_latest_change_per_row():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([Road(road_id=1, road_name="a", info_year=2025), Road(road_id=2, road_name="b", info_year=2026)])
+        conn = session.connection()
+        log_changes(conn, Road, UPSERT, [{"road_id": 1, "info_year": 2025}, {"road_id": 2, "info_year": 2026}])
+        log_changes(conn, Road, UPSERT, [{"road_id": 3, "info_year": 2026}])
+        log_changes(conn, Road, DELETE, [{"road_id": 2, "info_year": 2026}])
+        session.commit()
+
+        changes = changes_since(session, 0, 100)
+        assert (changes.version, changes.more, changes.resets) == (4, False, [])
+        assert [(change["op"], change["key"]) for change in changes.changes] == [
+            ("upsert", {"road_id": 1}), ("delete", {"road_id": 3}), ("delete", {"road_id": 2})
+        ]
+        assert changes.changes[0]["row"].road_name == "a"
+
+        page = changes_since(session, 0, 2)
+        assert (page.version, page.more) == (2, True)
+        assert changes_since(session, 4, 100).changes == []
+
+        session.connection().exec_driver_sql(CHANGE_LOG_SQL, reset_row(Road.name(), 2025))
+        session.commit()
+        changes = changes_since(session, 0, 100)
+        assert changes.resets == [{"table": "road", "info_year": 2025}]
+        assert [change["key"] for change in changes.changes] == [{"road_id": 3}, {"road_id": 2}]
@@ -0,0 +1,75 @@
+import io
+import json
+
+import polars as pl
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.model import TbImt
+from src.utils.columnar import Projection, columnar_page
+from src.utils.pagination import NEXT_CURSOR_HEADER, Keyset, decode_cursor
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tb.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            TbImt(tollbooth_id=i, tollbooth_name=f"tb_{i}", calirepr="x" if i == 4 else None, lat=20.0 + i, info_year=2025)
+            for i in range(1, 6)
+        ])
+        session.commit()
+    return engine
+
+
+def test_columnar_page_matches_rows_and_paginates(tmp_path):
+    engine = _engine(tmp_path)
+    projection = Projection(
+        TbImt, {"tollbooth_id": "tollbooth_id", "calirepr": "calirepr", "lat": "lat"}, {"source": "tbimt"}
+    )
+    with engine.connect() as conn:
+        response = columnar_page(conn, select(TbImt), projection, Keyset(TbImt), None, 4, 0, "columnar")
+    assert json.loads(response.body) == {
+        "tollbooth_id": [1, 2, 3, 4],
+        "calirepr": [None, None, None, "x"],
+        "lat": [21.0, 22.0, 23.0, 24.0],
+        "source": ["tbimt"] * 4,
+    }
+    cursor = response.headers[NEXT_CURSOR_HEADER]
+    assert decode_cursor(cursor) == (4, 2025)
+
+    with engine.connect() as conn:
+        response = columnar_page(conn, select(TbImt), projection, Keyset(TbImt), cursor, 4, 0, "arrow")
+    df = pl.read_ipc_stream(io.BytesIO(response.body))
+    assert df["tollbooth_id"].to_list() == [5]
+    assert df.schema["tollbooth_id"] == pl.UInt16
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_columnar_pages_need_a_row(tmp_path):
+    from fastapi.testclient import TestClient
+
+    from src.main import app
+    from src.utils.connector import get_async_read_session, get_read_session
+
+    engine = _engine(tmp_path)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tb.db'}")
+
+    def read_session():
+        with Session(engine) as session:
+            yield session
+
+    async def async_read_session():
+        async with AsyncSession(async_engine) as session:
+            yield session
+
+    app.dependency_overrides.update({get_read_session: read_session, get_async_read_session: async_read_session})
+    try:
+        client = TestClient(app)
+        for path in ("/api/tollbooths_imt", "/api/async/tollbooths_imt"):
+            assert client.post(f"{path}?limit=0&format=columnar", json={"query": ""}).status_code == 422
+            response = client.post(f"{path}?limit=2&format=arrow", json={"query": ""})
+            assert pl.read_ipc_stream(io.BytesIO(response.content))["tollbooth_id"].to_list() == [1, 2]
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,55 @@
+import os
+
+import polars as pl
+import pytest
+
+from src.model import Road, Tollbooth
+from src.utils.frame_backend import FrameStore, after_cursor
+from src.utils.pagination import encode_cursor
+from src.utils.query_compiler import frame_filter
+from src.utils.query_parser import parse_query
+
+
+def _write_roads(tmp_path, year: int, rows: list[tuple]):
+    (tmp_path / str(year)).mkdir(exist_ok=True)
+    pl.DataFrame(rows, schema=["road_id", "road_name"], orient="row").write_parquet(tmp_path / str(year) / "roads.parquet")
+
+
+def test_store_keeps_the_latest_year_and_reloads_changed_files(tmp_path):
+    _write_roads(tmp_path, 2025, [(2, "b"), (1, "a")])
+    _write_roads(tmp_path, 2026, [(2, "b2")])
+    store = FrameStore([2025, 2026], stage=str(tmp_path), names=("road",))
+    store.load()
+    assert store.frame(Road).select("road_id", "road_name", "info_year").rows() == [(1, "a", 2025), (2, "b2", 2026)]
+
+    reloaded = []
+    store.add_listener(lambda table, year: reloaded.append((table, year)))
+    store.poll()
+    assert reloaded == []
+    _write_roads(tmp_path, 2026, [(2, "b3"), (3, "c")])
+    path = tmp_path / "2026" / "roads.parquet"
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    store.poll()
+    assert reloaded == [("road", 2026)]
+    assert store.frame(Road)["road_name"].to_list() == ["a", "b3", "c"]
+
+
+def test_frame_filter_and_cursor_match_the_sql_semantics():
+    df = pl.DataFrame(
+        {"tollbooth_id": [1, 2, 3, 4], "lat": [19.5, 20.5, 21.5, None], "state": ["jalisco", "jalisco", "sonora", "sonora"]}
+    )
+
+    def _ids(query: str) -> list[int]:
+        return df.filter(frame_filter(Tollbooth, parse_query(query)))["tollbooth_id"].to_list()
+
+    assert _ids("id:1,3") == [1, 3]
+    assert _ids("id:all") == [1, 2, 3, 4]
+    assert _ids("lat:20..22 AND state:jalisco") == [2]
+    assert _ids("lat:..20 OR state:sonora") == [1, 3, 4]
+    assert _ids("lat:..30") == [1, 2, 3]
+    with pytest.raises(ValueError):
+        frame_filter(Tollbooth, parse_query("id:abc"))
+
+    assert after_cursor(df, ["tollbooth_id"], encode_cursor([2]))["tollbooth_id"].to_list() == [3, 4]
+    with pytest.raises(ValueError):
+        after_cursor(df, ["tollbooth_id", "state"], encode_cursor([2]))
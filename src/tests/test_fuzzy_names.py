@@ -0,0 +1,40 @@
+from src.utils.fuzzy_names import FuzzyNameCache, FuzzyNameIndex, name_key
+
+
+def _rows() -> list[dict]:
+    return [
+        {"source": "tollbooth", "tollbooth_id": 1, "tollbooth_name": "ciudad_juarez", "info_year": 2025},
+        {"source": "tbimt", "tollbooth_id": 7, "tollbooth_name": "ciudad_juarez", "info_year": 2025},
+        {"source": "tollbooth", "tollbooth_id": 2, "tollbooth_name": "entronque_chichimeco", "info_year": 2025},
+        {"source": "tollbooth", "tollbooth_id": 3, "tollbooth_name": "la_venta", "info_year": 2026},
+    ]
+
+
+def test_name_key_expands_abbreviations():
+    assert name_key("Cd. Juárez") == "ciudad juarez"
+    assert name_key("ciudad_juarez") == "ciudad juarez"
+
+
+def test_search_matches_variants_and_filters():
+    index = FuzzyNameIndex(_rows())
+    assert len(index) == 3
+    rows = index.search("Cd Juarez", ["tollbooth", "tbimt"], 10)
+    assert [(row["source"], row["tollbooth_id"]) for row in rows] == [("tollbooth", 1), ("tbimt", 7)]
+    assert [row["tollbooth_id"] for row in index.search("ent chichimeko", ["tollbooth"], 10)] == [2]
+    assert index.search("la venta", ["tollbooth"], 10, info_year=2025) == []
+    assert index.search("ciudad juarez", ["tbimt"], 1)[0]["tollbooth_id"] == 7
+
+
+def test_cache_rebuilds_after_invalidate():
+    loads = []
+
+    def load_rows():
+        loads.append(1)
+        return _rows()
+
+    cache = FuzzyNameCache()
+    cache.get(load_rows)
+    cache.get(load_rows)
+    cache.invalidate()
+    cache.get(load_rows)
+    assert len(loads) == 2
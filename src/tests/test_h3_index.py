@@ -0,0 +1,58 @@
+import polars as pl
+import pytest
+
+from src.utils.h3_index import (
+    ClusterCache,
+    cluster_points,
+    cluster_rows,
+    grid_disk_cells,
+    zoom_to_resolution,
+)
+
+
+def _points() -> pl.DataFrame:
+    return pl.DataFrame({
+        "source": ["tollbooth", "tollbooth", "tollbooth", "tbimt"],
+        "lat": [20.67, 20.6701, None, 20.67],
+        "lng": [-103.35, -103.3501, -103.35, -103.35],
+        "status": ["open", "closed", "open", None],
+    })
+
+
+def test_zoom_to_resolution_is_monotonic():
+    resolutions = [zoom_to_resolution(zoom) for zoom in range(0, 19)]
+    assert resolutions == sorted(resolutions)
+
+
+def test_grid_disk_cells():
+    cell = 0x8429a4dffffffff
+    assert grid_disk_cells(cell, 4, 0) == [cell]
+    assert len(grid_disk_cells(cell, 4, 1)) == 7
+    with pytest.raises(ValueError):
+        grid_disk_cells(cell, 5, 0)
+
+
+def test_cluster_points_counts_by_status():
+    rows = cluster_rows(cluster_points(_points(), 5))
+    assert [(row["source"], row["count"]) for row in rows] == [("tbimt", 1), ("tollbooth", 2)]
+    assert rows[0]["status"] == {"unknown": 1}
+    assert rows[1]["status"] == {"open": 1, "closed": 1}
+
+
+def test_cluster_cache_invalidation():
+    loads = []
+
+    def load_points(info_year):
+        loads.append(info_year)
+        return _points()
+
+    cache = ClusterCache(resolutions=(4, 5))
+    cache.get(2025, 4, load_points)
+    cache.get(2025, 5, load_points)
+    assert loads == [2025]
+    cache.invalidate(2024)
+    cache.get(2025, 4, load_points)
+    assert loads == [2025]
+    cache.invalidate(2025)
+    cache.get(2025, 4, load_points)
+    assert loads == [2025, 2025]
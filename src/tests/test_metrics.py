@@ -0,0 +1,49 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import StaticPool, create_engine, text
+
+from src.utils.metrics import Histogram, Metrics, MetricsMiddleware, instrument_engine
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("tb_test_seconds", "Test.", (0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, route="/api/x")
+    assert histogram.lines()[2:] == [
+        'tb_test_seconds_bucket{route="/api/x",le="0.1"} 1',
+        'tb_test_seconds_bucket{route="/api/x",le="1.0"} 2',
+        'tb_test_seconds_bucket{route="/api/x",le="+Inf"} 3',
+        'tb_test_seconds_sum{route="/api/x"} 5.55',
+        'tb_test_seconds_count{route="/api/x"} 3',
+    ]
+
+
+def test_requests_count_their_queries_and_log_slow_ones(caplog):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    metrics = Metrics()
+    instrument_engine(engine, metrics, "test", slow_seconds=0)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)"))
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/api/t/{t_id}")
+    def fetch_t(t_id: int):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT name FROM t WHERE id = :id"), {"id": t_id}).all()
+            conn.execute(text("SELECT count(*) FROM t")).all()
+        return {"t_id": t_id}
+
+    with caplog.at_level(logging.WARNING, logger="src.utils.metrics"):
+        response = TestClient(app).get("/api/t/7")
+    assert response.headers["server-timing"].endswith('desc="2 queries"')
+    assert "SEARCH t USING INTEGER PRIMARY KEY" in caplog.text
+
+    rendered = metrics.render()
+    assert 'tb_db_queries_per_request_count{route="/api/t/{t_id}"} 1' in rendered
+    assert 'tb_db_queries_per_request_sum{route="/api/t/{t_id}"} 2.0' in rendered
+    assert 'tb_http_response_size_bytes_sum{method="GET",route="/api/t/{t_id}"} 10.0' in rendered
+    assert 'tb_db_queries_total{engine="test"} 3.0' in rendered
@@ -0,0 +1,45 @@
+import pytest
+from fastapi import Response
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from src.model import TbImt
+from src.utils.pagination import NEXT_CURSOR_HEADER, Keyset, decode_cursor, encode_cursor
+
+
+def test_cursor_roundtrip():
+    assert decode_cursor(encode_cursor((3, 2025))) == (3, 2025)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_keyset_pages_over_composite_key():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            TbImt(tollbooth_id=tollbooth_id, tollbooth_name=f"tb_{tollbooth_id}", info_year=info_year)
+            for tollbooth_id in (3, 1, 2) for info_year in (2026, 2025)
+        ])
+        session.commit()
+
+        keyset = Keyset(TbImt)
+        keys, cursor = [], None
+        while True:
+            response = Response()
+            rows = keyset.paginate(list(session.exec(keyset.page(select(TbImt), cursor, 4))), 4, response)
+            keys += [(row.tollbooth_id, row.info_year) for row in rows]
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+        assert keys == sorted((tollbooth_id, info_year) for tollbooth_id in (1, 2, 3) for info_year in (2025, 2026))
+
+
+@pytest.mark.parametrize("path", ["/api/tollbooths_sts", "/api/async/tollbooths_sts"])
+@pytest.mark.parametrize("limit", [0, -1])
+def test_list_endpoints_reject_empty_pages(path, limit):
+    from fastapi.testclient import TestClient
+
+    from src.main import app
+
+    response = TestClient(app).post(f"{path}?limit={limit}", json={"query": ""})
+    assert response.status_code == 422
@@ -22,6 +22,8 @@ def test_stage_tasks_import():
     assert hasattr(stage_tasks, "task_raw_to_stg")
     assert hasattr(stage_tasks, "task_dv_cleaner")
     assert hasattr(stage_tasks, "task_tb_sts")
+    assert hasattr(stage_tasks, "task_snapshot")
+    assert hasattr(stage_tasks, "task_static_export")
 
 
 def test_cluster_tasks_import():
@@ -30,6 +32,8 @@ def test_cluster_tasks_import():
     assert hasattr(cluster_tasks, "task_map_tb_id")
     assert hasattr(cluster_tasks, "task_tb_imt_stretch_id_rel")
     assert hasattr(cluster_tasks, "task_tb_stretch_id_sts")
+    assert hasattr(cluster_tasks, "task_toll_matrix")
+    assert hasattr(cluster_tasks, "task_stretch_detail")
 
 
 def test_report_tasks_import():
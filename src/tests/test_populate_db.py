@@ -0,0 +1,195 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import date
+
+import polars as pl
+from sqlmodel import create_engine
+
+from src.data_files import PathModel
+from src.model import ChangeLog, DataRevision, Road, TbStretchId
+from src.scripts.populate_db import (
+    apply_diff,
+    current_frame,
+    diff_rows,
+    replace_year,
+    table_batches,
+    table_frame,
+)
+
+
+def _path_model(tmp_path) -> PathModel:
+    return PathModel("tb_stretch_id", TbStretchId, {"year": 2025}, str(tmp_path))
+
+
+def _create_tables(db_path: str, *models):
+    """The tables of `models` plus those replace_year records its revisions in."""
+    engine = create_engine(f"sqlite:///{db_path}")
+    for model in (*models, DataRevision, ChangeLog):
+        model.__table__.create(engine)
+    engine.dispose()
+
+
+def test_table_frame_drops_rows_without_key(tmp_path):
+    path_model = _path_model(tmp_path)
+    (tmp_path / "2025").mkdir()
+    pl.DataFrame({
+        "stretch_id": [1, 1, 2, None], "tollbooth_id_in": [5, 5, None, 7], "tollbooth_id_out": [6, 6, 8, 8],
+    }).write_parquet(path_model.parquet)
+    df = table_frame(path_model, 2025).collect()
+    assert df.rows() == [(1, 5, 6, 2025)]
+    assert df.schema == TbStretchId.dict_schema()
+
+
+def test_replace_year_keeps_other_years_and_indexes(tmp_path):
+    db_path = str(tmp_path / "tb.db")
+    _create_tables(db_path, TbStretchId)
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO tbstretchid VALUES (?, ?, ?, ?)", [(1, 5, 6, 2025), (1, 5, 6, 2026)])
+    conn.commit()
+
+    df = pl.DataFrame([(2, 7, 8, 2025), (3, 8, 9, 2025)], schema=TbStretchId.dict_schema(), orient="row")
+    replace_year(db_path, _path_model(tmp_path), df, 2025)
+
+    assert conn.execute("SELECT * FROM tbstretchid ORDER BY info_year, stretch_id").fetchall() == [
+        (2, 7, 8, 2025), (3, 8, 9, 2025), (1, 5, 6, 2026)
+    ]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+    assert indexes == {"ix_tbstretchid_in_info_year", "ix_tbstretchid_out_info_year"}
+    conn.close()
+
+
+def test_sync_applies_only_changed_rows(tmp_path):
+    db_path = str(tmp_path / "tb.db")
+    TbStretchId.__table__.create(create_engine(f"sqlite:///{db_path}"))
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO tbstretchid VALUES (?, ?, ?, ?)", [(1, 5, 6, 2025), (2, 6, 7, 2025), (1, 5, 6, 2026)]
+    )
+    conn.commit()
+
+    path_model = _path_model(tmp_path)
+    keys = ["stretch_id", "tollbooth_id_in", "tollbooth_id_out", "info_year"]
+    df_staged = pl.DataFrame([(1, 5, 6, 2025), (3, 7, 8, 2025)], schema=TbStretchId.dict_schema(), orient="row")
+    inserts, updates, deletes = diff_rows(current_frame(conn, path_model, 2025), df_staged, keys, keys)
+    assert (inserts.rows(), updates.height, deletes.rows()) == ([(3, 7, 8, 2025)], 0, [(2, 6, 7, 2025)])
+    with conn:
+        apply_diff(conn, path_model, inserts, updates, deletes)
+
+    assert conn.execute("SELECT * FROM tbstretchid ORDER BY info_year, stretch_id").fetchall() == [
+        (1, 5, 6, 2025), (3, 7, 8, 2025), (1, 5, 6, 2026)
+    ]
+    assert [df.height for df in diff_rows(current_frame(conn, path_model, 2025), df_staged, keys, keys)] == [0, 0, 0]
+    conn.close()
+
+
+def test_diff_rows_updates_changed_values():
+    current = pl.DataFrame({"road_id": [1, 2], "name": ["a", "b"]})
+    staged = pl.DataFrame({"road_id": [1, 2], "name": ["a", "c"]})
+    inserts, updates, deletes = diff_rows(current, staged, ["road_id"], ["road_id", "name"])
+    assert (inserts.height, updates.rows(), deletes.height) == (0, [(2, "c")], 0)
+
+
+def test_table_batches_keep_the_model_dtypes(tmp_path):
+    db_path = str(tmp_path / "tb.db")
+    Road.__table__.create(create_engine(f"sqlite:///{db_path}"))
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO road (road_id, road_name, operation_date, road_length_km, info_year) VALUES (?, ?, ?, ?, ?)",
+        [(1, "a", None, None, 2025), (2, "b", None, None, 2025), (3, "c", "2014-03-19", 26.8, 2025), (4, "d", None, 9.0, 2026)],
+    )
+    conn.commit()
+    conn.close()
+
+    path_model = PathModel("roads", Road, {"year": 2025}, str(tmp_path))
+    batches = list(table_batches(db_path, path_model, 2025, batch_rows=2))
+    assert [df.height for df in batches] == [2, 1]
+    assert all(df.schema == Road.dict_schema() for df in batches)
+    assert batches[1].select("operation_date", "road_length_km").rows() == [(date(2014, 3, 19), 26.8)]
+
+
+def test_replace_year_stores_dates_as_iso_text(tmp_path):
+    db_path = str(tmp_path / "tb.db")
+    _create_tables(db_path, Road)
+    row = {"road_id": 1, "road_name": "a", "end_contract_date": date(2071, 9, 30), "info_year": 2025}
+    df = pl.DataFrame([dict.fromkeys(Road.dict_schema()) | row], schema=Road.dict_schema())
+    replace_year(db_path, PathModel("roads", Road, {"year": 2025}, str(tmp_path)), df, 2025)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT end_contract_date FROM road").fetchall() == [("2071-09-30",)]
+    conn.close()
+
+
+def _run_on_editor_db(db_path: str, call: str):
+    # The editor db path is read on import, so every call runs in its own process as from the CLI.
+    subprocess.run(
+        [sys.executable, "-c", f"from src.scripts.populate_db import load_year, sync_year; {call}"],
+        env={**os.environ, "TB_EDITOR_DB": db_path}, check=True, capture_output=True,
+    )
+
+
+def test_load_year_on_a_wal_db(tmp_path):
+    for year in (2025, 2026):
+        (tmp_path / str(year)).mkdir()
+        pl.DataFrame({
+            "stretch_id": [1, 2], "tollbooth_id": [5, 6], "tollbooth_sts_id": [50, 60]
+        }).write_parquet(tmp_path / str(year) / "tb_sts_stretch_id.parquet")
+        pl.DataFrame({
+            "stretch_id": [1, 2], "tollbooth_id_in": [5, 6], "tollbooth_id_out": [6, 7]
+        }).write_parquet(tmp_path / str(year) / "tb_stretch_id.parquet")
+    db_path = str(tmp_path / "tb.db")
+    for year in (2025, 2026, 2025):
+        _run_on_editor_db(
+            db_path,
+            f"load_year({year}, ('tb_stretch_id', 'tb_sts_stretch_id'), stage={str(tmp_path)!r}); "
+            "from src.utils.connector import get_engine; assert get_engine().pool.checkedin() == 0",
+        )
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert conn.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+    assert conn.execute("SELECT info_year, count(*) FROM tbstretchid GROUP BY info_year").fetchall() == [
+        (2025, 2), (2026, 2)
+    ]
+    assert conn.execute("SELECT table_name, info_year, revision FROM datarevision ORDER BY 1, 2").fetchall() == [
+        ("tbstretchid", 2025, 2), ("tbstretchid", 2026, 1), ("tbstsstretchid", 2025, 2), ("tbstsstretchid", 2026, 1)
+    ]
+    assert conn.execute("SELECT count(*) FROM changelog WHERE op = 'reset'").fetchone() == (6,)
+    conn.close()
+
+
+def test_replace_year_takes_over_keys_of_another_year(tmp_path):
+    db_path = str(tmp_path / "tb.db")
+    _create_tables(db_path, Road)
+    path_model = PathModel("roads", Road, {"year": 2025}, str(tmp_path))
+    for year, road_ids in ((2026, [1, 2]), (2025, [2, 3])):
+        rows = [dict.fromkeys(Road.dict_schema()) | {"road_id": i, "road_name": f"r{i}", "info_year": year} for i in road_ids]
+        replace_year(db_path, path_model, pl.DataFrame(rows, schema=Road.dict_schema()), year)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT road_id, info_year FROM road ORDER BY road_id").fetchall() == [
+        (1, 2026), (2, 2025), (3, 2025)
+    ]
+    assert conn.execute("SELECT info_year, revision FROM datarevision ORDER BY info_year").fetchall() == [
+        (2025, 1), (2026, 2)
+    ]
+    conn.close()
+
+
+def test_sync_year_records_its_revisions(tmp_path):
+    (tmp_path / "2025").mkdir()
+    staged = tmp_path / "2025" / "tb_stretch_id.parquet"
+    pl.DataFrame({"stretch_id": [1, 2], "tollbooth_id_in": [5, 6], "tollbooth_id_out": [6, 7]}).write_parquet(staged)
+    db_path = str(tmp_path / "tb.db")
+    _run_on_editor_db(db_path, f"load_year(2025, ('tb_stretch_id',), stage={str(tmp_path)!r})")
+    pl.DataFrame({"stretch_id": [1, 3], "tollbooth_id_in": [5, 8], "tollbooth_id_out": [6, 9]}).write_parquet(staged)
+    for _ in range(2):
+        _run_on_editor_db(db_path, f"sync_year(2025, ('tb_stretch_id',), stage={str(tmp_path)!r})")
+
+    conn = sqlite3.connect(db_path)
+    # The second sync changes nothing and keeps the revision.
+    assert conn.execute("SELECT revision FROM datarevision WHERE table_name = 'tbstretchid'").fetchall() == [(2,)]
+    assert conn.execute("SELECT op, count(*) FROM changelog GROUP BY op ORDER BY op").fetchall() == [
+        ("delete", 1), ("reset", 1), ("upsert", 1)
+    ]
+    conn.close()
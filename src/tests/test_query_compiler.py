@@ -0,0 +1,43 @@
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from src.model import Tollbooth
+from src.utils.query_compiler import compile_query
+from src.utils.query_parser import parse_query
+
+
+def _tollbooth(tollbooth_id: int, lat: float, state: str) -> Tollbooth:
+    return Tollbooth(
+        tollbooth_id=tollbooth_id, tollbooth_name=f"tb_{tollbooth_id}", lat=lat, lng=-103.0,
+        status="open", state=state, type="toll", info_year=2025,
+    )
+
+
+def _ids(session: Session, query: str) -> list[int]:
+    compiled = compile_query(Tollbooth, parse_query(query))
+    return sorted(tb.tollbooth_id for tb in session.exec(compiled.stm, params=compiled.params))
+
+
+def test_compiled_queries_filter():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([_tollbooth(1, 19.5, "jalisco"), _tollbooth(2, 20.5, "jalisco"), _tollbooth(3, 21.5, "sonora")])
+        session.commit()
+        assert _ids(session, "id:1,3") == [1, 3]
+        assert _ids(session, "id:all") == [1, 2, 3]
+        assert _ids(session, "lat:20..22 AND state:jalisco") == [2]
+        assert _ids(session, "lat:..20 OR state:sonora") == [1, 3]
+
+
+def test_statement_is_cached_by_shape():
+    first = compile_query(Tollbooth, parse_query("id:1,2 AND state:jalisco"))
+    second = compile_query(Tollbooth, parse_query("id:7 AND state:sonora"))
+    assert first.stm is second.stm
+    assert second.params == {"q_0": [7], "q_1": ["sonora"]}
+
+
+@pytest.mark.parametrize("query", ["legacy:1", "id:abc", "h3_cell:8429a4dffffffff,5", "empty_stretch"])
+def test_rejected_queries(query):
+    with pytest.raises(ValueError):
+        compile_query(Tollbooth, parse_query(query))
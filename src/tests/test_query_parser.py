@@ -23,3 +23,52 @@ def test_all_value():
 def test_reserved_words():
     assert parse_query("empty_stretch") == {"param": "empty_stretch"}
 
+
+
+def test_h3_cell_hex_and_ring():
+    assert parse_query("h3_cell:8429a4dffffffff,4,1") == {
+        "param": "h3_cell", "cell": 0x8429a4dffffffff, "resolution": 4, "k": 1
+    }
+
+
+def test_h3_cell_integer_default_ring():
+    assert parse_query("h3_cell:595771071295127551,4") == {
+        "param": "h3_cell", "cell": 595771071295127551, "resolution": 4, "k": 0
+    }
+
+
+@pytest.mark.parametrize("query", [
+    "h3_cell:8429a4dffffffff", "h3_cell:zz,4", "h3_cell:8429a4dffffffff,16", "h3_cell:99999999999999999999,4",
+    "h3_cell:-5,4",
+])
+def test_h3_cell_malformed(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+
+def test_ranges():
+    assert parse_query("lat:19..20.5, 22") == {"param": "lat", "values": ["22"], "ranges": [[19.0, 20.5]]}
+    assert parse_query("km:..120")["ranges"] == [[None, 120.0]]
+
+
+@pytest.mark.parametrize("query", ["lat:a..b", "lat:..", "lat:3..1"])
+def test_range_malformed(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+
+def test_and_binds_tighter_than_or():
+    assert parse_query("state:jalisco AND status:open OR id:3") == {
+        "param": "or",
+        "clauses": [
+            {"param": "and", "clauses": [
+                {"param": "state", "values": ["jalisco"]}, {"param": "status", "values": ["open"]}
+            ]},
+            {"param": "id", "values": ["3"]},
+        ],
+    }
+
+
+def test_reserved_word_in_compound_query():
+    with pytest.raises(ValueError):
+        parse_query("empty_stretch AND id:1")
@@ -0,0 +1,94 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine
+
+from src.utils.response_cache import (
+    ResponseCache,
+    ResponseCacheMiddleware,
+    RevisionWatcher,
+    _Entry,
+    bump_revision,
+)
+
+
+def _entry(*tags) -> _Entry:
+    return _Entry(body=b"[]", status_code=200, headers={}, etag='"x"', tags=frozenset(tags), expires=float("inf"))
+
+
+def test_invalidation_is_per_table_and_year():
+    cache = ResponseCache()
+    cache.put("tb_2025", _entry(("tollbooth", 2025)), cache.generation)
+    cache.put("tb_all", _entry(("tollbooth", None)), cache.generation)
+    cache.put("sts_2025", _entry(("tbsts", 2025)), cache.generation)
+    changes = []
+    cache.add_listener(lambda table, info_year: changes.append((table, info_year)))
+
+    cache.invalidate("tollbooth", 2026)
+    assert cache.get("tb_2025") is not None and cache.get("tb_all") is None
+    cache.invalidate("tollbooth")
+    assert cache.get("tb_2025") is None and cache.get("sts_2025") is not None
+    assert changes == [("tollbooth", 2026), ("tollbooth", None)]
+
+
+def test_put_after_invalidation_is_dropped():
+    cache = ResponseCache(maxsize=1)
+    generation = cache.generation
+    cache.invalidate("tollbooth")
+    cache.put("stale", _entry(("tollbooth", None)), generation)
+    assert cache.get("stale") is None
+    cache.put("a", _entry(), cache.generation)
+    cache.put("b", _entry(), cache.generation)
+    assert cache.get("a") is None and cache.get("b") is not None
+
+
+def test_middleware_etag_and_invalidation():
+    calls = []
+    app = FastAPI()
+    cache = ResponseCache()
+    app.add_middleware(ResponseCacheMiddleware, cache=cache, routes={"/rows": ["tollbooth"]})
+
+    @app.post("/rows")
+    def rows(body: dict):
+        calls.append(body)
+        return [len(calls)]
+
+    client = TestClient(app)
+    first = client.post("/rows", json={"query": "info_year:2025", "b": 1})
+    again = client.post("/rows", json={"b": 1, "query": "info_year:2025"}, headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304 and len(calls) == 1
+
+    cache.invalidate("tollbooth", 2026)
+    assert client.post("/rows", json={"query": "info_year:2025", "b": 1}).json() == [1]
+    cache.invalidate("tollbooth", 2025)
+    assert client.post("/rows", json={"query": "info_year:2025", "b": 1}).json() == [2]
+
+
+def test_watcher_sees_other_writers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tb.db'}")
+    SQLModel.metadata.create_all(engine)
+    cache = ResponseCache()
+    cache.put("sts_2025", _entry(("tbsts", 2025)), cache.generation)
+    cache.put("sts_2026", _entry(("tbsts", 2026)), cache.generation)
+    watcher = RevisionWatcher(engine, cache)
+    watcher.poll()
+    with engine.begin() as conn:
+        bump_revision(conn, "tbsts", 2025)
+    watcher.poll()
+    assert cache.get("sts_2025") is None and cache.get("sts_2026") is not None
+
+
+def test_middleware_no_cache_runs_the_endpoint():
+    calls = []
+    app = FastAPI()
+    cache = ResponseCache()
+    app.add_middleware(ResponseCacheMiddleware, cache=cache, routes={"/rows": ["tollbooth"]})
+
+    @app.post("/rows")
+    def rows(body: dict):
+        calls.append(body)
+        return [len(calls)]
+
+    client = TestClient(app)
+    assert client.post("/rows", json={"b": 1}).json() == [1]
+    assert client.post("/rows", json={"b": 1}, headers={"Cache-Control": "no-cache"}).json() == [2]
+    assert client.post("/rows", json={"b": 1}).json() == [2]
@@ -0,0 +1,58 @@
+import polars as pl
+
+from src.model import StretchToll
+from src.utils.routing import RouteGraphCache, TollGraph
+
+
+def _edges() -> pl.DataFrame:
+    # 1 -> 2 -> 3 is cheaper for cars, 1 -> 3 is shorter; trucks can't use 2 -> 3.
+    rows = [
+        (1, 2, 10, "a_b", 5.0, 20.0, 40.0),
+        (2, 3, 11, "b_c", 5.0, 20.0, None),
+        (1, 3, 12, "a_c", 8.0, 50.0, 90.0),
+        (3, 3, 13, "c", None, 15.0, 30.0),
+    ]
+    df = pl.DataFrame(
+        rows,
+        schema=["tollbooth_id_in", "tollbooth_id_out", "stretch_id", "stretch_name", "stretch_length_km", "car", "truck_2_axle"],
+        orient="row",
+    )
+    others = [pl.lit(None, dtype=pl.Float64).alias(col) for col in StretchToll.vehicle_cols() if col not in df.columns]
+    return df.with_columns(others)
+
+
+def test_route_per_vehicle_and_weight():
+    graph = TollGraph(_edges())
+    car = graph.route(1, 3, "car")
+    assert [stretch["stretch_id"] for stretch in car["stretches"]] == [10, 11]
+    assert (car["toll"], car["length_km"]) == (40.0, 10.0)
+    assert [stretch["stretch_id"] for stretch in graph.route(1, 3, "car", "distance")["stretches"]] == [12]
+    assert graph.route(1, 3, "truck_2_axle")["toll"] == 90.0
+    assert graph.route(3, 1, "car") is None
+    assert graph.route(1, 3, "motorbike") is None
+    assert graph.route(3, 3, "car")["stretches"][0]["stretch_id"] == 13
+
+
+def test_sink_only_tollbooth_is_a_node():
+    df = _edges()
+    sink = df.head(1).with_columns(tollbooth_id_in=pl.lit(2), tollbooth_id_out=pl.lit(4), stretch_id=pl.lit(14))
+    graph = TollGraph(pl.concat([df, sink], how="vertical_relaxed"))
+    assert graph.has_node(4) and not graph.has_node(5)
+    assert [stretch["stretch_id"] for stretch in graph.route(1, 4, "car")["stretches"]] == [10, 14]
+
+
+def test_cache_rebuilds_after_invalidate():
+    loads = []
+
+    def load(info_year):
+        loads.append(info_year)
+        return _edges()
+
+    cache = RouteGraphCache()
+    graph = cache.get(2025, load)
+    assert cache.get(2025, load) is graph
+    cache.invalidate(2026)
+    assert cache.get(2025, load) is graph
+    cache.invalidate(2025)
+    assert cache.get(2025, load) is not graph
+    assert loads == [2025, 2025]
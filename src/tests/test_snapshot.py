@@ -0,0 +1,40 @@
+import sqlite3
+
+import polars as pl
+
+from src.model import TbStretchId, Tollbooth
+from src.scripts.snapshot import build_snapshot
+
+
+def _stage(tmp_path) -> str:
+    year_dir = tmp_path / "2025"
+    year_dir.mkdir()
+    pl.DataFrame({
+        "tollbooth_id": [1, 2], "legacy_id": [None, None], "tollbooth_name": ["la_venta", "chichimeco"],
+        "lat": [19.4, 22.0], "lng": [-99.2, -102.3], "status": ["open", "open"], "state": ["cdmx", "ags"],
+        "place": [None, None], "lines": [2, 3], "type": ["toll", "toll"], "manage": [None, None],
+        "gate_to": [None, None], "anti_evation_sys": [None, None], "in_out": [None, None],
+    }).write_parquet(year_dir / "tollbooths.parquet")
+    pl.DataFrame({
+        "stretch_id": [10, 10, 11], "tollbooth_id_in": [1, 1, None], "tollbooth_id_out": [2, 2, 2],
+    }).write_parquet(year_dir / "tb_stretch_id.parquet")
+    return str(tmp_path)
+
+
+def test_build_snapshot(tmp_path):
+    dest = str(tmp_path / "tb_map_2025.db")
+    assert build_snapshot(2025, dest, stage=_stage(tmp_path)) == [Tollbooth.name(), TbStretchId.name()]
+
+    conn = sqlite3.connect(f"file:{dest}?mode=ro", uri=True)
+    try:
+        assert conn.execute("SELECT tollbooth_id, info_year, h3_cell_8 IS NOT NULL FROM tollbooth").fetchall() == [
+            (1, 2025, 1), (2, 2025, 1)
+        ]
+        assert conn.execute("SELECT stretch_id, info_year FROM tbstretchid").fetchall() == [(10, 2025)]
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"ix_tbstretchid_out_info_year", "ix_tbneighbour_tollbooth_id_scope"} <= indexes
+        assert conn.execute("SELECT count(*) FROM tb_name_fts").fetchone() == (2,)
+        assert conn.execute("SELECT count(*) FROM sqlite_stat1").fetchone()[0] > 0
+    finally:
+        conn.close()
+    assert not (tmp_path / "tb_map_2025.db.tmp").exists()
@@ -0,0 +1,120 @@
+import math
+import random
+
+import polars as pl
+import polars_h3 as plh3
+
+from src.utils.spatial_index import (
+    KdTree,
+    NeighbourIndex,
+    NeighbourIndexCache,
+    km_to_chord,
+    unit_vector,
+)
+
+
+def _brute_force(points, target):
+    return sorted((math.dist(target, point), i) for i, point in enumerate(points))
+
+
+def test_kd_tree_matches_brute_force():
+    rng = random.Random(7)
+    points = [unit_vector(rng.uniform(14, 32), rng.uniform(-117, -86)) for _ in range(500)]
+    tree = KdTree(points)
+    radius = km_to_chord(50)
+    for target in points[:50]:
+        expected = _brute_force(points, target)
+        assert [i for _, i in tree.query(target, k=5)] == [i for _, i in expected[:5]]
+        assert [i for _, i in tree.query(target, radius=radius)] == [i for d, i in expected if d <= radius]
+        assert [i for _, i in tree.query(target, k=3, skip=expected[0][1])] == [i for _, i in expected[1:4]]
+
+
+def _points() -> pl.DataFrame:
+    return pl.DataFrame({
+        "source": ["tollbooth", "tollbooth", "tollbooth", "tbsts", "tbsts"],
+        "tollbooth_id": [1, 2, 3, 1, 1],
+        "tollbooth_name": ["a", "b", "c", "old", "new"],
+        "lat": [20.67, 20.70, None, 20.68, 20.69],
+        "lng": [-103.35, -103.30, -103.35, -103.34, -103.33],
+        "info_year": [2025, 2025, 2025, 2024, 2025],
+    })
+
+
+def test_neighbour_index_distances_and_latest_year():
+    index = NeighbourIndex(_points())
+    assert index.location("tollbooth", 3) is None
+    (neighbour,) = index.nearest(20.67, -103.35, "tollbooth", k=5, skip=1)
+    expected = pl.DataFrame({"lat": [20.67], "lng": [-103.35], "lat_b": [20.70], "lng_b": [-103.30]}).select(
+        plh3.great_circle_distance("lat", "lng", "lat_b", "lng_b")
+    ).item()
+    assert neighbour["tollbooth_id"] == 2
+    assert math.isclose(neighbour["distance"], expected, rel_tol=1e-3)
+    assert [row["tollbooth_name"] for row in index.nearest(20.67, -103.35, "tbsts", k=5)] == ["new"]
+    assert index.nearest(20.67, -103.35, "tbimt", k=5) == []
+
+
+def test_neighbour_index_cache_invalidation():
+    loads = []
+
+    def load_points(info_year):
+        loads.append(info_year)
+        return _points()
+
+    cache = NeighbourIndexCache()
+    cache.get(2025, load_points)
+    cache.get(None, load_points)
+    # An edit of 2024 keeps the 2025 index and drops the all-years one.
+    cache.invalidate(2024)
+    cache.get(2025, load_points)
+    cache.get(None, load_points)
+    assert loads == [2025, None, None]
+    cache.invalidate(2025)
+    cache.get(2025, load_points)
+    assert loads == [2025, None, None, 2025]
+
+
+def test_neighbour_index_cache_keeps_only_years_with_points():
+    loads = []
+
+    def load_points(info_year):
+        loads.append(info_year)
+        return _points().filter(pl.col("info_year") == info_year)
+
+    cache = NeighbourIndexCache()
+    for info_year in (2025, 2025, 1999, 1999):
+        cache.get(info_year, load_points)
+    assert loads == [2025, 1999, 1999]
+
+
+def test_neighbours_info_year_must_be_an_integer(tmp_path):
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session, SQLModel, create_engine
+
+    from src.main import app, neighbour_cache
+    from src.model import Tollbooth
+    from src.utils.connector import get_read_session
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'tb.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Tollbooth(
+            tollbooth_id=1, tollbooth_name="tb_1", status="open", state="jalisco", type="toll",
+            lat=20.6, lng=-103.3, info_year=2025
+        ))
+        session.commit()
+
+    def read_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_read_session] = read_session
+    try:
+        client = TestClient(app)
+        body = {"lat": 20.67, "lng": -103.35, "k": 1}
+        assert client.post("/api/neighbours", json={**body, "info_year": "next"}).status_code == 400
+        response = client.post("/api/neighbours", json={**body, "info_year": "2025"})
+        assert [tb["tollbooth_id"] for tb in response.json()[0]["neighbours"]["local"]] == [1]
+        assert response.json() == client.post("/api/neighbours", json={**body, "info_year": 2025}).json()
+    finally:
+        app.dependency_overrides.clear()
+        neighbour_cache.invalidate(2025)
@@ -0,0 +1,80 @@
+from sqlmodel import Session, SQLModel, create_engine
+
+from src.model import TbImt, Tollbooth
+from src.utils.sqlite_index import (
+    create_name_index,
+    create_spatial_indexes,
+    name_suggestions,
+    viewport_stm,
+)
+
+
+def _tollbooth(tollbooth_id: int, lat: float | None, lng: float | None, name: str | None = None) -> Tollbooth:
+    return Tollbooth(
+        tollbooth_id=tollbooth_id, tollbooth_name=name or f"tb_{tollbooth_id}", lat=lat, lng=lng,
+        status="open", state="jalisco", type="toll", info_year=2025,
+    )
+
+
+def _engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        create_spatial_indexes(conn)
+        create_name_index(conn)
+    return engine
+
+
+def test_viewport_tracks_inserts_updates_and_deletes():
+    engine = _engine()
+    with Session(engine) as session:
+        session.add_all([_tollbooth(1, 20.5, -103.3), _tollbooth(2, 25.6, -100.3), _tollbooth(3, None, None)])
+        session.commit()
+
+        stm = viewport_stm(Tollbooth, 20.0, -104.0, 21.0, -103.0)
+        assert [tb.tollbooth_id for tb in session.exec(stm)] == [1]
+
+        tb = session.get(Tollbooth, 2)
+        tb.lat, tb.lng = 20.7, -103.5
+        session.add(tb)
+        session.delete(session.get(Tollbooth, 1))
+        session.commit()
+        assert [tb.tollbooth_id for tb in session.exec(stm)] == [2]
+
+
+def test_spatial_index_backfills_existing_rows():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(_tollbooth(1, 20.5, -103.3))
+        session.commit()
+    with engine.begin() as conn:
+        create_spatial_indexes(conn)
+    with Session(engine) as session:
+        stm = viewport_stm(Tollbooth, 20.0, -104.0, 21.0, -103.0)
+        assert [tb.tollbooth_id for tb in session.exec(stm)] == [1]
+
+
+def test_name_suggestions_track_writes_and_rank():
+    engine = _engine()
+    with Session(engine) as session:
+        session.add_all([
+            _tollbooth(1, 20.5, -103.3, "san_martin_texmelucan"),
+            _tollbooth(2, 20.6, -103.4, "martinez_de_la_torre"),
+            _tollbooth(3, 20.7, -103.5, "la_venta"),
+            TbImt(tollbooth_id=1, tollbooth_name="martin", lat=20.5, lng=-103.3, info_year=2025),
+        ])
+        session.commit()
+
+        rows = name_suggestions(session.connection(), "Martín", ["tollbooth", "tbimt"], 10)
+        assert [(row["source"], row["tollbooth_id"]) for row in rows] == [("tbimt", 1), ("tollbooth", 2), ("tollbooth", 1)]
+        assert len(name_suggestions(session.connection(), "martin", ["tollbooth"], 1)) == 1
+        assert [row["tollbooth_id"] for row in name_suggestions(session.connection(), "la", ["tollbooth"], 10)] == [3]
+
+        tb = session.get(Tollbooth, 3)
+        tb.tollbooth_name = "martin_chico"
+        session.add(tb)
+        session.delete(session.get(Tollbooth, 2))
+        session.commit()
+        rows = name_suggestions(session.connection(), "martin", ["tollbooth"], 10)
+        assert sorted(row["tollbooth_id"] for row in rows) == [1, 3]
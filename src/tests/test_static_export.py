@@ -0,0 +1,51 @@
+import json
+
+import pyarrow.parquet as pq
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.scripts.static_export import static_export
+from src.scripts.synthetic_db import synthetic_stage
+from src.utils.tiles import CachedStaticFiles
+
+
+def test_static_export_shards_and_range_requests(tmp_path):
+    stage = f"{tmp_path}/stage/"
+    rows = synthetic_stage(2026, 0.05, stage)
+    dest = tmp_path / "tiles" / "2026"
+    manifest = static_export(2026, stage, str(dest))
+    assert {table: entry["count"] for table, entry in manifest["tables"].items()} == {
+        "tollbooth": rows["tollbooth"], "tbsts": rows["tb_sts"], "tbimt": rows["tb_imt"]
+    }
+
+    table = manifest["tables"]["tollbooth"]
+    parquet = pq.ParquetFile(dest / table["parquet"])
+    assert json.loads(parquet.schema_arrow.metadata[b"geo"])["primary_column"] == "geometry"
+    assert parquet.metadata.num_row_groups == len(table["shards"])
+
+    app = FastAPI()
+    app.mount("/tiles", CachedStaticFiles(directory=tmp_path / "tiles"), name="tiles")
+    client = TestClient(app)
+    assert client.get("/tiles/2026/manifest.json").headers["cache-control"] == "no-cache"
+    ids = []
+    for shard in table["shards"]:
+        response = client.get(
+            f"/tiles/2026/{table['pack']}",
+            headers={"Range": f"bytes={shard['offset']}-{shard['offset'] + shard['length'] - 1}"},
+        )
+        assert response.status_code == 206
+        assert "immutable" in response.headers["cache-control"]
+        shard_rows = response.json()
+        south, west, north, east = shard["bbox"]
+        assert all(south <= row["lat"] <= north and west <= row["lng"] <= east for row in shard_rows)
+        assert {row["source"] for row in shard_rows} == {"tollbooth"}
+        ids.extend(row["tollbooth_id"] for row in shard_rows)
+    assert sorted(ids) == list(range(1, rows["tollbooth"] + 1))
+
+
+def test_only_the_viewer_map_reads_tiles():
+    from src.main import app
+
+    client = TestClient(app)
+    assert "const TILES_MANIFEST    = null;" in client.get("/").text
+    assert client.get("/?viewer=true&year=1999").status_code == 404
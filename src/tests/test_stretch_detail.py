@@ -0,0 +1,43 @@
+import json
+from datetime import date
+
+import polars as pl
+
+from src.model import StretchDetail
+from src.scripts.stretch_detail import stretch_detail_frame
+
+
+def test_stretch_detail_joins_one_row_per_stretch(tmp_path):
+    folder = tmp_path / "2025"
+    folder.mkdir()
+    pl.DataFrame({
+        "stretch_id": [1, 2], "stretch_name": ["a_b", "b_c"], "stretch_length_km": [10.0, 5.0], "road_id": [7, None],
+    }).write_parquet(folder / "stretchs.parquet")
+    pl.DataFrame({
+        "road_id": [7], "road_name": ["r"], "end_contract_date": [date(2071, 9, 30)],
+    }).write_parquet(folder / "roads.parquet")
+    # The toll of stretch 1 is staged twice; the first row is kept, as the db load does.
+    pl.DataFrame({"stretch_id": [1, 1], "car": [30.0, 99.0], "toll_ref": ["x", "y"]}).write_parquet(folder / "stretchs_toll.parquet")
+    pl.DataFrame({"tollbooth_id": [10, 11, 12], "tollbooth_name": ["a", "b", "c"]}).write_parquet(folder / "tollbooths.parquet")
+    pl.DataFrame({
+        "stretch_id": [1, 1, 2], "tollbooth_id_in": [11, 10, 11], "tollbooth_id_out": [10, 11, 12],
+    }).write_parquet(folder / "tb_stretch_id.parquet")
+    pl.DataFrame({"tollbooth_id": [100, 101], "tdpa": [1000, 2000], "vta": [365000, 730000]}).write_parquet(folder / "tb_sts.parquet")
+    pl.DataFrame({
+        "stretch_id": [1, 1, 2], "tollbooth_id": [10, 11, None], "tollbooth_sts_id": [100, 101, None],
+    }).write_parquet(folder / "tb_sts_stretch_id.parquet")
+    pl.DataFrame({
+        "stretch_name": ["a_b", "a_b"], "jan": [5, 1], "feb": [5, None], "manager": ["m", "m"],
+    }).write_parquet(folder / "manager_revenue.parquet")
+
+    df = stretch_detail_frame(2025, str(tmp_path))
+    assert df.schema == StretchDetail.dict_schema()
+    first, second = df.to_dicts()
+    assert (first["road_name"], first["end_contract_date"], first["car"], first["toll_ref"]) == ("r", date(2071, 9, 30), 30.0, "x")
+    assert [(pair["tollbooth_name_in"], pair["tollbooth_name_out"]) for pair in json.loads(first["tollbooths"])] == [
+        ("a", "b"), ("b", "a")
+    ]
+    assert (first["sts_stations"], first["tdpa"], first["vta"], first["annual_revenue"]) == (2, 1500, 547500, 11)
+    assert (second["road_name"], second["car"], second["tdpa"], second["annual_revenue"], second["info_year"]) == (
+        None, None, None, None, 2025
+    )
@@ -0,0 +1,56 @@
+import math
+
+import polars as pl
+
+from src.model import StretchToll
+from src.utils.routing import TollGraph
+from src.utils.toll_matrix import (
+    LENGTH_COLUMN,
+    TollMatrix,
+    road_networks,
+    toll_matrices,
+    write_toll_matrices,
+)
+
+
+def _graph() -> TollGraph:
+    # Network 1 -> 2 -> 3 (with a crossing toll at 3) and a separate network 7 -> 8.
+    rows = [
+        (1, 2, 10, "a_b", 5.0, 20.0),
+        (2, 3, 11, "b_c", 5.0, 20.0),
+        (1, 3, 12, "a_c", 8.0, 50.0),
+        (3, 3, 13, "c", 1.0, 15.0),
+        (7, 8, 14, "g_h", 3.0, 9.0),
+    ]
+    df = pl.DataFrame(
+        rows,
+        schema=["tollbooth_id_in", "tollbooth_id_out", "stretch_id", "stretch_name", "stretch_length_km", "car"],
+        orient="row",
+    )
+    others = [pl.lit(None, dtype=pl.Float64).alias(col) for col in StretchToll.vehicle_cols() if col not in df.columns]
+    return TollGraph(df.with_columns(others))
+
+
+def test_road_networks():
+    assert road_networks(_graph()) == [[1, 2, 3], [7, 8]]
+
+
+def test_matrices_round_trip(tmp_path):
+    graph = _graph()
+    df_index, df_matrix = toll_matrices(graph, 2025)
+    assert df_matrix.height == 3 * 3 + 2 * 2
+    assert all(dtype == pl.Float32 for dtype in df_matrix.dtypes)
+
+    index_path, matrix_path = str(tmp_path / "toll_matrix.parquet"), str(tmp_path / "toll_matrix.arrow")
+    write_toll_matrices(df_index, df_matrix, index_path, matrix_path)
+    matrix = TollMatrix(index_path, matrix_path)
+    assert matrix.lookup(1, 3, "car") == 40.0
+    assert matrix.lookup(1, 3, LENGTH_COLUMN) == 8.0
+    assert matrix.lookup(3, 3, "car") == 15.0
+    assert matrix.lookup(7, 8, "car") == 9.0
+    assert matrix.lookup(3, 1, "car") is None
+    assert matrix.lookup(1, 8, "car") is None
+    assert matrix.lookup(1, 3, "motorbike") is None
+    for origin, destination in ((1, 3), (2, 3), (7, 8)):
+        route = graph.route(origin, destination, "car")
+        assert math.isclose(matrix.lookup(origin, destination, "car"), route["toll"])
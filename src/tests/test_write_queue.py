@@ -0,0 +1,35 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlmodel import create_engine, text
+
+from src.utils.write_queue import WriteQueue
+
+
+def test_writes_run_on_one_thread_and_raise_to_the_caller(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tb.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE counter (n INTEGER)"))
+        conn.execute(text("INSERT INTO counter VALUES (0)"))
+    write_queue = WriteQueue(engine)
+    threads = set()
+
+    def _increment(session):
+        threads.add(threading.get_ident())
+        n = session.exec(text("SELECT n FROM counter")).one()[0]
+        session.exec(text("UPDATE counter SET n = :n"), params={"n": n + 1})
+        session.commit()
+        return n + 1
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: write_queue.run(_increment), range(50)))
+    assert sorted(results) == list(range(1, 51)) and len(threads) == 1
+
+    def _fail(session):
+        raise LookupError("missing")
+
+    with pytest.raises(LookupError):
+        write_queue.run(_fail)
+    assert write_queue.run(lambda session: session.exec(text("SELECT n FROM counter")).one()[0]) == 50
+    write_queue.stop()
@@ -0,0 +1,93 @@
+"""Insert and update many tollbooths in the caller's transaction.
+
+Updates are grouped by the set of fields they change, so each group is one
+executemany UPDATE; inserts are a single multi-row INSERT ... RETURNING whose
+ids come back in payload order.
+"""
+import datetime
+from collections import defaultdict
+
+import polars as pl
+from sqlalchemy import bindparam, insert, update
+from sqlmodel import Session, select
+
+from ..model import Tollbooth
+
+_PARAM_PREFIX = "b_"
+_ID_PARAM = f"{_PARAM_PREFIX}tollbooth_id"
+
+
+def _h3_cells(points: list[tuple[float | None, float | None]]) -> list[dict]:
+    df = pl.DataFrame(points, schema={"lat": pl.Float64, "lng": pl.Float64}, orient="row")
+    return df.select(Tollbooth.h3_exprs()).to_dicts()
+
+
+def upsert_tollbooths(session: Session, tollbooths: list[Tollbooth]) -> tuple[list[dict], set[int]]:
+    """Apply `tollbooths` (updates when tollbooth_id is set, inserts otherwise) without committing.
+
+    Returns the {tollbooth_id, info_year} of every payload, in order, and the
+    info_years touched. Raises LookupError when an update targets a missing id.
+    """
+    updates = [(i, tb) for i, tb in enumerate(tollbooths) if tb.tollbooth_id is not None]
+    inserts = [(i, tb) for i, tb in enumerate(tollbooths) if tb.tollbooth_id is None]
+    results: list[dict | None] = [None] * len(tollbooths)
+    info_years: set[int] = set()
+
+    existing = {}
+    if updates:
+        ids = [tb.tollbooth_id for _, tb in updates]
+        stm = select(Tollbooth.tollbooth_id, Tollbooth.info_year, Tollbooth.lat, Tollbooth.lng).where(
+            Tollbooth.tollbooth_id.in_(ids)
+        )
+        existing = {row.tollbooth_id: row for row in session.exec(stm)}
+        missing = sorted(set(ids).difference(existing))
+        if missing:
+            raise LookupError(f"tollbooths not found: {', '.join(map(str, missing))}")
+
+    h3_columns = set(Tollbooth.h3_columns().values())
+    update_fields = []
+    moved = []
+    for i, tb in updates:
+        current = existing[tb.tollbooth_id]
+        fields = tb.model_dump(exclude_unset=True, exclude={"tollbooth_id", *h3_columns})
+        if "lat" in fields or "lng" in fields:
+            moved.append((fields, fields.get("lat", current.lat), fields.get("lng", current.lng)))
+        info_year = fields.get("info_year", current.info_year)
+        info_years.update({current.info_year, info_year})
+        results[i] = {"tollbooth_id": tb.tollbooth_id, "info_year": info_year}
+        update_fields.append((tb.tollbooth_id, fields))
+    if moved:
+        for (fields, _, _), cells in zip(moved, _h3_cells([(lat, lng) for _, lat, lng in moved]), strict=True):
+            fields.update(cells)
+
+    # SET values can't be bound under the column names, which SQLAlchemy reserves.
+    groups: dict[tuple[str, ...], list[dict]] = defaultdict(list)
+    for tollbooth_id, fields in update_fields:
+        if fields:
+            params = {f"{_PARAM_PREFIX}{column}": value for column, value in fields.items()}
+            params[_ID_PARAM] = tollbooth_id
+            groups[tuple(sorted(fields))].append(params)
+    for columns, params in groups.items():
+        stm = (
+            update(Tollbooth)
+            .where(Tollbooth.tollbooth_id == bindparam(_ID_PARAM))
+            .values({column: bindparam(f"{_PARAM_PREFIX}{column}") for column in columns})
+        )
+        session.connection().execute(stm, params)
+
+    if inserts:
+        info_year = datetime.date.today().year
+        info_years.add(info_year)
+        rows = []
+        for _, tb in inserts:
+            row = tb.model_dump(exclude={"tollbooth_id", *h3_columns})
+            row["info_year"] = info_year
+            rows.append(row)
+        for row, cells in zip(rows, _h3_cells([(row["lat"], row["lng"]) for row in rows]), strict=True):
+            row.update(cells)
+        stm = insert(Tollbooth).returning(Tollbooth.tollbooth_id, sort_by_parameter_order=True)
+        ids = session.connection().execute(stm, rows).scalars().all()
+        for (i, _), tollbooth_id in zip(inserts, ids, strict=True):
+            results[i] = {"tollbooth_id": tollbooth_id, "info_year": info_year}
+
+    return results, info_years
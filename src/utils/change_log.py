@@ -0,0 +1,122 @@
+"""Versioned log of the rows written to the db, read by /api/changes.
+
+Writers append a ChangeLog entry per row they insert, update or delete, in the
+transaction of the write. ChangeLog.version only grows and is the data version
+clients sync from: they keep a local copy and ask for the changes since the
+version they last saw. Bulk loads log one "reset" of the table and year instead
+of a row each, and the client fetches those rows again.
+"""
+import json
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from sqlalchemy import Connection, tuple_
+from sqlmodel import Session, func, select
+
+from ..model import ChangeLog, TbModel
+from .response_cache import ALL_YEARS
+
+UPSERT = "upsert"
+DELETE = "delete"
+RESET = "reset"
+
+CHANGE_LOG_SQL = (
+    f"INSERT INTO {ChangeLog.__tablename__} (table_name, info_year, row_key, op) VALUES (?, ?, ?, ?)"
+)
+
+
+def _table_models() -> dict[str, type[TbModel]]:
+    return {model.name(): model for model in TbModel.__subclasses__() if hasattr(model, "__table__")}
+
+
+def _keys(model: type[TbModel]) -> list[str]:
+    return [column.name for column in model.__table__.primary_key.columns]
+
+
+def row_key(model: type[TbModel], row: dict) -> str:
+    return json.dumps({key: row[key] for key in _keys(model)})
+
+
+def change_rows(model: type[TbModel], op: str, rows: Iterable[dict]) -> list[tuple]:
+    """CHANGE_LOG_SQL parameters of `rows`, dicts holding at least the primary key (and info_year, if any)."""
+    return [(model.name(), row.get("info_year", ALL_YEARS), row_key(model, row), op) for row in rows]
+
+
+def reset_row(table: str, info_year: int | None = None) -> tuple:
+    return (table, ALL_YEARS if info_year is None else info_year, None, RESET)
+
+
+def log_changes(conn: Connection, model: type[TbModel], op: str, rows: Iterable[dict]):
+    """Record `rows` of `model` in the transaction of `conn`."""
+    params = change_rows(model, op, rows)
+    if params:
+        conn.exec_driver_sql(CHANGE_LOG_SQL, params)
+
+
+def current_version(session: Session) -> int:
+    return session.exec(select(func.max(ChangeLog.version))).one() or 0
+
+
+@dataclass
+class Changes:
+    version: int
+    more: bool
+    resets: list[dict] = field(default_factory=list)
+    changes: list[dict] = field(default_factory=list)
+
+
+def changes_since(session: Session, since: int, limit: int) -> Changes:
+    """The latest change of every row written after `since`, at most `limit` log entries.
+
+    Upserts carry the current row; a row gone since is reported deleted.
+    Changes of a table and year reset after them are dropped. `version` is the
+    `since` of the next call, and `more` tells whether the log goes on after it.
+    """
+    entries = session.exec(
+        select(ChangeLog).where(ChangeLog.version > since).order_by(ChangeLog.version).limit(limit + 1)
+    ).all()
+    more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return Changes(version=since, more=False)
+
+    models = _table_models()
+    resets: dict[tuple[str, int], int] = {}
+    latest: dict[tuple[str, str], ChangeLog] = {}
+    for entry in entries:
+        if entry.op == RESET:
+            resets[(entry.table_name, entry.info_year)] = entry.version
+        elif entry.table_name in models:
+            latest[(entry.table_name, entry.row_key)] = entry
+
+    def _reset_after(entry: ChangeLog) -> bool:
+        return any(
+            resets.get((entry.table_name, info_year), 0) > entry.version for info_year in (entry.info_year, ALL_YEARS)
+        )
+
+    upserts: dict[str, list[dict]] = {}
+    for (table, key), entry in latest.items():
+        if entry.op == UPSERT and not _reset_after(entry):
+            upserts.setdefault(table, []).append(json.loads(key))
+    rows = {}
+    for table, keys in upserts.items():
+        model = models[table]
+        columns = [getattr(model, key) for key in _keys(model)]
+        values = [tuple(key.values()) for key in keys]
+        for row in session.exec(select(model).where(tuple_(*columns).in_(values))):
+            rows[(table, row_key(model, row.model_dump()))] = row
+
+    changes = []
+    for (table, key), entry in sorted(latest.items(), key=lambda item: item[1].version):
+        if _reset_after(entry):
+            continue
+        row = rows.get((table, key)) if entry.op == UPSERT else None
+        changes.append({
+            "table": table, "op": UPSERT if row is not None else DELETE, "key": json.loads(key), "row": row,
+        })
+    return Changes(
+        version=entries[-1].version,
+        more=more,
+        resets=[{"table": table, "info_year": info_year} for (table, info_year) in resets],
+        changes=changes,
+    )
@@ -0,0 +1,71 @@
+"""Columnar responses (Arrow IPC stream or JSON column arrays) for bulk map loads.
+
+The page statement is projected to the labeled columns of the JSON rows and read
+into a Polars frame on the connection of the read session, so rows don't go
+through ORM objects or per-row dicts.
+"""
+import io
+import json
+from typing import Any
+
+import polars as pl
+from fastapi import Response
+from sqlalchemy import Connection
+from sqlmodel import literal
+from sqlmodel.sql.expression import Select, SelectOfScalar
+
+from ..model import TbModel
+from .pagination import NEXT_CURSOR_HEADER, Keyset, encode_cursor
+
+FORMATS = ("json", "columnar", "arrow")
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+_KEY_PREFIX = "_key_"
+
+
+class Projection:
+    def __init__(self, model: type[TbModel], fields: dict[str, str], constants: dict[str, Any] | None = None):
+        """Columns `label: model field` plus `label: constant` ones, typed as the model fields."""
+        schema = model.dict_schema()
+        self.fields = fields
+        self.constants = constants or {}
+        self.columns = [getattr(model, field).label(label) for label, field in fields.items()]
+        self.schema = {label: schema[field] for label, field in fields.items()}
+        for label, value in (constants or {}).items():
+            self.columns.append(literal(value).label(label))
+            self.schema[label] = pl.String
+
+
+def columnar_page(
+    conn: Connection, stm: Select | SelectOfScalar, projection: Projection, keyset: Keyset,
+    cursor: str | None, limit: int, offset: int, format: str
+) -> Response:
+    keys = [column.label(f"{_KEY_PREFIX}{i}") for i, column in enumerate(keyset.columns)]
+    page = keyset.page(stm, cursor, limit).offset(offset).with_only_columns(*keys, *projection.columns)
+    # Types are inferred from every row, so a column that is NULL for the first rows keeps its type.
+    df = pl.read_database(page, connection=conn, infer_schema_length=None)
+    return _columnar_response(df, projection, len(keys), limit, format)
+
+
+def frame_columnar_page(df: pl.DataFrame, projection: Projection, keyset: Keyset, limit: int, format: str) -> Response:
+    """`columnar_page` of the frame backend; `df` holds the rows of the page plus the next one, if any."""
+    df = df.select(
+        *(pl.col(column.key).alias(f"{_KEY_PREFIX}{i}") for i, column in enumerate(keyset.columns)),
+        *(pl.col(field).alias(label) for label, field in projection.fields.items()),
+        *(pl.lit(value).alias(label) for label, value in projection.constants.items()),
+    )
+    return _columnar_response(df, projection, len(keyset.columns), limit, format)
+
+
+def _columnar_response(df: pl.DataFrame, projection: Projection, n_keys: int, limit: int, format: str) -> Response:
+    headers = {}
+    if df.height > limit:
+        df = df.head(limit)
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(df.select(f"{_KEY_PREFIX}{i}" for i in range(n_keys)).row(-1))
+    df = df.select(pl.col(label).cast(dtype, strict=False) for label, dtype in projection.schema.items())
+
+    if format == "arrow":
+        buffer = io.BytesIO()
+        df.write_ipc_stream(buffer)
+        return Response(content=buffer.getvalue(), media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+    content = json.dumps(df.to_dict(as_series=False), default=str)
+    return Response(content=content, media_type="application/json", headers=headers)
@@ -1,22 +1,130 @@
 import os
+import sqlite3
 from pathlib import Path
 from typing import Annotated
 
 from fastapi import Depends
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .sqlite_index import (
+    create_h3_columns,
+    create_name_index,
+    create_spatial_indexes,
+    create_table_indexes,
+)
+from .write_queue import WriteQueue
 
 _db_dir = str(Path(__file__).resolve().parent.parent / "db")
 _sql_filename = "tb_map_editor.db"
 
-_sql_filepath = os.path.join(_db_dir, _sql_filename)
+# The editor db; TB_EDITOR_DB points the API and populate_db to another file
+# (the synthetic databases of scripts/synthetic_db.py).
+EDITOR_DB_ENV = "TB_EDITOR_DB"
+_sql_filepath = os.environ.get(EDITOR_DB_ENV) or os.path.join(_db_dir, _sql_filename)
 sqlite_url = f"sqlite:///{_sql_filepath}"
 
+# Read-only snapshot built by the pipeline (scripts/snapshot.py); when set the
+# API reads from it, otherwise from read-only connections to the editor db.
+# Edits always go to the editor db through the write queue.
+SNAPSHOT_ENV = "TB_SNAPSHOT_DB"
+
+# WAL lets the read pool run alongside the single writer; NORMAL sync is
+# durable in WAL mode except for the last commits on a power loss.
+_WRITE_PRAGMAS = ("journal_mode = WAL", "synchronous = NORMAL", "busy_timeout = 5000")
+_READ_PRAGMAS = ("mmap_size = 268435456", "cache_size = -65536", "temp_store = MEMORY")
+_READ_POOL_SIZE = 8
+
 _connect_args = {"check_same_thread": False}
 _engine = create_engine(sqlite_url, connect_args=_connect_args)
 
 
+def _set_pragmas(engine: Engine, pragmas: tuple[str, ...]):
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
+
+_set_pragmas(_engine, _WRITE_PRAGMAS + _READ_PRAGMAS)
+
+
+def snapshot_filepath(year: int) -> str:
+    return os.path.join(_db_dir, f"tb_map_{year}.db")
+
+
+def _watch_inode(engine: Engine, filepath: str):
+    # A published snapshot (or an editor db rebuilt by populate_db) replaces the
+    # file; pooled connections still read the old inode and are reopened on their
+    # next checkout.
+    @event.listens_for(engine, "connect")
+    def _record_inode(dbapi_conn, connection_record):
+        connection_record.info["inode"] = os.stat(filepath).st_ino
+
+    @event.listens_for(engine, "checkout")
+    def _check_inode(dbapi_conn, connection_record, connection_proxy):
+        if connection_record.info.get("inode") != os.stat(filepath).st_ino:
+            raise DisconnectionError("snapshot replaced")
+
+
+def _read_only_engine(filepath: str) -> Engine:
+    engine = create_engine(
+        f"sqlite:///{filepath}",
+        creator=lambda: sqlite3.connect(f"file:{filepath}?mode=ro", uri=True, check_same_thread=False),
+        pool_size=_READ_POOL_SIZE,
+        max_overflow=2 * _READ_POOL_SIZE,
+    )
+    _set_pragmas(engine, _READ_PRAGMAS)
+    _watch_inode(engine, filepath)
+    return engine
+
+
+def _async_read_only_engine(filepath: str) -> AsyncEngine:
+    """aiosqlite engine on the same file as the read pool, for the async endpoints."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///file:{filepath}?mode=ro&uri=true",
+        pool_size=_READ_POOL_SIZE,
+        max_overflow=2 * _READ_POOL_SIZE,
+    )
+    _set_pragmas(engine.sync_engine, _READ_PRAGMAS)
+    _watch_inode(engine.sync_engine, filepath)
+    return engine
+
+
+_snapshot_filepath = os.environ.get(SNAPSHOT_ENV)
+_read_engine = _read_only_engine(_snapshot_filepath or _sql_filepath)
+_async_read_engine = _async_read_only_engine(_snapshot_filepath or _sql_filepath)
+_write_queue = WriteQueue(_engine)
+
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(_engine)
+    with _engine.begin() as conn:
+        create_h3_columns(conn)
+        create_table_indexes(conn)
+        create_spatial_indexes(conn)
+        create_name_index(conn)
+
+
+def get_engine() -> Engine:
+    return _engine
+
+
+def get_read_engine() -> Engine:
+    return _read_engine
+
+
+def get_async_read_engine() -> AsyncEngine:
+    return _async_read_engine
+
+
+def get_write_queue() -> WriteQueue:
+    return _write_queue
 
 
 def get_session():
@@ -24,4 +132,17 @@ def get_session():
         yield session
 
 
+def get_read_session():
+    with Session(_read_engine) as session:
+        yield session
+
+
+async def get_async_read_session():
+    async with AsyncSession(_async_read_engine) as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_session)]
+ReadSessionDep = Annotated[Session, Depends(get_read_session)]
+AsyncReadSessionDep = Annotated[AsyncSession, Depends(get_async_read_session)]
+WriteQueueDep = Annotated[WriteQueue, Depends(get_write_queue)]
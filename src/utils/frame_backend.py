@@ -0,0 +1,239 @@
+"""Read endpoints served from the staged parquet files, held in memory as Polars frames.
+
+With TB_BACKEND=frames the list endpoints read from a FrameStore instead of
+SQLite. The DataModel tables of TB_FRAME_YEARS (every staged year when unset)
+are loaded at startup in the columns of their tables and sorted on their
+primary keys, so keyset pages come out in the order SQLite gives them.
+Queries are Polars filters and joins. A watcher reloads a table when one of
+its files changes and reports the table and year like a DataRevision bump, so
+the cached responses built from it are dropped.
+"""
+import json
+import logging
+import os
+import threading
+from collections.abc import Callable
+
+import polars as pl
+from fastapi.responses import StreamingResponse
+
+from ..data_files import DataModel, DataStage, PathModel, build_path, table_frame
+from ..model import Stretch, StretchToll, TbModel, TbNeighbour, TbStretchId, Tollbooth
+from .pagination import STREAM_BATCH_SIZE, decode_cursor
+from .query_compiler import frame_filter
+
+_log = logging.getLogger(__name__)
+
+BACKEND_ENV = "TB_BACKEND"
+YEARS_ENV = "TB_FRAME_YEARS"
+
+# DataModel files the frame backend serves.
+FRAME_FILES = ("tollbooth", "tb_sts", "tb_imt", "stretch", "stretch_toll", "tb_stretch_id", "tb_neighbour")
+
+# Column prefixes of the joined models in `stretch_tolls`; TbStretchId keeps its names.
+_STRETCH_PREFIX = "stretch."
+_STRETCH_TOLL_PREFIX = "stretchtoll."
+
+
+def staged_years(stage: str = DataStage.stg) -> list[int]:
+    folder = build_path("", {}, stage)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(int(name) for name in os.listdir(folder) if name.isdigit())
+
+
+def _keys(model: type[TbModel]) -> list[str]:
+    return [column.name for column in model.__table__.primary_key.columns]
+
+
+class FrameStore:
+    def __init__(
+        self, years: list[int], stage: str = DataStage.stg, names: tuple[str, ...] = FRAME_FILES,
+        interval: float = 5.0,
+    ):
+        self.years = years
+        self.stage = stage
+        self.names = names
+        self.interval = interval
+        self._frames: dict[str, pl.DataFrame] = {}
+        self._mtimes: dict[tuple[str, int], int | None] = {}
+        self._listeners: list[Callable[[str, int | None], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add_listener(self, listener: Callable[[str, int | None], None]):
+        """`listener(table, info_year)` is called after a table of a year is reloaded."""
+        self._listeners.append(listener)
+
+    def _path_models(self, name: str) -> list[tuple[int, PathModel]]:
+        return [(year, getattr(DataModel(year, self.stage), name)) for year in self.years]
+
+    @staticmethod
+    def _mtime(path_model: PathModel) -> int | None:
+        try:
+            return os.stat(path_model.parquet).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self, name: str) -> pl.DataFrame:
+        path_models = self._path_models(name)
+        model = path_models[0][1].model if path_models else getattr(DataModel, name).model_cls
+        frames = [table_frame(path_model, year).collect() for year, path_model in path_models if os.path.exists(path_model.parquet)]
+        if frames:
+            df = pl.concat(frames, how="vertical_relaxed")
+        else:
+            df = pl.DataFrame(schema=model.dict_schema())
+            if model.h3_columns():
+                df = df.with_columns(model.h3_exprs())
+        # Bool fields are 0/1 in SQLite and serialize as ints.
+        df = df.with_columns(pl.col(pl.Boolean).cast(pl.Int64))
+        keys = _keys(model)
+        if keys == ["id"]:
+            # Surrogate ids numbered in load order, as SQLite does on a fresh load.
+            df = df.with_columns(pl.int_range(1, df.height + 1, dtype=df.schema["id"]).alias("id"))
+        elif "info_year" in df.columns and "info_year" not in keys:
+            # The table keeps one row per key; a later year replaces the earlier one.
+            df = df.sort("info_year", maintain_order=True).unique(subset=keys, keep="last")
+        return df.sort(keys, maintain_order=True)
+
+    def load(self):
+        for name in self.names:
+            self._reload(name)
+
+    def _reload(self, name: str) -> list[int]:
+        """Reload `name` if any of its files changed; returns the years that changed."""
+        mtimes = {(name, year): self._mtime(path_model) for year, path_model in self._path_models(name)}
+        changed = [year for (_, year), mtime in mtimes.items() if self._mtimes.get((name, year), -1) != mtime]
+        if changed:
+            df = self._load(name)
+            with self._lock:
+                self._frames[getattr(DataModel, name).model_cls.name()] = df
+                self._mtimes.update(mtimes)
+            _log.debug(f"loaded {df.height} rows of {name} for {self.years}")
+        return changed
+
+    def poll(self):
+        for name in self.names:
+            table = getattr(DataModel, name).model_cls.name()
+            for year in self._reload(name):
+                for listener in self._listeners:
+                    listener(table, year)
+
+    def frame(self, model: type[TbModel]) -> pl.DataFrame:
+        with self._lock:
+            return self._frames[model.name()]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # A file read while the pipeline is still writing it; the next poll retries.
+                _log.debug(f"frame reload failed: {e}")
+
+    def start(self):
+        self.load()
+        self._thread = threading.Thread(target=self._run, name="frame-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def frame_store_from_env() -> FrameStore | None:
+    if os.environ.get(BACKEND_ENV) != "frames":
+        return None
+    years = os.environ.get(YEARS_ENV)
+    return FrameStore([int(year) for year in years.split(",")] if years else staged_years())
+
+
+def model_query(store: FrameStore, model: type[TbModel], parsed: dict | None) -> pl.DataFrame:
+    """Rows of `model` matching `parsed` (every row when None); raises ValueError like compile_query."""
+    df = store.frame(model)
+    return df if parsed is None else df.filter(frame_filter(model, parsed))
+
+
+def empty_stretch_tollbooths(store: FrameStore) -> pl.DataFrame:
+    """Open tollbooths that are neither the entry nor the exit of a stretch."""
+    df_tb_stretch = store.frame(TbStretchId)
+    ids = pl.concat([df_tb_stretch["tollbooth_id_in"], df_tb_stretch["tollbooth_id_out"]])
+    return store.frame(Tollbooth).filter(~pl.col("tollbooth_id").is_in(ids.implode()), pl.col("status") == "open")
+
+
+def road_tollbooths(store: FrameStore, road_ids: list[str]) -> pl.DataFrame:
+    """Tollbooths closing a stretch of the roads in `road_ids`."""
+    road_ids = pl.Series(road_ids).cast(pl.Int64, strict=False)
+    stretch_ids = store.frame(Stretch).filter(pl.col("road_id").is_in(road_ids.implode()))["stretch_id"]
+    ids = store.frame(TbStretchId).filter(pl.col("stretch_id").is_in(stretch_ids.implode()))["tollbooth_id_out"]
+    return store.frame(Tollbooth).filter(pl.col("tollbooth_id").is_in(ids.implode()))
+
+
+def stretch_tolls(store: FrameStore, tollbooth_id: int | None) -> pl.DataFrame:
+    """TbStretchId rows entering or leaving `tollbooth_id` with their Stretch and, when priced, StretchToll."""
+    df_stretch = store.frame(Stretch).select(pl.all().name.prefix(_STRETCH_PREFIX))
+    df_toll = store.frame(StretchToll).select(pl.all().name.prefix(_STRETCH_TOLL_PREFIX))
+    return (
+        store.frame(TbStretchId)
+        .filter((pl.col("tollbooth_id_in") == tollbooth_id) | (pl.col("tollbooth_id_out") == tollbooth_id))
+        .join(df_stretch, left_on="stretch_id", right_on=f"{_STRETCH_PREFIX}stretch_id", how="inner", coalesce=False)
+        .join(df_toll, left_on="stretch_id", right_on=f"{_STRETCH_TOLL_PREFIX}stretch_id", how="left", coalesce=False)
+        .sort(_keys(TbStretchId), maintain_order=True)
+    )
+
+
+def stretch_toll_rows(df: pl.DataFrame) -> list[tuple[TbStretchId, Stretch, StretchToll | None]]:
+    """The (TbStretchId, Stretch, StretchToll | None) rows of `stretch_tolls`, as the SQLite query returns them."""
+    models = []
+    for row in df.iter_rows(named=True):
+        stretch = {key.removeprefix(_STRETCH_PREFIX): v for key, v in row.items() if key.startswith(_STRETCH_PREFIX)}
+        toll = {key.removeprefix(_STRETCH_TOLL_PREFIX): v for key, v in row.items() if key.startswith(_STRETCH_TOLL_PREFIX)}
+        tb_stretch = {key: row[key] for key in TbStretchId.model_fields}
+        models.append((
+            TbStretchId.model_construct(**tb_stretch),
+            Stretch.model_construct(**stretch),
+            StretchToll.model_construct(**toll) if toll["stretch_id"] is not None else None,
+        ))
+    return models
+
+
+def local_neighbours(store: FrameStore, tollbooth_id: int | None) -> pl.DataFrame:
+    """Tollbooths in the local-local neighbourhood of `tollbooth_id`, in the order of the tbneighbour index."""
+    df_neighbour = store.frame(TbNeighbour).filter(
+        pl.col("tollbooth_id") == tollbooth_id, pl.col("scope") == "local-local"
+    ).sort("neighbour_id", "id")
+    return df_neighbour.select("neighbour_id").join(
+        store.frame(Tollbooth), left_on="neighbour_id", right_on="tollbooth_id", how="inner", maintain_order="left"
+    ).rename({"neighbour_id": "tollbooth_id"})
+
+
+def models(model: type[TbModel], df: pl.DataFrame) -> list:
+    return [model.model_construct(**row) for row in df.iter_rows(named=True)]
+
+
+def after_cursor(df: pl.DataFrame, keys: list[str], cursor: str | None) -> pl.DataFrame:
+    """Rows of `df`, sorted on `keys`, after the key of `cursor`; raises ValueError for a bad cursor."""
+    if not cursor:
+        return df
+    values = decode_cursor(cursor)
+    if len(values) != len(keys):
+        raise ValueError("invalid cursor")
+    # (k1, k2, ...) > (v1, v2, ...), as the row value comparison of the SQL keyset.
+    after = pl.lit(False)
+    equal = pl.lit(True)
+    for key, value in zip(keys, values, strict=True):
+        after = after | (equal & (pl.col(key) > value))
+        equal = equal & (pl.col(key) == value)
+    return df.filter(after.fill_null(False))
+
+
+def ndjson_frame_response(df: pl.DataFrame, rows: Callable[[pl.DataFrame], list], serialize: Callable) -> StreamingResponse:
+    """`ndjson_response` over the rows of `df`, STREAM_BATCH_SIZE at a time."""
+    def lines():
+        for offset in range(0, df.height, STREAM_BATCH_SIZE):
+            batch = rows(df.slice(offset, STREAM_BATCH_SIZE))
+            yield "".join(json.dumps(serialize(row), default=str) + "\n" for row in batch)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,119 @@
+"""In-memory fuzzy typeahead over the tollbooth names of every located source.
+
+Names are keyed by the same normalize/expand_abbrevs text used to match tariffs
+to stretches, so accented, abbreviated or reordered queries ("cd juarez",
+"ent. chichimeco") still find the snake_case names stored in the db. A padded
+trigram index picks a few hundred candidate keys before rapidfuzz scores them,
+keeping each lookup in the low milliseconds for tens of thousands of names.
+"""
+import threading
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterable
+
+from rapidfuzz import fuzz, process
+
+from ..scripts.match_tarifas_to_stretch import expand_abbrevs, normalize
+
+_GRAM_SIZE = 3
+_MAX_CANDIDATES = 256
+_MIN_GRAMS = 3
+_POSTINGS_BUDGET = 20_000
+SCORE_CUTOFF = 60.0
+
+
+def name_key(name: str) -> str:
+    return expand_abbrevs(normalize(name))
+
+
+def _grams(key: str) -> set[str]:
+    # The leading padding turns the first characters into their own grams, so prefixes weigh more.
+    padded = f"{' ' * (_GRAM_SIZE - 1)}{key} "
+    return {padded[i:i + _GRAM_SIZE] for i in range(len(padded) - _GRAM_SIZE + 1)}
+
+
+class FuzzyNameIndex:
+    def __init__(self, rows: Iterable[dict] = ()):
+        """`rows` hold source, tollbooth_id, tollbooth_name and info_year."""
+        self._keys: list[str] = []
+        self._entries: list[list[dict]] = []
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        positions: dict[str, int] = {}
+        for row in rows:
+            key = name_key(row["tollbooth_name"])
+            if not key:
+                continue
+            position = positions.get(key)
+            if position is None:
+                position = positions[key] = len(self._keys)
+                self._keys.append(key)
+                self._entries.append([])
+                for gram in _grams(key):
+                    self._postings[gram].append(position)
+            self._entries[position].append(row)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _candidates(self, key: str, accept: Callable[[dict], bool]) -> dict[int, str]:
+        # Rare grams are the selective ones; common grams ("an ", " la") are only counted within budget.
+        postings = sorted((self._postings.get(gram, ()) for gram in _grams(key)), key=len)
+        hits = Counter()
+        scanned = used = 0
+        for posting in postings:
+            if used >= _MIN_GRAMS and scanned + len(posting) > _POSTINGS_BUDGET:
+                break
+            hits.update(posting)
+            scanned += len(posting)
+            used += 1
+        min_hits = max(1, used // 4)
+        candidates = {}
+        for position, count in hits.most_common():
+            if count < min_hits or len(candidates) == _MAX_CANDIDATES:
+                break
+            if any(accept(entry) for entry in self._entries[position]):
+                candidates[position] = self._keys[position]
+        return candidates
+
+    def search(
+        self, query: str, sources: list[str], limit: int,
+        info_year: int | None = None, score_cutoff: float = SCORE_CUTOFF,
+    ) -> list[dict]:
+        """Rows whose name best matches `query`, best score first."""
+        key = name_key(query)
+        if not key:
+            return []
+
+        def accept(entry: dict) -> bool:
+            return entry["source"] in sources and (info_year is None or entry["info_year"] == info_year)
+
+        candidates = self._candidates(key, accept)
+        matches = process.extract(
+            key, candidates, scorer=fuzz.WRatio, limit=limit, score_cutoff=score_cutoff
+        )
+        data = []
+        for _, score, position in matches:
+            for entry in self._entries[position]:
+                if accept(entry):
+                    data.append({**entry, "score": round(score, 1)})
+        return data[:limit]
+
+
+class FuzzyNameCache:
+    """Holds the index of the current db, rebuilt on the first search after an edit."""
+
+    def __init__(self):
+        self._index: FuzzyNameIndex | None = None
+        self._lock = threading.Lock()
+
+    def get(self, load_rows: Callable[[], Iterable[dict]]) -> FuzzyNameIndex:
+        index = self._index
+        if index is None:
+            with self._lock:
+                index = self._index
+                if index is None:
+                    index = self._index = FuzzyNameIndex(load_rows())
+        return index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
@@ -0,0 +1,109 @@
+"""H3 helpers for the map API: grid disks for h3_cell queries and cluster tables.
+
+Cluster tables aggregate the located models (Tollbooth, TbSts, TbImt) into H3
+cells. All the resolutions of a year are computed together on the first request
+for that year and kept until an edit of that year invalidates them.
+"""
+import threading
+from collections.abc import Callable
+
+import polars as pl
+import polars_h3 as plh3
+
+# (max zoom, resolution): zoomed out views use coarser cells.
+_ZOOM_RESOLUTIONS = ((4, 2), (5, 3), (7, 4), (9, 5), (11, 6))
+CLUSTER_RESOLUTIONS = (2, 3, 4, 5, 6, 7)
+
+
+def zoom_to_resolution(zoom: int) -> int:
+    for max_zoom, resolution in _ZOOM_RESOLUTIONS:
+        if zoom <= max_zoom:
+            return resolution
+    return CLUSTER_RESOLUTIONS[-1]
+
+
+def grid_disk_cells(cell: int, resolution: int, k: int) -> list[int]:
+    """Cells within k steps of `cell`, as the signed integers stored in the h3_cell_<res> columns."""
+    df = pl.DataFrame({"cell": [cell]}, schema={"cell": pl.UInt64}).select(
+        plh3.is_valid_cell("cell").alias("valid"),
+        plh3.get_resolution("cell").alias("resolution"),
+        plh3.grid_disk("cell", k).alias("disk"),
+    )
+    valid, cell_resolution, disk = df.row(0)
+    if not valid:
+        raise ValueError(f"{cell} is not a valid H3 cell")
+    if cell_resolution != resolution:
+        raise ValueError(f"H3 cell has resolution {cell_resolution}, not {resolution}")
+    return [int(disk_cell) for disk_cell in disk]
+
+
+def cluster_points(df_points: pl.DataFrame, resolution: int) -> pl.DataFrame:
+    """Aggregate points (source, lat, lng, status) into one row per source and H3 cell.
+
+    The centroid is the mean of the points, not the cell center, so a cluster
+    marker sits where its tollbooths are.
+    """
+    df_points = (
+        df_points
+        .filter(pl.col("lat").is_not_null() & pl.col("lng").is_not_null())
+        .with_columns(
+            plh3.latlng_to_cell("lat", "lng", resolution).alias("h3_cell"),
+            pl.col("status").fill_null("unknown"),
+        )
+    )
+    df_status = (
+        df_points
+        .group_by("source", "h3_cell", "status")
+        .len()
+        .group_by("source", "h3_cell")
+        .agg(pl.struct("status", pl.col("len").alias("count")).alias("status"))
+    )
+    return (
+        df_points
+        .group_by("source", "h3_cell")
+        .agg(
+            pl.len().alias("count"),
+            pl.col("lat").mean(),
+            pl.col("lng").mean(),
+        )
+        .join(df_status, on=["source", "h3_cell"])
+        .with_columns(plh3.int_to_str("h3_cell").alias("h3_cell"))
+        .sort("source", "h3_cell")
+    )
+
+
+class ClusterCache:
+    def __init__(self, resolutions: tuple[int, ...] = CLUSTER_RESOLUTIONS):
+        self.resolutions = resolutions
+        self._tables: dict[int | None, dict[int, pl.DataFrame]] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, info_year: int | None, resolution: int, load_points: Callable[[int | None], pl.DataFrame]
+    ) -> pl.DataFrame:
+        tables = self._tables.get(info_year)
+        if tables is None:
+            with self._lock:
+                tables = self._tables.get(info_year)
+                if tables is None:
+                    df_points = load_points(info_year)
+                    tables = {res: cluster_points(df_points, res) for res in self.resolutions}
+                    self._tables[info_year] = tables
+        return tables[resolution]
+
+    def invalidate(self, info_year: int | None = None):
+        """Drop the tables of `info_year` (and the all-years table); None drops every year."""
+        with self._lock:
+            if info_year is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(info_year, None)
+                self._tables.pop(None, None)
+
+
+def cluster_rows(df_clusters: pl.DataFrame) -> list[dict]:
+    rows = []
+    for row in df_clusters.iter_rows(named=True):
+        row["status"] = {item["status"]: item["count"] for item in row["status"]}
+        rows.append(row)
+    return rows
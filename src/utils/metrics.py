@@ -0,0 +1,230 @@
+"""Request and query instrumentation of the API, exposed in the Prometheus text format.
+
+MetricsMiddleware times every request until its body is sent and records the
+latency and response size of its route. The SQLAlchemy hooks of
+`instrument_engine` count the statements run for the current request and their
+time, which also go out in a Server-Timing header; a statement slower than
+TB_SLOW_QUERY_MS is logged with its EXPLAIN QUERY PLAN. GET /metrics renders
+the registry.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import Engine, event
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.routing import Match
+
+_log = logging.getLogger(__name__)
+
+SLOW_QUERY_ENV = "TB_SLOW_QUERY_MS"
+_SLOW_QUERY_MS = 100.0
+# Statements EXPLAIN QUERY PLAN describes; pragmas and DDL have no plan.
+_PLANNED = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> (per-bucket counts with a last +Inf bucket, sum)
+        self._series: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        counts, total = self._series.setdefault(
+            tuple(sorted(labels.items())), ([0] * (len(self.buckets) + 1), [0.0])
+        )
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def lines(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(labels, le=_number(bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(total[0])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, value: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + value
+
+    def lines(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_labels(labels)} {_number(value)}" for labels, value in sorted(self._values.items()))
+        return lines
+
+
+def _number(value) -> str:
+    return value if isinstance(value, str) else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Labels, **extra: str) -> str:
+    items = (*labels, *extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in items) + "}"
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    query_seconds: float = 0.0
+    response_bytes: int = 0
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_seconds = Histogram(
+            "tb_http_request_duration_seconds", "Time from the request to the last byte of its response.", LATENCY_BUCKETS
+        )
+        self.response_bytes = Histogram("tb_http_response_size_bytes", "Size of the response bodies.", SIZE_BUCKETS)
+        self.request_queries = Histogram(
+            "tb_db_queries_per_request", "SQL statements run for a request.", QUERY_COUNT_BUCKETS
+        )
+        self.request_query_seconds = Histogram(
+            "tb_db_query_duration_seconds_per_request", "Time spent in SQL statements for a request.", LATENCY_BUCKETS
+        )
+        self.queries = Counter("tb_db_queries_total", "SQL statements run, in and out of requests.")
+        self.query_seconds = Counter("tb_db_query_seconds_total", "Time spent in SQL statements.")
+        self.slow_queries = Counter("tb_db_slow_queries_total", "SQL statements slower than TB_SLOW_QUERY_MS.")
+
+    def observe_request(self, stats: RequestStats, method: str, route: str, status: int, seconds: float):
+        with self._lock:
+            self.request_seconds.observe(seconds, method=method, route=route, status=str(status))
+            self.response_bytes.observe(stats.response_bytes, method=method, route=route)
+            self.request_queries.observe(stats.queries, route=route)
+            self.request_query_seconds.observe(stats.query_seconds, route=route)
+
+    def observe_query(self, engine: str, seconds: float, slow: bool):
+        with self._lock:
+            self.queries.inc(engine=engine)
+            self.query_seconds.inc(seconds, engine=engine)
+            if slow:
+                self.slow_queries.inc(engine=engine)
+
+    def render(self) -> str:
+        metrics = (
+            self.request_seconds, self.response_bytes, self.request_queries, self.request_query_seconds,
+            self.queries, self.query_seconds, self.slow_queries,
+        )
+        with self._lock:
+            return "\n".join(line for metric in metrics for line in metric.lines()) + "\n"
+
+
+# Stats of the request being served; the threadpool and the write queue run
+# the endpoint code in a copy of the request context, which shares the object.
+_request_stats: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar("request_stats", default=None)
+
+
+def slow_query_threshold() -> float:
+    """Seconds above which a statement is logged, from TB_SLOW_QUERY_MS."""
+    return float(os.environ.get(SLOW_QUERY_ENV, _SLOW_QUERY_MS)) / 1000
+
+
+def instrument_engine(engine: Engine, metrics: Metrics, name: str, slow_seconds: float | None = None):
+    """Count and time the statements of `engine`, logging those over `slow_seconds` with their query plan."""
+    slow_seconds = slow_query_threshold() if slow_seconds is None else slow_seconds
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.query_start
+        if conn.info.get("explaining"):
+            return
+        slow = elapsed > slow_seconds
+        metrics.observe_query(name, elapsed, slow)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+        if slow:
+            _log.warning(
+                f"slow query ({elapsed * 1000:.1f} ms) on {name}: {statement} {parameters}\n"
+                f"{_query_plan(conn, statement, parameters, executemany)}"
+            )
+
+
+def _query_plan(conn, statement: str, parameters, executemany: bool) -> str:
+    if executemany or not statement.lstrip().upper().startswith(_PLANNED):
+        return "(no plan)"
+    conn.info["explaining"] = True
+    try:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    except Exception as e:
+        return f"(no plan: {e})"
+    finally:
+        conn.info["explaining"] = False
+    return "\n".join(f"  {row[-1]}" for row in rows)
+
+
+def _route_path(request: Request) -> str:
+    """The route template or mount of the request, so the ids in a path don't each get a series."""
+    route = request.scope.get("route")
+    if route is None:
+        # Answered before routing (a cached response) or by a mount, which moved its prefix to root_path.
+        scope = {**request.scope, "root_path": request.scope.get("app_root_path", request.scope.get("root_path", ""))}
+        route = next((r for r in request.app.router.routes if r.matches(scope)[0] == Match.FULL), None)
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, metrics: Metrics):
+        super().__init__(app)
+        self.metrics = metrics
+
+    async def dispatch(self, request: Request, call_next):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _request_stats.reset(token)
+        route = _route_path(request)
+        response.headers["Server-Timing"] = f'db;dur={stats.query_seconds * 1000:.1f};desc="{stats.queries} queries"'
+        body_iterator = response.body_iterator
+
+        async def counted_body():
+            try:
+                async for chunk in body_iterator:
+                    stats.response_bytes += len(chunk)
+                    yield chunk
+            finally:
+                self.metrics.observe_request(
+                    stats, request.method, route, response.status_code, time.perf_counter() - start
+                )
+
+        response.body_iterator = counted_body()
+        return response
@@ -0,0 +1,90 @@
+"""Keyset pagination and NDJSON streaming for the list endpoints.
+
+Pages are ordered by a key (the primary key of the listed model) and the next
+page starts after the key of the last row, so every page costs an index seek
+instead of the OFFSET scan. The cursor is that key, opaque to clients, and is
+returned in the X-Next-Cursor header while more rows remain.
+"""
+import base64
+import json
+from collections.abc import Callable, Iterator
+from typing import Annotated, Any
+
+from fastapi import Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from sqlmodel.sql.expression import Select, SelectOfScalar
+
+from ..model import TbModel
+from .connector import get_read_session
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+STREAM_BATCH_SIZE = 500
+# Page size of the list endpoints; a page holds at least one row, so its last one gives the cursor.
+PageLimit = Annotated[int, Query(ge=1)]
+
+
+def encode_cursor(values: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("invalid cursor") from None
+    if not isinstance(values, list):
+        raise ValueError("invalid cursor")
+    return tuple(values)
+
+
+class Keyset:
+    def __init__(self, model: type[TbModel], row_entity: Callable[[Any], TbModel] = lambda row: row):
+        """Keyset over the primary key of `model`; `row_entity` picks the `model` instance out of a result row."""
+        self.columns = [getattr(model, column.name) for column in model.__table__.primary_key.columns]
+        self.row_entity = row_entity
+
+    def where(self, values: tuple):
+        if len(values) != len(self.columns):
+            raise ValueError("invalid cursor")
+        if len(self.columns) == 1:
+            return self.columns[0] > values[0]
+        return tuple_(*self.columns) > tuple_(*values)
+
+    def apply(self, stm: Select | SelectOfScalar, cursor: str | None) -> Select | SelectOfScalar:
+        stm = stm.order_by(*self.columns)
+        if cursor:
+            stm = stm.where(self.where(decode_cursor(cursor)))
+        return stm
+
+    def row_key(self, row: Any) -> tuple:
+        entity = self.row_entity(row)
+        return tuple(getattr(entity, column.key) for column in self.columns)
+
+    def page(self, stm: Select | SelectOfScalar, cursor: str | None, limit: int) -> Select | SelectOfScalar:
+        """Statement for one page; it fetches an extra row to know whether another page follows."""
+        return self.apply(stm, cursor).limit(limit + 1)
+
+    def paginate(self, rows: list, limit: int, response: Response) -> list:
+        """Trim the extra row of `page` and set the cursor header when it was there."""
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(self.row_key(rows[-1]))
+        return rows
+
+
+def ndjson_response(
+    stm: Select | SelectOfScalar, serialize: Callable[[Any], dict], params: dict | None = None
+) -> StreamingResponse:
+    """Stream every row of `stm` as one JSON object per line.
+
+    Rows are fetched STREAM_BATCH_SIZE at a time on a session owned by the
+    stream, so the response can outlive the request scoped session.
+    """
+    def lines() -> Iterator[str]:
+        for session in get_read_session():
+            result = session.exec(stm.execution_options(yield_per=STREAM_BATCH_SIZE), params=params)
+            for partition in result.partitions():
+                yield "".join(json.dumps(serialize(row), default=str) + "\n" for row in partition)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,181 @@
+"""Compile `parse_query` output into a filtered select of a located model.
+
+Only whitelisted columns can be filtered. Every value is a bound parameter
+(IN lists are expanding parameters), so the statement depends only on the
+shape of the query: the params, operators and which range bounds are set. The
+statement of each shape is built once and cached; a request only collects its
+parameter values. `frame_filter` compiles the same queries to a Polars
+expression for the in-memory backend.
+"""
+import datetime
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+import polars as pl
+from sqlalchemy import bindparam, false, true
+from sqlmodel import and_, or_, select
+from sqlmodel.sql.expression import SelectOfScalar
+
+from ..model import H3_RESOLUTIONS, TbImt, TbModel, TbSts, Tollbooth
+from .h3_index import grid_disk_cells
+
+_ALL = "all"
+
+# query param -> column, per model.
+FILTERABLE: dict[type[TbModel], dict[str, str]] = {
+    Tollbooth: {
+        "id": "tollbooth_id", "tollbooth_id": "tollbooth_id", "legacy_id": "legacy_id",
+        "name": "tollbooth_name", "tollbooth_name": "tollbooth_name",
+        "status": "status", "state": "state", "place": "place", "lines": "lines", "type": "type",
+        "manage": "manage", "gate_to": "gate_to", "info_year": "info_year", "in_out": "in_out",
+        "lat": "lat", "lng": "lng",
+    },
+    TbSts: {
+        "id": "tollbooth_id", "tollbooth_id": "tollbooth_id", "index": "index",
+        "name": "tollbooth_name", "tollbooth_name": "tollbooth_name", "stretch_name": "stretch_name",
+        "highway": "highway", "km": "km", "way": "way", "tdpa": "tdpa", "status": "status",
+        "info_year": "info_year", "lat": "lat", "lng": "lng",
+    },
+    TbImt: {
+        "id": "tollbooth_id", "tollbooth_id": "tollbooth_id",
+        "name": "tollbooth_name", "tollbooth_name": "tollbooth_name",
+        "manage": "manage", "area": "area", "subarea": "subarea", "type": "type", "function": "function",
+        "calirepr": "calirepr", "info_year": "info_year", "lat": "lat", "lng": "lng",
+    },
+}
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    stm: SelectOfScalar
+    params: dict[str, Any]
+
+
+def _column(model: type[TbModel], param: str):
+    column = FILTERABLE[model].get(param)
+    if column is None:
+        raise ValueError(f"{param} is not a filterable field of {model.name()}")
+    return getattr(model, column)
+
+
+def _convert(column, value: str) -> Any:
+    python_type = column.type.python_type
+    try:
+        if python_type is bool:
+            return value.lower() in ("1", "true", "yes")
+        if python_type is datetime.date:
+            return datetime.date.fromisoformat(value)
+        if python_type in (int, float):
+            return python_type(value)
+        return value
+    except ValueError:
+        raise ValueError(f"invalid value for {column.key}: {value}") from None
+
+
+def _shape(parsed: dict) -> tuple:
+    param = parsed["param"]
+    if param in ("and", "or"):
+        return (param, tuple(_shape(clause) for clause in parsed["clauses"]))
+    if param == "h3_cell":
+        return (param, parsed["resolution"])
+    if "values" not in parsed:
+        # A reserved word; the endpoints that take one handle it before compiling.
+        raise ValueError(f"{param} can't be used as a filter of this endpoint")
+    if parsed["values"] == [_ALL]:
+        return (param, _ALL)
+    ranges = tuple((low is not None, high is not None) for low, high in parsed.get("ranges", []))
+    return (param, bool(parsed["values"]), ranges)
+
+
+def _collect(model: type[TbModel], parsed: dict, params: list):
+    """Parameter values in the order `_where` names them."""
+    param = parsed["param"]
+    if param in ("and", "or"):
+        for clause in parsed["clauses"]:
+            _collect(model, clause, params)
+    elif param == "h3_cell":
+        params.append(grid_disk_cells(parsed["cell"], parsed["resolution"], parsed["k"]))
+    elif parsed["values"] != [_ALL]:
+        column = _column(model, param)
+        if parsed["values"]:
+            params.append([_convert(column, value) for value in parsed["values"]])
+        for low, high in parsed.get("ranges", []):
+            params.extend(bound for bound in (low, high) if bound is not None)
+
+
+def _where(model: type[TbModel], shape: tuple, names):
+    param = shape[0]
+    if param in ("and", "or"):
+        combine = and_ if param == "and" else or_
+        return combine(*(_where(model, clause, names) for clause in shape[1]))
+    if param == "h3_cell":
+        return getattr(model, _h3_column(model, shape[1])).in_(bindparam(next(names), expanding=True))
+    column = _column(model, param)
+    if shape[1] == _ALL:
+        return true()
+    _, has_values, ranges = shape
+    conditions = []
+    if has_values:
+        conditions.append(column.in_(bindparam(next(names), expanding=True)))
+    for has_low, has_high in ranges:
+        bounds = []
+        if has_low:
+            bounds.append(column >= bindparam(next(names)))
+        if has_high:
+            bounds.append(column <= bindparam(next(names)))
+        conditions.append(and_(*bounds))
+    return or_(*conditions) if conditions else false()
+
+
+def _param_names():
+    n = 0
+    while True:
+        yield f"q_{n}"
+        n += 1
+
+
+@lru_cache(maxsize=512)
+def _statement(model: type[TbModel], shape: tuple) -> SelectOfScalar:
+    return select(model).where(_where(model, shape, _param_names()))
+
+
+def compile_query(model: type[TbModel], parsed: dict) -> CompiledQuery:
+    """Raises ValueError for fields outside the whitelist and malformed values."""
+    stm = _statement(model, _shape(parsed))
+    values = []
+    _collect(model, parsed, values)
+    return CompiledQuery(stm, dict(zip(_param_names(), values, strict=False)))
+
+
+def _h3_column(model: type[TbModel], resolution: int) -> str:
+    column = model.h3_columns().get(resolution)
+    if column is None:
+        resolutions = ", ".join(map(str, H3_RESOLUTIONS))
+        raise ValueError(f"h3_cell resolution must be one of {resolutions}")
+    return column
+
+
+def frame_filter(model: type[TbModel], parsed: dict) -> pl.Expr:
+    """`compile_query` as a filter over the frame of `model`; raises the same ValueErrors."""
+    param = parsed["param"]
+    if param in ("and", "or"):
+        clauses = [frame_filter(model, clause) for clause in parsed["clauses"]]
+        return pl.all_horizontal(clauses) if param == "and" else pl.any_horizontal(clauses)
+    if param == "h3_cell":
+        cells = grid_disk_cells(parsed["cell"], parsed["resolution"], parsed["k"])
+        return pl.col(_h3_column(model, parsed["resolution"])).is_in(cells).fill_null(False)
+    column = _column(model, param)
+    if parsed["values"] == [_ALL]:
+        return pl.lit(True)
+    # NULL never matches, as in SQL.
+    conditions = []
+    if parsed["values"]:
+        values = [_convert(column, value) for value in parsed["values"]]
+        conditions.append(pl.col(column.key).is_in(values).fill_null(False))
+    for low, high in parsed.get("ranges", []):
+        bounds = [pl.col(column.key) >= low] if low is not None else []
+        if high is not None:
+            bounds.append(pl.col(column.key) <= high)
+        conditions.append(pl.all_horizontal(bounds).fill_null(False))
+    return pl.any_horizontal(conditions) if conditions else pl.lit(False)
@@ -2,16 +2,25 @@
 
 Grammar supported:
 - param:val1,val2  (comma-separated values, spaces allowed)
-- h3_cell:<cell>,<resolution>  (both integers; resolution required)
+- param:lo..hi  (numeric range, inclusive; either bound may be left out: km:..120)
+- h3_cell:<cell>,<resolution>[,<k>]  (cell as integer or H3 hex string; resolution
+  required; k is the grid disk radius around the cell, 0 by default)
+- <clause> AND <clause> OR <clause>  (uppercase keywords; AND binds tighter than OR)
 
 The parser is parser-only: it returns a normalized dict or raises ValueError
 on malformed input. Endpoints should convert the parsed result to DB filters.
 """
+import re
 from typing import Any
 
 _RESERVED_WORDS = {
     "empty_stretch"
 }
+_H3_HEX_LEN = 15
+_H3_MAX_RESOLUTION = 15
+_H3_MAX_K = 10
+_BOOL_OPERATORS = re.compile(r"\s+(AND|OR)\s+")
+_RANGE_SEP = ".."
 
 def _split_once_colon(q: str) -> tuple[str, str]:
     if ":" not in q:
@@ -26,18 +35,46 @@ def _split_once_colon(q: str) -> tuple[str, str]:
     return param, values
 
 
-def parse_query(query: str) -> dict[str, Any]:
-    """Parse a raw query string and return a normalized structure.
+def _parse_h3_cell(values: list[str]) -> dict[str, Any]:
+    if len(values) not in (2, 3):
+        raise ValueError("h3_cell expects <cell>,<resolution>[,<k>]")
+    cell_str = values[0]
+    try:
+        # H3 indexes are 15 hex digits as strings and 18 digits as decimal integers.
+        cell = int(cell_str, 16) if len(cell_str) <= _H3_HEX_LEN + 1 else int(cell_str)
+        resolution = int(values[1])
+        k = int(values[2]) if len(values) == 3 else 0
+    except ValueError:
+        raise ValueError("h3_cell values must be integers") from None
+    if not 0 <= cell < 2**64:
+        raise ValueError(f"{cell_str} is not an H3 index")
+    if not 0 <= resolution <= _H3_MAX_RESOLUTION:
+        raise ValueError(f"h3_cell resolution must be between 0 and {_H3_MAX_RESOLUTION}")
+    if not 0 <= k <= _H3_MAX_K:
+        raise ValueError(f"h3_cell k must be between 0 and {_H3_MAX_K}")
+    return {"param": "h3_cell", "cell": cell, "resolution": resolution, "k": k}
 
-    Raises ValueError when the string is malformed.
-    Examples:
-    - "id:1,2" -> {"param":"id","values":["1","2"]}
-    - "name: Main Toll " -> {"param":"name","values":["Main Toll"]}
-    """
-    if not isinstance(query, str):
-        raise ValueError("query must be a string")
 
+def _parse_range(value: str) -> list[float | None]:
+    bounds = []
+    for bound in value.split(_RANGE_SEP, 1):
+        bound = bound.strip()
+        try:
+            bounds.append(float(bound) if bound else None)
+        except ValueError:
+            raise ValueError(f"range bounds must be numbers: {value}") from None
+    low, high = bounds
+    if low is None and high is None:
+        raise ValueError("range needs at least one bound")
+    if low is not None and high is not None and low > high:
+        raise ValueError(f"range lower bound is greater than the upper bound: {value}")
+    return bounds
+
+
+def _parse_clause(query: str, compound: bool = False) -> dict[str, Any]:
     if query in _RESERVED_WORDS:
+        if compound:
+            raise ValueError(f"{query} can't be combined with other clauses")
         return {"param": query}
     else:
         param, values_str = _split_once_colon(query)
@@ -48,4 +85,39 @@ def parse_query(query: str) -> dict[str, Any]:
     if not values:
         raise ValueError("no values found for parameter")
 
+    if param == "h3_cell":
+        return _parse_h3_cell(values)
+    ranges = [_parse_range(v) for v in values if _RANGE_SEP in v]
+    if ranges:
+        return {"param": param, "values": [v for v in values if _RANGE_SEP not in v], "ranges": ranges}
     return {"param": param, "values": values}
+
+
+def parse_query(query: str) -> dict[str, Any]:
+    """Parse a raw query string and return a normalized structure.
+
+    Raises ValueError when the string is malformed.
+    Examples:
+    - "id:1,2" -> {"param":"id","values":["1","2"]}
+    - "name: Main Toll " -> {"param":"name","values":["Main Toll"]}
+    - "h3_cell:8429a4dffffffff,4,1" -> {"param":"h3_cell","cell":595...,"resolution":4,"k":1}
+    - "lat:19..20.5" -> {"param":"lat","values":[],"ranges":[[19.0,20.5]]}
+    - "state:jalisco AND status:open OR id:3" ->
+      {"param":"or","clauses":[{"param":"and","clauses":[...2 clauses]},{"param":"id","values":["3"]}]}
+    """
+    if not isinstance(query, str):
+        raise ValueError("query must be a string")
+
+    tokens = _BOOL_OPERATORS.split(query)
+    if len(tokens) == 1:
+        return _parse_clause(query)
+
+    clauses = [_parse_clause(token.strip(), compound=True) for token in tokens[0::2]]
+    groups = [[clauses[0]]]
+    for operator, clause in zip(tokens[1::2], clauses[1:], strict=True):
+        if operator == "AND":
+            groups[-1].append(clause)
+        else:
+            groups.append([clause])
+    terms = [group[0] if len(group) == 1 else {"param": "and", "clauses": group} for group in groups]
+    return terms[0] if len(terms) == 1 else {"param": "or", "clauses": terms}
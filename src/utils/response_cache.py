@@ -0,0 +1,227 @@
+"""In-process cache of API responses, invalidated per table and info_year.
+
+Entries are keyed by path, query string and normalized JSON body, and tagged
+with the (table, info_year) pairs they were read from. Every write bumps the
+DataRevision row of what it touched in its own transaction; the writing process
+invalidates right after the commit, and the other processes (other API workers,
+populate_db runs) are caught by a watcher polling DataRevision.
+
+Cached responses carry an ETag; a matching If-None-Match gets a 304 without
+running the endpoint. Cache-Control: no-cache on the request skips the lookup.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+
+from sqlalchemy import Connection, Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ..model import DataRevision
+from .query_parser import parse_query
+
+_log = logging.getLogger(__name__)
+
+ALL_YEARS = 0
+REVISION_BUMP_SQL = (
+    f"INSERT INTO {DataRevision.__tablename__} (table_name, info_year, revision) VALUES (?, ?, 1) "
+    "ON CONFLICT (table_name, info_year) DO UPDATE SET revision = revision + 1"
+)
+_CACHEABLE_MEDIA_TYPES = ("application/json", "application/vnd.apache.arrow.stream")
+
+Tag = tuple[str, int | None]
+
+
+@dataclass
+class _Entry:
+    body: bytes
+    status_code: int
+    headers: dict[str, str]
+    etag: str
+    tags: frozenset[Tag]
+    expires: float
+
+
+@dataclass
+class ResponseCache:
+    maxsize: int = 512
+    ttl: float = 300.0
+    _entries: OrderedDict = field(default_factory=OrderedDict)
+    _listeners: list = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+    _generation: int = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: str) -> _Entry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: _Entry, generation: int):
+        """Store `entry` unless an invalidation ran since `generation` was read."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def add_listener(self, listener: Callable[[str, int | None], None]):
+        """Call `listener(table, info_year)` on every invalidation, for caches kept outside this one."""
+        self._listeners.append(listener)
+
+    def invalidate(self, table: str, info_year: int | None = None):
+        """Drop the entries read from `table` in `info_year`; None drops the whole table."""
+        with self._lock:
+            self._generation += 1
+            stale = [
+                key for key, entry in self._entries.items()
+                if any(
+                    tag_table == table and (info_year is None or tag_year is None or tag_year == info_year)
+                    for tag_table, tag_year in entry.tags
+                )
+            ]
+            for key in stale:
+                del self._entries[key]
+        for listener in self._listeners:
+            listener(table, info_year)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+def bump_revision(conn: Connection, table: str, info_year: int | None = None):
+    """Record a write to `table` in the transaction of `conn`."""
+    conn.exec_driver_sql(REVISION_BUMP_SQL, (table, ALL_YEARS if info_year is None else info_year))
+
+
+def read_revisions(conn: Connection) -> dict[tuple[str, int], int]:
+    rows = conn.exec_driver_sql(f"SELECT table_name, info_year, revision FROM {DataRevision.__tablename__}")
+    return {(table, info_year): revision for table, info_year, revision in rows}
+
+
+class RevisionWatcher:
+    """Polls DataRevision and invalidates `cache` for the revisions that moved."""
+
+    def __init__(self, engine: Engine, cache: ResponseCache, interval: float = 2.0):
+        self.engine = engine
+        self.cache = cache
+        self.interval = interval
+        self._seen: dict[tuple[str, int], int] | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def poll(self):
+        with self.engine.connect() as conn:
+            revisions = read_revisions(conn)
+        if self._seen is not None:
+            for key in self._seen.keys() | revisions.keys():
+                if self._seen.get(key) != revisions.get(key):
+                    table, info_year = key
+                    self.cache.invalidate(table, None if info_year == ALL_YEARS else info_year)
+        self._seen = revisions
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # The table is briefly missing while populate_db recreates the db.
+                _log.debug(f"revision poll failed: {e}")
+
+    def start(self):
+        self.poll()
+        self._thread = threading.Thread(target=self._run, name="revision-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def _query_info_year(body: dict) -> int | None:
+    """The single info_year a request body is restricted to, if any."""
+    info_year = body.get("info_year")
+    if isinstance(info_year, int):
+        return info_year
+    query = body.get("query")
+    if not isinstance(query, str) or not query:
+        return None
+    try:
+        parsed = parse_query(query)
+    except ValueError:
+        return None
+    clauses = parsed["clauses"] if parsed["param"] == "and" else [parsed]
+    for clause in clauses:
+        values = clause.get("values", [])
+        if clause["param"] == "info_year" and len(values) == 1 and values[0].isdigit() and not clause.get("ranges"):
+            return int(values[0])
+    return None
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, cache: ResponseCache, routes: dict[str, Iterable[str]]):
+        """`routes` maps each cached POST path to the tables its responses read."""
+        super().__init__(app)
+        self.cache = cache
+        self.routes = {path: tuple(tables) for path, tables in routes.items()}
+
+    async def dispatch(self, request: Request, call_next):
+        tables = self.routes.get(request.url.path)
+        if request.method != "POST" or tables is None:
+            return await call_next(request)
+
+        raw_body = await request.body()
+        try:
+            body = json.loads(raw_body or b"null")
+            normalized = json.dumps(body, sort_keys=True, separators=(",", ":"))
+        except ValueError:
+            body, normalized = None, raw_body.decode(errors="replace")
+        query_string = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        key = f"{request.url.path}?{query_string}\n{normalized}"
+
+        # A request with Cache-Control: no-cache is answered by the endpoint; the
+        # fresh response still replaces the cached one.
+        no_cache = "no-cache" in request.headers.get("cache-control", "")
+        entry = None if no_cache else self.cache.get(key)
+        if entry is None:
+            generation = self.cache.generation
+            response = await call_next(request)
+            media_type = response.headers.get("content-type", "").split(";")[0]
+            if response.status_code != 200 or media_type not in _CACHEABLE_MEDIA_TYPES:
+                return response
+            content = b"".join([chunk async for chunk in response.body_iterator])
+            info_year = _query_info_year(body) if isinstance(body, dict) else None
+            headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+            entry = _Entry(
+                body=content,
+                status_code=response.status_code,
+                headers=headers,
+                etag=f'"{hashlib.sha1(content).hexdigest()}"',
+                tags=frozenset((table, info_year) for table in tables),
+                expires=time.monotonic() + self.cache.ttl,
+            )
+            self.cache.put(key, entry, generation)
+
+        if request.headers.get("if-none-match") == entry.etag:
+            return Response(status_code=304, headers={"ETag": entry.etag})
+        return Response(content=entry.body, status_code=entry.status_code, headers={**entry.headers, "ETag": entry.etag})
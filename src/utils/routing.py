@@ -0,0 +1,203 @@
+"""Cheapest routes between tollbooths over the stretch graph of a year.
+
+Tollbooths are the nodes and every TbStretchId row is a directed edge from
+tollbooth_id_in to tollbooth_id_out, weighted by the StretchToll of its stretch
+for each vehicle class and by Stretch.stretch_length_km. A row whose in and out
+tollbooth are the same is the toll of crossing that tollbooth; it links nothing
+and is only used for a route from a tollbooth to itself.
+
+The graph of a year is built on the first request for that year and kept,
+together with the routes already solved on it, until an edit of the stretch
+tables invalidates it.
+"""
+import heapq
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import polars as pl
+from sqlalchemy import Connection
+from sqlmodel import select
+
+from ..model import Stretch, StretchToll, TbStretchId
+
+WEIGHTS = ("toll", "distance")
+ROUTE_TABLES = (TbStretchId.__tablename__, Stretch.__tablename__, StretchToll.__tablename__)
+
+
+@dataclass(frozen=True)
+class Edge:
+    target: int
+    stretch_id: int
+    length_km: float | None
+    tolls: tuple[float | None, ...]
+
+
+def load_edges(conn: Connection, info_year: int) -> pl.DataFrame:
+    stm = (
+        select(
+            TbStretchId.tollbooth_id_in, TbStretchId.tollbooth_id_out, TbStretchId.stretch_id,
+            Stretch.stretch_name, Stretch.stretch_length_km,
+            *(getattr(StretchToll, column) for column in StretchToll.vehicle_cols()),
+        )
+        .join(Stretch, Stretch.stretch_id == TbStretchId.stretch_id)
+        .join(StretchToll, StretchToll.stretch_id == TbStretchId.stretch_id, isouter=True)
+        .where(TbStretchId.info_year == info_year)
+    )
+    return pl.read_database(stm, conn, infer_schema_length=None)
+
+
+class TollGraph:
+    def __init__(self, df_edges: pl.DataFrame, route_cache_size: int = 1024):
+        self.vehicles = StretchToll.vehicle_cols()
+        self.stretch_names: dict[int, str] = {}
+        self.adjacency: dict[int, list[Edge]] = defaultdict(list)
+        self.crossings: dict[int, list[Edge]] = defaultdict(list)
+        # Every edge endpoint, including the tollbooths that are only the out side of their stretches.
+        self.nodes: set[int] = set()
+        for row in df_edges.iter_rows(named=True):
+            source = row["tollbooth_id_in"]
+            if source is None or row["tollbooth_id_out"] is None:
+                continue
+            edge = Edge(
+                target=row["tollbooth_id_out"],
+                stretch_id=row["stretch_id"],
+                length_km=row["stretch_length_km"],
+                tolls=tuple(row[vehicle] for vehicle in self.vehicles),
+            )
+            self.stretch_names[edge.stretch_id] = row["stretch_name"]
+            self.nodes.update((source, edge.target))
+            if edge.target == source:
+                self.crossings[source].append(edge)
+            else:
+                self.adjacency[source].append(edge)
+        self._vehicle_index = {vehicle: i for i, vehicle in enumerate(self.vehicles)}
+        self._routes: OrderedDict = OrderedDict()
+        self._route_cache_size = route_cache_size
+        self._lock = threading.Lock()
+
+    def has_node(self, tollbooth_id: int) -> bool:
+        return tollbooth_id in self.nodes
+
+    def _edge_cost(self, edge: Edge, vehicle: int | None, weight: str) -> tuple[float, float] | None:
+        """(primary, tiebreak) cost of an edge, None when it can't be used by the vehicle.
+
+        A None vehicle uses every edge at no toll, for plain distances.
+        """
+        toll = 0.0 if vehicle is None else edge.tolls[vehicle]
+        if toll is None:
+            return None
+        length_km = edge.length_km or 0.0
+        if weight == "distance":
+            return (length_km, toll)
+        return (toll, length_km)
+
+    def crossing(self, tollbooth_id: int, vehicle: int | None, weight: str) -> tuple[tuple[float, float], Edge] | None:
+        """Cheapest crossing of `tollbooth_id` and its cost, the route from a tollbooth to itself."""
+        costs = [(self._edge_cost(edge, vehicle, weight), edge) for edge in self.crossings.get(tollbooth_id, [])]
+        costs = [(cost, edge) for cost, edge in costs if cost is not None]
+        return min(costs, key=lambda item: item[0]) if costs else None
+
+    def search(
+        self, origin: int, vehicle: int | None, weight: str, destination: int | None = None
+    ) -> tuple[dict[int, tuple[float, float]], dict[int, tuple[int, Edge]]]:
+        """Dijkstra from `origin`: the (primary, tiebreak) cost and previous edge of every node reached.
+
+        The search stops once `destination` is settled, if given.
+        """
+        best = {origin: (0.0, 0.0)}
+        previous: dict[int, tuple[int, Edge]] = {}
+        heap = [(0.0, 0.0, origin)]
+        while heap:
+            primary, tiebreak, node = heapq.heappop(heap)
+            if node == destination:
+                break
+            if (primary, tiebreak) > best[node]:
+                continue
+            for edge in self.adjacency.get(node, []):
+                cost = self._edge_cost(edge, vehicle, weight)
+                if cost is None:
+                    continue
+                candidate = (primary + cost[0], tiebreak + cost[1])
+                if edge.target not in best or candidate < best[edge.target]:
+                    best[edge.target] = candidate
+                    previous[edge.target] = (node, edge)
+                    heapq.heappush(heap, (*candidate, edge.target))
+        return best, previous
+
+    def _path(self, origin: int, destination: int, vehicle: int, weight: str) -> list[tuple[int, Edge]] | None:
+        if origin == destination:
+            crossing = self.crossing(origin, vehicle, weight)
+            return [] if crossing is None else [(origin, crossing[1])]
+
+        _, previous = self.search(origin, vehicle, weight, destination)
+        if destination not in previous:
+            return None
+
+        path = []
+        node = destination
+        while node != origin:
+            node, edge = previous[node]
+            path.append((node, edge))
+        path.reverse()
+        return path
+
+    def route(self, origin: int, destination: int, vehicle: str, weight: str = "toll") -> dict | None:
+        """Cheapest route for `vehicle` minimizing `weight`; None when the destination is unreachable."""
+        key = (origin, destination, vehicle, weight)
+        with self._lock:
+            if key in self._routes:
+                self._routes.move_to_end(key)
+                return self._routes[key]
+
+        index = self._vehicle_index[vehicle]
+        path = self._path(origin, destination, index, weight)
+        route = None
+        if path is not None:
+            stretches = [
+                {
+                    "stretch_id": edge.stretch_id,
+                    "stretch_name": self.stretch_names[edge.stretch_id],
+                    "tollbooth_id_in": source,
+                    "tollbooth_id_out": edge.target,
+                    "toll": edge.tolls[index],
+                    "length_km": edge.length_km,
+                }
+                for source, edge in path
+            ]
+            route = {
+                "toll": round(sum(stretch["toll"] for stretch in stretches), 2),
+                "length_km": round(sum(stretch["length_km"] or 0.0 for stretch in stretches), 2),
+                "stretches": stretches,
+            }
+
+        with self._lock:
+            self._routes[key] = route
+            while len(self._routes) > self._route_cache_size:
+                self._routes.popitem(last=False)
+        return route
+
+
+class RouteGraphCache:
+    def __init__(self):
+        self._graphs: dict[int, TollGraph] = {}
+        self._lock = threading.Lock()
+
+    def get(self, info_year: int, load_edges: Callable[[int], pl.DataFrame]) -> TollGraph:
+        graph = self._graphs.get(info_year)
+        if graph is None:
+            with self._lock:
+                graph = self._graphs.get(info_year)
+                if graph is None:
+                    graph = TollGraph(load_edges(info_year))
+                    self._graphs[info_year] = graph
+        return graph
+
+    def invalidate(self, info_year: int | None = None):
+        """Drop the graph of `info_year`; None drops every year."""
+        with self._lock:
+            if info_year is None:
+                self._graphs.clear()
+            else:
+                self._graphs.pop(info_year, None)
@@ -0,0 +1,180 @@
+"""Nearest neighbour queries over the located models (Tollbooth, TbSts, TbImt).
+
+TbNeighbour only holds the pairs precomputed by the pipeline for fixed H3
+rings. Here the points of each model are kept in a KD-tree over their unit
+sphere coordinates, so a query can take any point, any scope and either the
+k nearest or every point within a radius. Chord lengths order the points like
+great-circle distances do, and are turned into kilometres for the response.
+
+The trees of a year are built on the first request for that year and kept
+until an edit of a located model of that year invalidates them.
+"""
+import heapq
+import math
+import threading
+from collections.abc import Callable
+
+import polars as pl
+
+from ..model import TbImt, TbSts, Tollbooth
+
+EARTH_RADIUS_KM = 6371.0088
+# The scopes of TbNeighbour and the located model of each one.
+NEIGHBOUR_SCOPES = {"local": Tollbooth.name(), "imt": TbImt.name(), "sts": TbSts.name()}
+
+Vector = tuple[float, float, float]
+
+
+def unit_vector(lat: float, lng: float) -> Vector:
+    lat, lng = math.radians(lat), math.radians(lng)
+    return (math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat))
+
+
+def km_to_chord(km: float) -> float:
+    return 2 * math.sin(min(km / (2 * EARTH_RADIUS_KM), math.pi / 2))
+
+
+def chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+class KdTree:
+    """Static KD-tree over 3-d points.
+
+    The points are kept in one array: the node of a slice is its median and its
+    children are the slices on each side, split on the axis of largest spread.
+    """
+
+    def __init__(self, points: list[Vector]):
+        self._points = points
+        self._order = list(range(len(points)))
+        self._axes = [0] * len(points)
+        self._build(0, len(points))
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _build(self, lo: int, hi: int):
+        if hi - lo <= 1:
+            return
+        points = [self._points[i] for i in self._order[lo:hi]]
+        axis = max(range(3), key=lambda a: max(p[a] for p in points) - min(p[a] for p in points))
+        self._order[lo:hi] = sorted(self._order[lo:hi], key=lambda i: self._points[i][axis])
+        mid = (lo + hi) // 2
+        self._axes[mid] = axis
+        self._build(lo, mid)
+        self._build(mid + 1, hi)
+
+    def query(
+        self, target: Vector, k: int | None = None, radius: float | None = None, skip: int | None = None
+    ) -> list[tuple[float, int]]:
+        """(distance, index) of the k nearest points, or of every point within `radius`, nearest first.
+
+        With both, the k nearest within `radius`. `skip` leaves out the point at that index.
+        """
+        limit = math.inf if radius is None else radius * radius
+        # Max-heap of (-squared distance, index) of the best points so far.
+        best: list[tuple[float, int]] = []
+
+        def bound() -> float:
+            if k is not None and len(best) == k:
+                return min(limit, -best[0][0])
+            return limit
+
+        def visit(lo: int, hi: int):
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            index = self._order[mid]
+            point = self._points[index]
+            d2 = sum((t - p) ** 2 for t, p in zip(target, point, strict=True))
+            if index != skip and d2 <= bound():
+                if k is not None and len(best) == k:
+                    heapq.heapreplace(best, (-d2, index))
+                else:
+                    heapq.heappush(best, (-d2, index))
+            diff = target[self._axes[mid]] - point[self._axes[mid]]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            visit(*near)
+            if diff * diff <= bound():
+                visit(*far)
+
+        if k != 0:
+            visit(0, len(self._points))
+        return [(math.sqrt(-d2), index) for d2, index in sorted(best, reverse=True)]
+
+
+class NeighbourIndex:
+    """One KdTree per located model over points (source, tollbooth_id, tollbooth_name, lat, lng, info_year)."""
+
+    def __init__(self, df_points: pl.DataFrame):
+        df_points = (
+            df_points
+            .filter(pl.col("lat").is_not_null() & pl.col("lng").is_not_null())
+            # Without a year filter an id is in several years; the latest one is kept.
+            .sort("info_year", maintain_order=True)
+            .unique(subset=["source", "tollbooth_id"], keep="last", maintain_order=True)
+        )
+        self.size = df_points.height
+        self._rows: dict[str, list[dict]] = {}
+        self._trees: dict[str, KdTree] = {}
+        self._ids: dict[str, dict[int, int]] = {}
+        for source in NEIGHBOUR_SCOPES.values():
+            rows = df_points.filter(pl.col("source") == source).drop("source").to_dicts()
+            self._rows[source] = rows
+            self._trees[source] = KdTree([unit_vector(row["lat"], row["lng"]) for row in rows])
+            self._ids[source] = {row["tollbooth_id"]: i for i, row in enumerate(rows)}
+
+    def location(self, source: str, tollbooth_id: int) -> tuple[float, float] | None:
+        index = self._ids[source].get(tollbooth_id)
+        if index is None:
+            return None
+        row = self._rows[source][index]
+        return row["lat"], row["lng"]
+
+    def nearest(
+        self, lat: float, lng: float, source: str, k: int | None = None, radius_km: float | None = None,
+        skip: int | None = None
+    ) -> list[dict]:
+        """Rows of `source` nearest to (lat, lng) with their `distance` in km; `skip` is a tollbooth_id to leave out."""
+        radius = None if radius_km is None else km_to_chord(radius_km)
+        skip_index = None if skip is None else self._ids[source].get(skip)
+        hits = self._trees[source].query(unit_vector(lat, lng), k, radius, skip_index)
+        rows = self._rows[source]
+        return [
+            {
+                "tollbooth_id": rows[index]["tollbooth_id"],
+                "tollbooth_name": rows[index]["tollbooth_name"],
+                "lat": rows[index]["lat"],
+                "lng": rows[index]["lng"],
+                "distance": chord_to_km(chord),
+            }
+            for chord, index in hits
+        ]
+
+
+class NeighbourIndexCache:
+    def __init__(self):
+        self._indexes: dict[int | None, NeighbourIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(self, info_year: int | None, load_points: Callable[[int | None], pl.DataFrame]) -> NeighbourIndex:
+        index = self._indexes.get(info_year)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(info_year)
+                if index is None:
+                    index = NeighbourIndex(load_points(info_year))
+                    # Years without points are not kept, so requests for arbitrary years don't pile up.
+                    if index.size:
+                        self._indexes[info_year] = index
+        return index
+
+    def invalidate(self, info_year: int | None = None):
+        """Drop the index of `info_year` (and the all-years index); None drops every year."""
+        with self._lock:
+            if info_year is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(info_year, None)
+                self._indexes.pop(None, None)
@@ -0,0 +1,199 @@
+"""Auxiliary SQLite indexes that SQLModel metadata can't declare.
+
+The R-tree tables hold one degenerate box (lat, lat, lng, lng) per row of the
+located models and are keyed by the source table rowid. Triggers keep them in
+sync with every write path (ORM upserts and ADBC bulk loads alike).
+
+The name index is a single FTS5 trigram table over the tollbooth names of the
+same models, so typeahead suggestions are answered by the index with a bounded,
+ranked result instead of a LIKE scan of every table.
+"""
+import polars as pl
+from sqlalchemy import Connection, bindparam, text
+from sqlalchemy.sql import ColumnElement, column, literal_column, table
+from sqlmodel import SQLModel, and_, select
+from sqlmodel.sql.expression import SelectOfScalar
+
+from ..model import TbImt, TbModel, TbSts, Tollbooth, str_normalize_value
+
+LOCATED_MODELS: dict[str, type[TbModel]] = {
+    Tollbooth.name(): Tollbooth,
+    TbSts.name(): TbSts,
+    TbImt.name(): TbImt,
+}
+
+NAME_INDEX = "tb_name_fts"
+# The name index rowid packs the source rowid and the source: rowid * 4 + code.
+_NAME_SOURCE_CODES = {Tollbooth.name(): 1, TbSts.name(): 2, TbImt.name(): 3}
+_TRIGRAM_SIZE = 3
+
+
+def _rtree_name(model: type[TbModel]) -> str:
+    return f"{model.name()}_rtree"
+
+
+def _rtree_ddl(model: type[TbModel]) -> list[str]:
+    src = model.__tablename__
+    rtree = _rtree_name(model)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {rtree} USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+        f"""CREATE TRIGGER IF NOT EXISTS {rtree}_ai AFTER INSERT ON {src}
+            WHEN new.lat IS NOT NULL AND new.lng IS NOT NULL
+            BEGIN
+                INSERT INTO {rtree} VALUES (new.rowid, new.lat, new.lat, new.lng, new.lng);
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {rtree}_au AFTER UPDATE OF lat, lng ON {src}
+            BEGIN
+                DELETE FROM {rtree} WHERE id = old.rowid;
+                INSERT INTO {rtree} SELECT new.rowid, new.lat, new.lat, new.lng, new.lng
+                WHERE new.lat IS NOT NULL AND new.lng IS NOT NULL;
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {rtree}_ad AFTER DELETE ON {src}
+            BEGIN
+                DELETE FROM {rtree} WHERE id = old.rowid;
+            END""",
+        # Resync rows written before the triggers existed or left over by a table recreate.
+        f"DELETE FROM {rtree} WHERE id NOT IN (SELECT rowid FROM {src})",
+        f"""INSERT INTO {rtree}
+            SELECT rowid, lat, lat, lng, lng FROM {src}
+            WHERE lat IS NOT NULL AND lng IS NOT NULL AND rowid NOT IN (SELECT id FROM {rtree})""",
+    ]
+
+
+def _name_index_ddl(model: type[TbModel]) -> list[str]:
+    src = model.__tablename__
+    source = model.name()
+    trigger = f"{NAME_INDEX}_{source}"
+    row_id = f"rowid * 4 + {_NAME_SOURCE_CODES[source]}"
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {trigger}_ai AFTER INSERT ON {src}
+            WHEN new.tollbooth_name IS NOT NULL
+            BEGIN
+                INSERT INTO {NAME_INDEX}(rowid, tollbooth_name, source, tollbooth_id, info_year)
+                VALUES (new.{row_id}, new.tollbooth_name, '{source}', new.tollbooth_id, new.info_year);
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {trigger}_au AFTER UPDATE OF tollbooth_name, tollbooth_id, info_year ON {src}
+            BEGIN
+                DELETE FROM {NAME_INDEX} WHERE rowid = old.{row_id};
+                INSERT INTO {NAME_INDEX}(rowid, tollbooth_name, source, tollbooth_id, info_year)
+                SELECT new.{row_id}, new.tollbooth_name, '{source}', new.tollbooth_id, new.info_year
+                WHERE new.tollbooth_name IS NOT NULL;
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {trigger}_ad AFTER DELETE ON {src}
+            BEGIN
+                DELETE FROM {NAME_INDEX} WHERE rowid = old.{row_id};
+            END""",
+        f"""DELETE FROM {NAME_INDEX}
+            WHERE source = '{source}' AND rowid NOT IN (SELECT {row_id} FROM {src})""",
+        f"""INSERT INTO {NAME_INDEX}(rowid, tollbooth_name, source, tollbooth_id, info_year)
+            SELECT {row_id}, tollbooth_name, '{source}', tollbooth_id, info_year FROM {src}
+            WHERE tollbooth_name IS NOT NULL AND {row_id} NOT IN (SELECT rowid FROM {NAME_INDEX})""",
+    ]
+
+
+def create_name_index(conn: Connection):
+    conn.exec_driver_sql(
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {NAME_INDEX} USING fts5(
+            tollbooth_name, source UNINDEXED, tollbooth_id UNINDEXED, info_year UNINDEXED,
+            tokenize = 'trigram'
+        )"""
+    )
+    for model in LOCATED_MODELS.values():
+        for ddl in _name_index_ddl(model):
+            conn.exec_driver_sql(ddl)
+
+
+def name_suggestions(
+    conn: Connection, query: str, sources: list[str], limit: int, info_year: int | None = None
+) -> list[dict]:
+    """Top `limit` names containing `query`, best bm25 rank first.
+
+    Queries shorter than a trigram can't use the index and fall back to a
+    prefix match, which still stops scanning once `limit` rows are found.
+    """
+    term = str_normalize_value(query)
+    if not term:
+        return []
+    params = {"sources": sources, "limit": limit}
+    where = ["source IN :sources"]
+    if len(term) >= _TRIGRAM_SIZE:
+        where.append(f"{NAME_INDEX} MATCH :term")
+        params["term"] = '"{}"'.format(term.replace('"', '""'))
+        order_by = "ORDER BY rank"
+    else:
+        where.append("tollbooth_name LIKE :term ESCAPE '\\'")
+        # Normalized names only hold [a-z0-9_]; "_" is the one LIKE wildcard to escape.
+        params["term"] = term.replace("_", "\\_") + "%"
+        order_by = ""
+    if info_year is not None:
+        where.append("info_year = :info_year")
+        params["info_year"] = info_year
+    stm = text(
+        f"""SELECT source, tollbooth_id, tollbooth_name, info_year FROM {NAME_INDEX}
+            WHERE {" AND ".join(where)} {order_by} LIMIT :limit"""
+    ).bindparams(bindparam("sources", expanding=True))
+    return [dict(row._mapping) for row in conn.execute(stm, params)]
+
+
+def name_rows(conn: Connection) -> list[dict]:
+    stm = text(f"SELECT source, tollbooth_id, tollbooth_name, info_year FROM {NAME_INDEX}")
+    return [dict(row._mapping) for row in conn.execute(stm)]
+
+
+def create_h3_columns(conn: Connection):
+    """Add and backfill the h3_cell_<res> columns on db files created before they existed."""
+    for model in LOCATED_MODELS.values():
+        src = model.__tablename__
+        h3_columns = list(model.h3_columns().values())
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({src})")}
+        for h3_column in h3_columns:
+            if h3_column not in existing:
+                conn.exec_driver_sql(f"ALTER TABLE {src} ADD COLUMN {h3_column} INTEGER")
+                conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{src}_{h3_column} ON {src} ({h3_column})")
+
+        missing = " OR ".join(f"{h3_column} IS NULL" for h3_column in h3_columns)
+        df = pl.read_database(
+            f"SELECT rowid AS row_id, lat, lng FROM {src} WHERE lat IS NOT NULL AND lng IS NOT NULL AND ({missing})",
+            connection=conn,
+            schema_overrides={"row_id": pl.Int64, "lat": pl.Float64, "lng": pl.Float64},
+        )
+        if df.is_empty():
+            continue
+        df = df.select(*model.h3_exprs(), "row_id")
+        assignments = ", ".join(f"{h3_column} = ?" for h3_column in h3_columns)
+        conn.exec_driver_sql(f"UPDATE {src} SET {assignments} WHERE rowid = ?", df.rows())
+
+
+def create_table_indexes(conn: Connection):
+    """Create the indexes declared on the models that the db file lacks.
+
+    create_all skips the indexes of tables that already exist, so indexes added
+    to a model later only reach existing db files through here.
+    """
+    for sql_table in SQLModel.metadata.sorted_tables:
+        for index in sql_table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def create_spatial_indexes(conn: Connection):
+    for model in LOCATED_MODELS.values():
+        for ddl in _rtree_ddl(model):
+            conn.exec_driver_sql(ddl)
+
+
+def bbox_filter(model: type[TbModel], south: float, west: float, north: float, east: float) -> ColumnElement:
+    """Rowid filter for the rows of `model` whose point falls inside the box."""
+    rtree = table(
+        _rtree_name(model), column("id"), column("min_lat"), column("max_lat"), column("min_lng"), column("max_lng")
+    )
+    ids = select(rtree.c.id).where(
+        and_(
+            rtree.c.max_lat >= south, rtree.c.min_lat <= north,
+            rtree.c.max_lng >= west, rtree.c.min_lng <= east,
+        )
+    )
+    return literal_column(f"{model.__tablename__}.rowid").in_(ids)
+
+
+def viewport_stm(model: type[TbModel], south: float, west: float, north: float, east: float) -> SelectOfScalar:
+    return select(model).where(bbox_filter(model, south, west, north, east))
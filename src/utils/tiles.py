@@ -0,0 +1,45 @@
+"""Static tiles of the located models, served under /tiles without going through the API.
+
+`src/scripts/static_export.py` writes, per year, a GeoParquet file per table,
+a pack of H3-bucketed JSON shards per table and a manifest with the byte range
+of every shard. The read-only map (GET /?viewer=true) reads the manifest and
+fetches the shards in its view with HTTP range requests; packs carry a content
+hash in their name, so they are cached for good, while the manifest and the
+parquet files are revalidated.
+"""
+import os
+import re
+
+from starlette.staticfiles import StaticFiles
+
+from ..data_files import build_path
+
+TILES_DIR = build_path("", {}, "data/tiles/")
+MANIFEST_FILENAME = "manifest.json"
+_HASHED_NAME = re.compile(r"-[0-9a-f]{12}\.[a-z]+$")
+
+
+def tiles_dir(year: int) -> str:
+    return build_path("", {"year": year}, "data/tiles/")
+
+
+def has_tiles(year: int) -> bool:
+    return os.path.exists(os.path.join(tiles_dir(year), MANIFEST_FILENAME))
+
+
+def latest_tiles_year() -> int | None:
+    """The newest year with a published manifest."""
+    if not os.path.isdir(TILES_DIR):
+        return None
+    years = [int(name) for name in os.listdir(TILES_DIR) if name.isdigit() and has_tiles(int(name))]
+    return max(years, default=None)
+
+
+class CachedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if _HASHED_NAME.search(str(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
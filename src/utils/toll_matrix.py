@@ -0,0 +1,110 @@
+"""All-pairs toll and distance matrices of the stretch graph of a year.
+
+Tollbooths are grouped by road network (weakly connected components of the
+graph) and each network gets a size x size block per matrix, so pairs on
+networks that never meet take no space. The blocks are flattened row-major
+into one float32 column per vehicle class plus `length_km`, written as an
+uncompressed Arrow IPC file that is read memory-mapped; the index parquet maps
+every tollbooth to its block offset, block size and position in the block.
+
+Unreachable pairs are NaN. The cost of a tollbooth to itself is its cheapest
+crossing toll, as in TollGraph.route.
+"""
+import math
+from array import array
+
+import polars as pl
+
+from ..model import TollMatrixIndex
+from .routing import TollGraph
+
+LENGTH_COLUMN = "length_km"
+
+
+def road_networks(graph: TollGraph) -> list[list[int]]:
+    """The tollbooths of each weakly connected component, largest first."""
+    parent = {node: node for node in (*graph.adjacency, *graph.crossings)}
+
+    def find(node: int) -> int:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for source, edges in graph.adjacency.items():
+        for edge in edges:
+            parent.setdefault(edge.target, edge.target)
+            parent[find(source)] = find(edge.target)
+    networks: dict[int, list[int]] = {}
+    for node in parent:
+        networks.setdefault(find(node), []).append(node)
+    return sorted((sorted(nodes) for nodes in networks.values()), key=lambda nodes: (-len(nodes), nodes[0]))
+
+
+def _fill_block(column: array, offset: int, nodes: list[int], graph: TollGraph, vehicle: int | None, weight: str):
+    index = {node: i for i, node in enumerate(nodes)}
+    size = len(nodes)
+    for i, origin in enumerate(nodes):
+        best, _ = graph.search(origin, vehicle, weight)
+        row = offset + i * size
+        for node, cost in best.items():
+            column[row + index[node]] = cost[0]
+        crossing = graph.crossing(origin, vehicle, weight)
+        column[row + i] = 0.0 if crossing is None else crossing[0][0]
+
+
+def toll_matrices(graph: TollGraph, info_year: int) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """(index, matrices): the cheapest toll per vehicle class and the shortest length between tollbooths."""
+    networks = road_networks(graph)
+    index_rows = []
+    offset = 0
+    for network, nodes in enumerate(networks):
+        index_rows.extend(
+            (tollbooth_id, network, i, offset, len(nodes), info_year) for i, tollbooth_id in enumerate(nodes)
+        )
+        offset += len(nodes) ** 2
+    df_index = pl.DataFrame(index_rows, schema=TollMatrixIndex.dict_schema(), orient="row")
+
+    targets = [(vehicle, i, "toll") for i, vehicle in enumerate(graph.vehicles)]
+    targets.append((LENGTH_COLUMN, None, "distance"))
+    columns = {}
+    for name, vehicle, weight in targets:
+        column = array("f", [math.nan]) * offset
+        block_offset = 0
+        for nodes in networks:
+            _fill_block(column, block_offset, nodes, graph, vehicle, weight)
+            block_offset += len(nodes) ** 2
+        columns[name] = pl.Series(name, column, dtype=pl.Float32)
+    return df_index, pl.DataFrame(columns)
+
+
+def write_toll_matrices(df_index: pl.DataFrame, df_matrix: pl.DataFrame, index_path: str, matrix_path: str):
+    df_index.write_parquet(index_path)
+    # One uncompressed record batch, so readers can map the columns without copying.
+    df_matrix.rechunk().write_ipc(matrix_path, compression="uncompressed")
+
+
+class TollMatrix:
+    """O(1) pair lookups over the files of `write_toll_matrices`."""
+
+    def __init__(self, index_path: str, matrix_path: str):
+        self._index = {
+            row[0]: row[1:]
+            for row in pl.read_parquet(index_path).select("tollbooth_id", "network", "matrix_index", "offset", "size").iter_rows()
+        }
+        # Polars maps an uncompressed IPC file read from a path instead of copying it.
+        self._matrix = pl.read_ipc(matrix_path)
+
+    @property
+    def columns(self) -> list[str]:
+        return self._matrix.columns
+
+    def lookup(self, origin: int, destination: int, column: str) -> float | None:
+        """Cost of `column` from `origin` to `destination`; None when there is no route."""
+        source = self._index.get(origin)
+        target = self._index.get(destination)
+        if source is None or target is None or source[0] != target[0]:
+            return None
+        _, i, offset, size = source
+        value = self._matrix[column][offset + i * size + target[1]]
+        return None if value is None or math.isnan(value) else value
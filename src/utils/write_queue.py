@@ -0,0 +1,66 @@
+"""Single writer for the editor db.
+
+SQLite takes one writer at a time; API requests that write queue a function
+here and one thread runs them in order, each in its own session. Writers never
+wait on each other's locks, and the reads, which go through the read-only pool,
+keep going under WAL while a write is in flight.
+"""
+import contextvars
+import queue
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import TypeVar
+
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+T = TypeVar("T")
+
+
+class WriteQueue:
+    """Runs the functions submitted with a Session on one thread, in submission order."""
+
+    def __init__(self, engine: Engine, maxsize: int = 0):
+        self.engine = engine
+        self._jobs: queue.Queue = queue.Queue(maxsize)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[[Session], T]) -> Future:
+        self.start()
+        future: Future = Future()
+        # Run in the context of the submitter, so request-scoped state (metrics) follows the job.
+        self._jobs.put((fn, future, contextvars.copy_context()))
+        return future
+
+    def run(self, fn: Callable[[Session], T], timeout: float | None = None) -> T:
+        """Submit `fn` and wait for its result; exceptions raised by `fn` are raised here."""
+        return self.submit(fn).result(timeout)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            fn, future, context = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with Session(self.engine) as session:
+                    future.set_result(context.run(fn, session))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None:
+                self._jobs.put(None)
+                self._thread.join()
+                self._thread = None